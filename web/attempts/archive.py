@@ -0,0 +1,268 @@
+import json
+import shutil
+import zlib
+from datetime import timezone
+
+import numpy as np
+from django.apps import apps
+from django.db import connection, transaction
+
+from .feedback import normalize_feedback
+from .models import (
+    ArchivedCourse,
+    Attempt,
+    HistoricalAttempt,
+    OutcomeCounter,
+    SolutionSignature,
+)
+
+ATTEMPT_DTYPE = np.dtype(
+    [
+        ("id", np.int64),
+        ("user", np.int64),
+        ("part", np.int64),
+        ("valid", np.bool_),
+        ("submission_date", "datetime64[us]"),
+        ("offset", np.int64),
+        ("length", np.int64),
+    ]
+)
+HISTORY_DTYPE = np.dtype(
+    ATTEMPT_DTYPE.descr
+    + [
+        ("history_id", np.int64),
+        ("history_date", "datetime64[us]"),
+        ("history_type", "U1"),
+        # -1 stands for records without a user
+        ("history_user", np.int64),
+    ]
+)
+
+
+def _timestamp(value):
+    return np.datetime64(value.astimezone(timezone.utc).replace(tzinfo=None), "us")
+
+
+def _datetime(value):
+    return value.item().replace(tzinfo=timezone.utc)
+
+
+class AttemptArchive:
+    """
+    Attempts and historical attempts of an archived course. Both are stored
+    in memory-mapped arrays sorted by users, so that records of a single user
+    are found without reading whole files, while solutions, feedback and
+    change reasons are compressed in a separate contents file.
+    """
+
+    def __init__(self, path):
+        self.attempts_index = np.load(path / "attempts.npy", mmap_mode="r")
+        self.history_index = np.load(path / "history.npy", mmap_mode="r")
+        contents_path = path / "contents.bin"
+        # empty files cannot be memory-mapped
+        if contents_path.stat().st_size:
+            self.contents = np.memmap(contents_path, dtype=np.uint8, mode="r")
+        else:
+            self.contents = np.zeros(0, dtype=np.uint8)
+
+    @staticmethod
+    def write(path, attempts, history):
+        """Write the given attempts and historical attempts, both sorted by
+        users, into a new archive in the given directory."""
+        path.mkdir(parents=True)
+        offset = 0
+        with open(path / "contents.bin", "wb") as contents:
+
+            def write_contents(*values):
+                nonlocal offset
+                data = zlib.compress(json.dumps(values).encode("utf-8"))
+                contents.write(data)
+                offset += len(data)
+                return offset - len(data), len(data)
+
+            attempts_index = np.array(
+                [
+                    (
+                        attempt.id,
+                        attempt.user_id,
+                        attempt.part_id,
+                        attempt.valid,
+                        _timestamp(attempt.submission_date),
+                        *write_contents(attempt.solution, attempt.feedback),
+                    )
+                    for attempt in attempts
+                ],
+                dtype=ATTEMPT_DTYPE,
+            )
+            history_index = np.array(
+                [
+                    (
+                        record.id,
+                        record.user_id,
+                        record.part_id,
+                        record.valid,
+                        _timestamp(record.submission_date),
+                        *write_contents(
+                            record.solution,
+                            record.feedback,
+                            record.history_change_reason,
+                        ),
+                        record.history_id,
+                        _timestamp(record.history_date),
+                        record.history_type,
+                        record.history_user_id or -1,
+                    )
+                    for record in history
+                ],
+                dtype=HISTORY_DTYPE,
+            )
+        np.save(path / "attempts.npy", attempts_index)
+        np.save(path / "history.npy", history_index)
+        return len(attempts_index), len(history_index)
+
+    def _user_rows(self, index, user_id):
+        if user_id is None:
+            return index
+        start, end = np.searchsorted(index["user"], [user_id, user_id + 1])
+        return index[start:end]
+
+    def _contents(self, row):
+        start = int(row["offset"])
+        end = start + int(row["length"])
+        data = self.contents[start:end].tobytes()
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+
+    def attempts(self, user_id=None):
+        """Yield attempts of the given user or of all users."""
+        for row in self._user_rows(self.attempts_index, user_id):
+            solution, feedback = self._contents(row)
+            yield Attempt(
+                id=int(row["id"]),
+                user_id=int(row["user"]),
+                part_id=int(row["part"]),
+                valid=bool(row["valid"]),
+                solution=solution,
+                feedback=normalize_feedback(feedback),
+                submission_date=_datetime(row["submission_date"]),
+            )
+
+    def history(self, user_id=None):
+        """Yield historical attempts of the given user or of all users."""
+        for row in self._user_rows(self.history_index, user_id):
+            solution, feedback, history_change_reason = self._contents(row)
+            history_user_id = int(row["history_user"])
+            yield HistoricalAttempt(
+                id=int(row["id"]),
+                user_id=int(row["user"]),
+                part_id=int(row["part"]),
+                valid=bool(row["valid"]),
+                solution=solution,
+                feedback=normalize_feedback(feedback),
+                submission_date=_datetime(row["submission_date"]),
+                history_id=int(row["history_id"]),
+                history_date=_datetime(row["history_date"]),
+                history_type=str(row["history_type"]),
+                history_user_id=history_user_id if history_user_id >= 0 else None,
+                history_change_reason=history_change_reason,
+            )
+
+
+def _delete(queryset):
+    """Delete rows of the queryset with a single SQL statement. Unlike
+    QuerySet.delete, no signals are sent, which would record the deletions in
+    the history and refresh outcome counters one attempt at a time."""
+    meta = queryset.model._meta
+    sql, params = queryset.values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {0} WHERE {1} IN ({2})".format(
+                connection.ops.quote_name(meta.db_table),
+                connection.ops.quote_name(meta.pk.column),
+                sql,
+            ),
+            params,
+        )
+
+
+def archive_course(course):
+    """
+    Move attempts and historical attempts of the course from the database into
+    an archive and return the index entry of the archive.
+    """
+    archived = ArchivedCourse(course=course)
+    attempts = Attempt.objects.filter(part__problem__problem_set__course=course)
+    history = HistoricalAttempt.objects.filter(
+        part__problem__problem_set__course=course
+    )
+    # leftovers of an interrupted archiving are overwritten
+    shutil.rmtree(archived.path, ignore_errors=True)
+    try:
+        with transaction.atomic():
+            archived.attempts, archived.history = AttemptArchive.write(
+                archived.path,
+                attempts.order_by("user_id", "part_id").iterator(),
+                history.order_by(
+                    "user_id", "id", "history_date", "history_id"
+                ).iterator(),
+            )
+            archived.save()
+            OutcomeCounter.objects.filter(course=course).delete()
+            SolutionSignature.objects.filter(attempt__in=attempts).delete()
+            _delete(attempts)
+            _delete(history)
+    except BaseException:
+        shutil.rmtree(archived.path, ignore_errors=True)
+        raise
+    return archived
+
+
+def restore_course(course):
+    """Move attempts and historical attempts of the archived course back into
+    the database. Attempts submitted since archiving take precedence."""
+    archived = ArchivedCourse.objects.get(course=course)
+    archive = AttemptArchive(archived.path)
+    attempts = list(archive.attempts())
+    submission_dates = [attempt.submission_date for attempt in attempts]
+    for attempt in attempts:
+        attempt.content_hash = attempt.get_content_hash()
+    with transaction.atomic():
+        Attempt.objects.bulk_create(attempts, batch_size=1000, ignore_conflicts=True)
+        # submission dates are overwritten when attempts are created
+        for attempt, submission_date in zip(attempts, submission_dates):
+            attempt.submission_date = submission_date
+        Attempt.objects.bulk_update(attempts, ["submission_date"], batch_size=1000)
+        HistoricalAttempt.objects.bulk_create(archive.history(), batch_size=1000)
+        OutcomeCounter.refresh(
+            problems=apps.get_model("problems", "Problem").objects.filter(
+                problem_set__course=course
+            )
+        )
+        SolutionSignature.refresh(
+            Attempt.objects.filter(part__problem__problem_set__course=course).iterator()
+        )
+        archived.delete()
+
+
+def attempt_lookup(users, parts, course):
+    """
+    Return a dictionary of attempts of the given users on the given parts of the
+    course, keyed by (user_id, part_id) pairs. Attempts are loaded in a single
+    query or read from the archive if the course has been archived.
+    """
+    try:
+        archived = ArchivedCourse.objects.get(course=course)
+    except ArchivedCourse.DoesNotExist:
+        # feedback is not shown where attempts are looked up
+        attempts = Attempt.objects.filter(user__in=users, part__in=parts).defer(
+            "feedback"
+        )
+    else:
+        archive = AttemptArchive(archived.path)
+        part_ids = {part.pk for part in parts}
+        attempts = (
+            attempt
+            for user in users
+            for attempt in archive.attempts(user.pk)
+            if attempt.part_id in part_ids
+        )
+    return {(attempt.user_id, attempt.part_id): attempt for attempt in attempts}
@@ -0,0 +1,49 @@
+import base64
+import json
+import zlib
+
+from django.conf import settings
+from utils import truncate
+
+# appended to messages shortened to FEEDBACK_MESSAGE_LIMIT characters
+TRUNCATION_INDICATOR = "\n... (sporočilo je skrajšano)"
+
+
+def truncate_feedback(messages):
+    """Return the list of feedback messages, each shortened to at most
+    FEEDBACK_MESSAGE_LIMIT characters."""
+    return [
+        truncate(message, settings.FEEDBACK_MESSAGE_LIMIT, TRUNCATION_INDICATOR)
+        for message in messages
+    ]
+
+
+def pack_feedback(messages):
+    """
+    Return the value of the feedback column for the given list of messages.
+    Lists whose JSON is longer than FEEDBACK_COMPRESSION_THRESHOLD characters
+    are stored as zlib-compressed JSON in a dictionary, and small lists are
+    stored as they are.
+    """
+    data = json.dumps(messages)
+    if len(data) <= settings.FEEDBACK_COMPRESSION_THRESHOLD:
+        return messages
+    compressed = zlib.compress(data.encode("utf-8"))
+    return {"zlib": base64.b64encode(compressed).decode("ascii")}
+
+
+def unpack_feedback(value):
+    """Return the list of messages stored in the feedback column."""
+    if isinstance(value, dict):
+        data = zlib.decompress(base64.b64decode(value["zlib"]))
+        return json.loads(data.decode("utf-8"))
+    return value
+
+
+def normalize_feedback(value):
+    """Return the value of the feedback column given in its former form, a JSON
+    string of a list of messages that was usually JSON-encoded once more, or in
+    the current form."""
+    while isinstance(value, str):
+        value = json.loads(value)
+    return value
@@ -0,0 +1,267 @@
+import json
+import zlib
+from difflib import SequenceMatcher
+
+from django.db import models, transaction
+from django.db.models.query import ModelIterable
+from simple_history.manager import HistoricalQuerySet, HistoryDescriptor, HistoryManager
+
+from .feedback import normalize_feedback
+
+# every this many compacted records of an attempt, its full state is stored
+SNAPSHOT_INTERVAL = 20
+
+
+def _diff(base, text):
+    """Return a list of operations that turn the base text into the given one.
+    Ranges of unchanged lines are given as pairs of line indices in the base
+    text and all other lines are given literally."""
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    operations = []
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([i1, i2])
+        elif j1 < j2:
+            operations.append("".join(lines[j1:j2]))
+    return operations
+
+
+def _patch(base, operations):
+    base_lines = base.splitlines(keepends=True)
+    return "".join(
+        "".join(base_lines[slice(*operation)])
+        if isinstance(operation, list)
+        else operation
+        for operation in operations
+    )
+
+
+def compress(state, base=None):
+    """Return the compacted form of a (solution, feedback) pair, stored as a
+    difference from the base state if one is given. Feedback is given as the
+    JSON text of the value of the feedback column."""
+    solution, feedback = state
+    if base is None:
+        data = {"solution": solution, "feedback": feedback}
+    else:
+        data = {
+            "solution_diff": _diff(base[0], solution),
+            "feedback_diff": _diff(base[1], feedback),
+        }
+    return zlib.compress(json.dumps(data).encode("utf-8"))
+
+
+def decompress(delta, base=None):
+    """Return the (solution, feedback) pair stored in the compacted form and
+    whether it is stored in full."""
+    data = json.loads(zlib.decompress(delta).decode("utf-8"))
+    if "solution" in data:
+        return (data["solution"], data["feedback"]), True
+    state = (
+        _patch(base[0], data["solution_diff"]),
+        _patch(base[1], data["feedback_diff"]),
+    )
+    return state, False
+
+
+# historical records of each attempt are compacted in this order
+CHAIN_ORDERING = ("id", "history_date", "history_id")
+
+
+def group_by_attempt(records):
+    """Split records given in CHAIN_ORDERING into lists for each attempt."""
+    group = []
+    for record in records:
+        if group and record.id != group[0].id:
+            yield group
+            group = []
+        group.append(record)
+    if group:
+        yield group
+
+
+def _states(chain):
+    """Yield records of a single attempt, given in CHAIN_ORDERING, together
+    with their (solution, feedback) states and whether they are stored in full,
+    that is, independently of the earlier records."""
+    state = None
+    for record in chain:
+        if record.delta is None:
+            state = record.solution, json.dumps(record.feedback)
+            yield record, state, True
+        else:
+            state, snapshot = decompress(record.delta, state)
+            yield record, state, snapshot
+
+
+def compact(records):
+    """
+    Compact the historical records of a single attempt, given in
+    CHAIN_ORDERING, and return those that were changed. Records compacted
+    earlier are left as they are.
+    """
+    changed = []
+    base = None
+    since_snapshot = 0
+    for record in records:
+        if record.delta is None:
+            state = record.solution, json.dumps(record.feedback)
+            if base is None or since_snapshot + 1 >= SNAPSHOT_INTERVAL:
+                record.delta = compress(state)
+                since_snapshot = 0
+            else:
+                record.delta = compress(state, base)
+                since_snapshot += 1
+            record.solution = ""
+            record.feedback = []
+            changed.append(record)
+        else:
+            state, snapshot = decompress(record.delta, base)
+            since_snapshot = 0 if snapshot else since_snapshot + 1
+        base = state
+    return changed
+
+
+def expand(records):
+    """
+    Restore solutions and feedback of compacted historical records in place,
+    loading the earlier records they depend on in a single query.
+    """
+    compacted = [
+        record
+        for record in records
+        if "delta" not in record.get_deferred_fields() and record.delta is not None
+    ]
+    if not compacted:
+        return
+    chains = (
+        type(compacted[0])
+        ._base_manager.filter(id__in={record.id for record in compacted})
+        .only("id", "history_date", "history_id", "solution", "feedback", "delta")
+        .order_by(*CHAIN_ORDERING)
+    )
+    states = {
+        record.history_id: state
+        for chain in group_by_attempt(chains)
+        for record, state, _ in _states(chain)
+    }
+    for record in compacted:
+        record.solution, feedback = states[record.history_id]
+        # records compacted before feedback was stored as JSON hold its old form
+        record.feedback = normalize_feedback(feedback)
+
+
+class ExpandedHistoryIterable(ModelIterable):
+    def __iter__(self):
+        # records streamed by QuerySet.iterator are restored a chunk at a time
+        records = []
+        for record in super().__iter__():
+            records.append(record)
+            if self.chunked_fetch and len(records) == self.chunk_size:
+                expand(records)
+                yield from records
+                records = []
+        expand(records)
+        yield from records
+
+
+# fields that are empty in compacted records until they are restored
+COMPACTED_FIELDS = {"solution", "feedback"}
+
+
+class CompactHistoryQuerySetMixin:
+    """
+    Restores compacted records when they are loaded and refuses to load their
+    compacted fields as plain values. Records that depend on deleted ones are
+    stored in full before the deletion, so that they can still be restored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._iterable_class = ExpandedHistoryIterable
+
+    def _check_values(self, fields, expressions):
+        if (not fields and not expressions) or COMPACTED_FIELDS.intersection(fields):
+            raise TypeError(
+                "Solutions and feedback of historical records may be compacted "
+                "and are restored only when whole records are loaded."
+            )
+
+    def values(self, *fields, **expressions):
+        self._check_values(fields, expressions)
+        return super().values(*fields, **expressions)
+
+    def values_list(self, *fields, **kwargs):
+        self._check_values(fields, {})
+        return super().values_list(*fields, **kwargs)
+
+    @transaction.atomic
+    def delete(self):
+        base_manager = self.model._base_manager
+        deleted = base_manager.filter(pk__in=self.values("pk"))
+        dependent = base_manager.filter(
+            id__in=deleted.values("id"), delta__isnull=False
+        ).exclude(pk__in=deleted.values("pk"))
+        if not dependent.exists():
+            return super().delete()
+        deleted_ids = set(deleted.values_list("pk", flat=True))
+        chains = (
+            base_manager.filter(id__in=dependent.values("id"))
+            .only("id", "history_date", "history_id", "solution", "feedback", "delta")
+            .order_by(*CHAIN_ORDERING)
+        )
+        changed = []
+        for chain in group_by_attempt(chains):
+            previous = None
+            for record, state, snapshot in _states(chain):
+                if (
+                    previous in deleted_ids
+                    and record.pk not in deleted_ids
+                    and not snapshot
+                ):
+                    record.delta = compress(state)
+                    changed.append(record)
+                previous = record.pk
+        result = super().delete()
+        base_manager.bulk_update(changed, ["delta"], batch_size=1000)
+        return result
+
+
+class CompactHistoryQuerySet(CompactHistoryQuerySetMixin, models.QuerySet):
+    pass
+
+
+class CompactHistoricalQuerySet(CompactHistoryQuerySetMixin, HistoricalQuerySet):
+    pass
+
+
+class CompactHistoryDescriptor(HistoryDescriptor):
+    """The history of a model with compacted historical records, which is also
+    used by the history views of SimpleHistoryAdmin."""
+
+    def __get__(self, instance, owner):
+        manager_class = HistoryManager.from_queryset(CompactHistoricalQuerySet)
+        return manager_class(self.model, instance)
+
+
+class CompactHistoryModel(models.Model):
+    """
+    Base of historical records whose solutions and feedback may be compacted
+    into zlib-compressed full states or differences from the previous record
+    of the same attempt, see the compact_attempt_history command. Records
+    loaded through the default manager or through the history of the original
+    model, which has to be replaced by a CompactHistoryDescriptor, are restored
+    transparently.
+    """
+
+    delta = models.BinaryField(null=True, editable=False)
+
+    objects = CompactHistoryQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, *args, **kwargs):
+        return type(self).objects.filter(pk=self.pk).delete()
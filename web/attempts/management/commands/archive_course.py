@@ -0,0 +1,25 @@
+"""
+Move attempts of courses into archive files
+"""
+
+from attempts.archive import archive_course
+from courses.models import Course
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = """Moves attempts and their history of the given courses from the
+    database into archive files, from which they are still shown read-only"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("courses", nargs="+", type=int)
+
+    def handle(self, *args, **options):
+        for course in Course.objects.filter(pk__in=options["courses"]):
+            self.stdout.write(f"Archiving {course}...")
+            archived = archive_course(course)
+            self.stdout.write(
+                f"Archived {archived.attempts} attempts "
+                f"and {archived.history} historical attempts."
+            )
+        self.stdout.write("Done!")
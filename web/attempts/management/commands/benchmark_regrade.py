@@ -0,0 +1,84 @@
+"""
+Measure throughput of regrading on synthetic solutions
+"""
+
+import os
+import random
+import time
+
+from attempts.regrade import SandboxPool
+from django.core.management import BaseCommand
+from problems.models import Part
+
+VALIDATIONS = [
+    """
+Check.equal("vsota([1, 2, 3])", 6)
+Check.equal("vsota([])", 0)
+Check.secret(vsota(range(100)))
+""",
+    """
+for n in range(20):
+    Check.equal(f"fakulteta({n})", 1 if n == 0 else n * fakulteta(n - 1))
+""",
+    """
+with Check.time_limit(1):
+    Check.equal("prastevila(30)", [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+""",
+]
+SOLUTIONS = [
+    [
+        "def vsota(xs):\n    return sum(xs)",
+        "def vsota(xs):\n    s = 0\n    for x in xs:\n        s += x\n    return s",
+        "def vsota(xs):\n    return sum(xs[1:])",
+    ],
+    [
+        "def fakulteta(n):\n    return 1 if n == 0 else n * fakulteta(n - 1)",
+        "import math\nfakulteta = math.factorial",
+        "def fakulteta(n):\n    return n * fakulteta(n - 1)",
+    ],
+    [
+        "def prastevila(n):\n"
+        "    return [p for p in range(2, n) if all(p % d for d in range(2, p))]",
+        "def prastevila(n):\n    return [2, 3, 5, 7]",
+        "def prastevila(n):\n    return list(range(2, n, 2))",
+    ],
+]
+
+
+class Command(BaseCommand):
+    help = """Grades synthetic solutions of a problem with three parts in a pool
+    of sandboxes and reports the number of graded solutions per second
+    per core"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--solutions", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        parts = [
+            Part(id=i + 1, validation=validation, secret=["4950"] if i == 0 else [])
+            for i, validation in enumerate(VALIDATIONS)
+        ]
+        jobs = [
+            {
+                part.id: rng.choice(solutions)
+                for part, solutions in zip(parts, SOLUTIONS)
+            }
+            for _ in range(options["solutions"])
+        ]
+        workers = options["workers"]
+        with SandboxPool(workers) as pool:
+            start = time.perf_counter()
+            results = list(pool.grade((parts, solutions) for solutions in jobs))
+            duration = time.perf_counter() - start
+        valid = sum(valid for result in results for valid, _ in result.values())
+        cores = min(workers, os.cpu_count())
+        self.stdout.write(
+            f"Graded {len(jobs)} solutions of {len(parts)} parts "
+            f"({valid} valid parts) in {duration:.2f} s with {workers} workers"
+        )
+        self.stdout.write(
+            f"{len(jobs) / duration / cores:.1f} solutions per second per core"
+        )
@@ -0,0 +1,99 @@
+"""
+Measure finding of similar solutions on synthetic attempts
+"""
+
+import random
+import re
+import time
+
+from attempts.similarity import signature, similar_pairs
+from django.core.management import BaseCommand
+
+NAMES = ["x", "y", "z", "i", "j", "n", "s", "vsota", "seznam", "rezultat", "stevec"]
+STATEMENTS = [
+    "{a} = {b} + {n}",
+    "{a} = [{b} * {n} for {b} in range({a})]",
+    "for {a} in range({n}):\n    {b} += {a} * {a}",
+    "while {a} > {n}:\n    {a} //= 2",
+    "if {a} % {n} == 0:\n    {b}.append({a})",
+    "{a} = max({b}, {n})",
+    "{a} = len({b}) - {n}",
+    "return {a}",
+]
+
+
+def random_solution(rng):
+    lines = ["def f({}):".format(rng.choice(NAMES))]
+    for _ in range(rng.randint(3, 12)):
+        statement = rng.choice(STATEMENTS).format(
+            a=rng.choice(NAMES), b=rng.choice(NAMES), n=rng.randint(0, 100)
+        )
+        lines.extend("    " + line for line in statement.split("\n"))
+    return "\n".join(lines)
+
+
+def disguised_copy(solution, rng):
+    """Return the solution with renamed identifiers and changed whitespace."""
+    renames = dict(zip(NAMES, rng.sample(NAMES, len(NAMES))))
+    solution = re.sub(r"\b\w+\b", lambda m: renames.get(m.group(), m.group()), solution)
+    return re.sub(r" ([=+*-]) ", r"\1", solution) + "\n# my own solution"
+
+
+class Command(BaseCommand):
+    help = """Generates synthetic solutions, some of which are disguised copies of
+    other solutions of the same part, and reports the time needed to compute their
+    signatures and to find similar pairs in each part"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=100000)
+        parser.add_argument("--parts", type=int, default=250)
+        parser.add_argument("--copies", type=float, default=0.05)
+        parser.add_argument("--threshold", type=float, default=0.8)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        attempts_per_part = options["attempts"] // options["parts"]
+        parts = []
+        for _ in range(options["parts"]):
+            solutions = []
+            copies = set()
+            for index in range(attempts_per_part):
+                if solutions and rng.random() < options["copies"]:
+                    original = rng.randrange(len(solutions))
+                    solutions.append(disguised_copy(solutions[original], rng))
+                    copies.add((original, index))
+                else:
+                    solutions.append(random_solution(rng))
+            parts.append((solutions, copies))
+
+        start = time.perf_counter()
+        signatures = [
+            [(index, signature(solution)) for index, solution in enumerate(solutions)]
+            for solutions, _ in parts
+        ]
+        duration = time.perf_counter() - start
+        attempts = attempts_per_part * len(parts)
+        self.stdout.write(
+            f"Computed {attempts} signatures in {duration:.2f} s "
+            f"({1000 * duration / attempts:.3f} ms per attempt)"
+        )
+
+        found_pairs = found_copies = all_copies = 0
+        slowest = 0
+        start = time.perf_counter()
+        for part_signatures, (_, copies) in zip(signatures, parts):
+            part_start = time.perf_counter()
+            pairs = similar_pairs(part_signatures, options["threshold"])
+            slowest = max(slowest, time.perf_counter() - part_start)
+            found = {tuple(sorted(pair[:2])) for pair in pairs}
+            found_pairs += len(found)
+            found_copies += len(copies & found)
+            all_copies += len(copies)
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            f"Found {found_pairs} similar pairs in {len(parts)} parts of "
+            f"{attempts_per_part} attempts in {duration:.2f} s "
+            f"(at most {1000 * slowest:.1f} ms per part)"
+        )
+        self.stdout.write(f"Found {found_copies} of {all_copies} disguised copies")
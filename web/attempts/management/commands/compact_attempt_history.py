@@ -0,0 +1,50 @@
+"""
+Compact solutions and feedback of historical attempts
+"""
+
+from attempts.history import CHAIN_ORDERING, compact, group_by_attempt
+from attempts.models import HistoricalAttempt
+from django.core.management import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = """Stores solutions and feedback of historical attempts as compressed
+    snapshots and differences. It can be run repeatedly to compact records that
+    were added since the last run."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of attempts whose records are compacted at once",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Compacting attempt history...")
+        records = HistoricalAttempt._base_manager.order_by(*CHAIN_ORDERING)
+        attempt_ids = list(
+            records.filter(delta__isnull=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .distinct()
+        )
+        batch_size = options["batch_size"]
+        compacted = 0
+        for start in range(0, len(attempt_ids), batch_size):
+            end = start + batch_size
+            batch_ids = attempt_ids[start:end]
+            with transaction.atomic():
+                batch = records.filter(id__in=batch_ids)
+                changed = []
+                for chain in group_by_attempt(batch):
+                    changed.extend(compact(chain))
+                HistoricalAttempt._base_manager.bulk_update(
+                    changed, ["solution", "feedback", "delta"], batch_size=1000
+                )
+            compacted += len(changed)
+        self.stdout.write(
+            f"Compacted {compacted} records of {len(attempt_ids)} attempts."
+        )
+        self.stdout.write("Done!")
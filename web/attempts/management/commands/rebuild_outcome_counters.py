@@ -0,0 +1,27 @@
+"""
+Rebuild outcome counters from attempts
+"""
+
+from attempts.models import OutcomeCounter
+from django.core.management import BaseCommand
+from django.db import transaction
+from problems.models import Problem
+
+
+class Command(BaseCommand):
+    help = """Rebuilds outcome counters from the attempts table"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course", type=int, help="Rebuild only counters of the given course"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding outcome counters...")
+        problems = Problem.objects.all()
+        if options["course"] is not None:
+            problems = problems.filter(problem_set__course=options["course"])
+        with transaction.atomic():
+            OutcomeCounter.objects.filter(problem__in=problems).delete()
+            OutcomeCounter.refresh(problems=problems)
+        self.stdout.write("Done!")
@@ -0,0 +1,29 @@
+"""
+Rebuild signatures of solutions from the attempts table
+"""
+
+from attempts.models import Attempt, SolutionSignature
+from django.core.management import BaseCommand
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = """Rebuilds signatures by which similar solutions are found. Signatures
+    are kept in sync with attempts, so this is only needed for attempts that were
+    submitted before signatures were introduced or their computation changed."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course", type=int, help="Rebuild only signatures of the given course"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding solution signatures...")
+        attempts = Attempt.objects.only("user", "part", "solution")
+        if options["course"] is not None:
+            attempts = attempts.filter(
+                part__problem__problem_set__course=options["course"]
+            )
+        SolutionSignature.refresh(attempts.iterator(chunk_size=BATCH_SIZE))
+        self.stdout.write("Done!")
@@ -0,0 +1,43 @@
+"""
+Regrade stored solutions of problems
+"""
+
+from attempts.regrade import SandboxError, regrade
+from django.core.management import BaseCommand, CommandError
+from problems.models import Problem
+
+
+class Command(BaseCommand):
+    help = """Runs validations of the given problems, or of all problems of the
+    given problem sets or courses, on the stored solutions in sandboxed
+    interpreters and stores the resulting validity and feedback. Only Python
+    problems are regraded."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("problems", nargs="*", type=int)
+        parser.add_argument("--problem-set", type=int, action="append", default=[])
+        parser.add_argument("--course", type=int, action="append", default=[])
+        parser.add_argument(
+            "--user", type=int, action="append", help="Regrade only the given users"
+        )
+        parser.add_argument("--workers", type=int)
+
+    def handle(self, *args, **options):
+        problems = (
+            Problem.objects.filter(pk__in=options["problems"])
+            | Problem.objects.filter(problem_set__in=options["problem_set"])
+            | Problem.objects.filter(problem_set__course__in=options["course"])
+        )
+        for problem in problems:
+            self.stdout.write(f"Regrading {problem}...")
+            if problem.language != "python":
+                self.stdout.write(f"Skipped, {problem.language} is not supported.")
+                continue
+            try:
+                graded, changed = regrade(
+                    [problem], users=options["user"], workers=options["workers"]
+                )
+            except SandboxError as error:
+                raise CommandError(f"Regrading failed: {error}") from error
+            self.stdout.write(f"Regraded {graded} attempts, {len(changed)} changed.")
+        self.stdout.write("Done!")
@@ -0,0 +1,24 @@
+"""
+Move attempts of archived courses back into the database
+"""
+
+from attempts.archive import restore_course
+from courses.models import Course
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = """Moves attempts and their history of the given archived courses back
+    into the database"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("courses", nargs="+", type=int)
+
+    def handle(self, *args, **options):
+        courses = Course.objects.filter(
+            pk__in=options["courses"], attempt_archive__isnull=False
+        )
+        for course in courses:
+            self.stdout.write(f"Restoring {course}...")
+            restore_course(course)
+        self.stdout.write("Done!")
@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+import numpy as np
+
+from .models import Attempt
+from .outcome import Outcome
+
+EMPTY = 0
+INVALID = 1
+VALID = 2
+
+PART_FIELDS = ("id", "problem", "problem__problem_set")
+
+
+def _indices(ids, values):
+    """Return positions of values in the array of (unique) ids."""
+    order = np.argsort(ids)
+    return order[np.searchsorted(ids, values, sorter=order)]
+
+
+def _membership(pairs, size, keys=()):
+    """
+    Return group keys and a matrix with ones where the item with the row index
+    belongs to the group with the column index. Items may belong to several
+    groups or to none at all.
+    """
+    key_indices = {key: index for index, key in enumerate(keys)}
+    rows, columns = [], []
+    for index, key in pairs:
+        rows.append(index)
+        columns.append(key_indices.setdefault(key, len(key_indices)))
+    membership = np.zeros((size, len(key_indices)))
+    membership[rows, columns] = 1
+    return list(key_indices), membership
+
+
+class OutcomeMatrix:
+    """
+    Outcomes of users on parts, stored as a users × parts matrix of EMPTY,
+    INVALID and VALID values, from which outcomes of any groups of users and
+    parts are computed without further queries.
+    """
+
+    def __init__(self, parts, users):
+        self.users = list(users)
+        part_rows = list(parts.values_list(*PART_FIELDS))
+        self.parts = {
+            field: np.array([row[k] for row in part_rows], dtype=np.int64)
+            for k, field in enumerate(PART_FIELDS)
+        }
+        self.user_ids = np.array([user.id for user in self.users], dtype=np.int64)
+        self.values = np.full((len(self.users), len(part_rows)), EMPTY, dtype=np.int8)
+        attempts = np.array(
+            Attempt.objects.filter(part__in=parts, user__in=users)
+            .order_by()
+            .values_list("user", "part", "valid"),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        self.values[
+            _indices(self.user_ids, attempts[:, 0]),
+            _indices(self.parts["id"], attempts[:, 1]),
+        ] = np.where(attempts[:, 2], VALID, INVALID)
+
+    def rows(self):
+        """Yield users together with a list of True, False or None for each part."""
+        cells = (None, False, True)
+        for user, row in zip(self.users, self.values.tolist()):
+            yield user, [cells[value] for value in row]
+
+    def active(self):
+        """Return a boolean array of users that attempted at least one part."""
+        return (self.values != EMPTY).any(axis=1)
+
+    def _part_membership(self, parts_group_by):
+        size = len(self.parts["id"])
+        if not parts_group_by:
+            return _membership(((j, ()) for j in range(size)), size, [()])
+        labels = zip(*(self.parts[field].tolist() for field in parts_group_by))
+        return _membership(enumerate(labels), size)
+
+    def _rollup(self, parts_group_by, user_keys, user_membership):
+        part_keys, part_membership = self._part_membership(parts_group_by)
+        valid = user_membership.T @ (self.values == VALID) @ part_membership
+        invalid = user_membership.T @ (self.values == INVALID) @ part_membership
+        total = np.outer(user_membership.sum(axis=0), part_membership.sum(axis=0))
+        outcomes = defaultdict(Outcome)
+        for i, user_key in enumerate(user_keys):
+            for j, part_key in enumerate(part_keys):
+                outcomes[part_key + user_key] = Outcome(
+                    int(valid[i, j]), int(invalid[i, j]), int(total[i, j])
+                )
+        return outcomes
+
+    def group_dict(self, parts_group_by=(), users_group_by=()):
+        """
+        Return outcomes in the same form as Outcome.group_dict. Parts can be
+        grouped by any of PART_FIELDS, and users either by "id" or not at all.
+        """
+        if users_group_by == ("id",):
+            pairs = ((i, (user.id,)) for i, user in enumerate(self.users))
+            user_keys, user_membership = _membership(pairs, len(self.users))
+        elif not users_group_by:
+            pairs = ((i, ()) for i in range(len(self.users)))
+            user_keys, user_membership = _membership(pairs, len(self.users), [()])
+        else:
+            raise ValueError(f"Users cannot be grouped by {users_group_by}.")
+        return self._rollup(parts_group_by, user_keys, user_membership)
+
+    def course_group_dict(self, groups, parts_group_by=()):
+        """
+        Return outcomes of the given queryset of course groups, keyed by part
+        groups followed by the group id. A user may be a member of several groups.
+        """
+        memberships = groups.model.students.through.objects.filter(
+            coursegroup__in=groups, user__in=self.users
+        ).values_list("user", "coursegroup")
+        user_indices = {user_id: i for i, user_id in enumerate(self.user_ids.tolist())}
+        pairs = (
+            (user_indices[user_id], (group_id,)) for user_id, group_id in memberships
+        )
+        user_keys, user_membership = _membership(
+            pairs,
+            len(self.users),
+            [(group_id,) for group_id in groups.values_list("id", flat=True)],
+        )
+        return self._rollup(parts_group_by, user_keys, user_membership)
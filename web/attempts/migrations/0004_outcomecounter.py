@@ -0,0 +1,101 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_outcome_counters(apps, schema_editor):
+    Attempt = apps.get_model("attempts", "Attempt")
+    OutcomeCounter = apps.get_model("attempts", "OutcomeCounter")
+    counters = {}
+    for user_id, problem_id, problem_set_id, course_id, valid, count in (
+        Attempt.objects.values_list(
+            "user",
+            "part__problem",
+            "part__problem__problem_set",
+            "part__problem__problem_set__course",
+            "valid",
+        )
+        .annotate(Count("id"))
+        .order_by()
+    ):
+        counter = counters.setdefault(
+            (user_id, problem_id),
+            OutcomeCounter(
+                user_id=user_id,
+                problem_id=problem_id,
+                problem_set_id=problem_set_id,
+                course_id=course_id,
+            ),
+        )
+        if valid:
+            counter.valid = count
+        else:
+            counter.invalid = count
+    OutcomeCounter.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("courses", "0004_course_library"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("problems", "0005_alter_historicalproblem_visible_and_more"),
+        ("attempts", "0003_alter_attempt_part"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutcomeCounter",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("valid", models.PositiveIntegerField(default=0)),
+                ("invalid", models.PositiveIntegerField(default=0)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="courses.course",
+                    ),
+                ),
+                (
+                    "problem",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outcome_counters",
+                        to="problems.problem",
+                    ),
+                ),
+                (
+                    "problem_set",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="courses.problemset",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outcome_counters",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "problem")},
+            },
+        ),
+        migrations.RunPython(fill_outcome_counters, migrations.RunPython.noop),
+    ]
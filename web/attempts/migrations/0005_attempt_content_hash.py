@@ -0,0 +1,38 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:24
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def fill_content_hashes(apps, schema_editor):
+    Attempt = apps.get_model("attempts", "Attempt")
+    attempts = []
+    for attempt in Attempt.objects.only("solution", "valid", "feedback").iterator(
+        chunk_size=1000
+    ):
+        data = [attempt.solution, attempt.valid, json.loads(attempt.feedback)]
+        attempt.content_hash = hashlib.sha256(
+            json.dumps(data).encode("utf-8")
+        ).hexdigest()
+        attempts.append(attempt)
+        if len(attempts) == 1000:
+            Attempt.objects.bulk_update(attempts, ["content_hash"])
+            attempts = []
+    Attempt.objects.bulk_update(attempts, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("attempts", "0004_outcomecounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attempt",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+    ]
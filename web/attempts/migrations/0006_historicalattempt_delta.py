@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("attempts", "0005_attempt_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalattempt",
+            name="delta",
+            field=models.BinaryField(null=True),
+        ),
+    ]
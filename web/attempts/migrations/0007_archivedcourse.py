@@ -0,0 +1,39 @@
+# Generated by Django 4.1.13 on 2026-10-17 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("courses", "0004_course_library"),
+        ("attempts", "0006_historicalattempt_delta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedCourse",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("history", models.PositiveIntegerField(default=0)),
+                ("archived", models.DateTimeField(auto_now_add=True)),
+                (
+                    "course",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attempt_archive",
+                        to="courses.course",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.1.13 on 2026-10-17 20:04
+
+import base64
+import json
+import zlib
+
+from django.db import migrations, models
+
+# Frozen copies of the helpers in attempts.feedback, so that this migration does
+# not change with them or with the settings they read.
+COMPRESSION_THRESHOLD = 2000
+BATCH_SIZE = 1000
+
+
+def normalize_feedback(value):
+    while isinstance(value, str):
+        value = json.loads(value)
+    return value
+
+
+def pack_feedback(messages):
+    data = json.dumps(messages)
+    if len(data) <= COMPRESSION_THRESHOLD:
+        return messages
+    compressed = zlib.compress(data.encode("utf-8"))
+    return {"zlib": base64.b64encode(compressed).decode("ascii")}
+
+
+def unpack_feedback(value):
+    if isinstance(value, dict):
+        data = zlib.decompress(base64.b64decode(value["zlib"]))
+        return json.loads(data.decode("utf-8"))
+    return value
+
+
+def _convert_feedback(apps, convert):
+    # Rows are converted in batches, each saved with a single query.
+    for model_name in ["Attempt", "HistoricalAttempt"]:
+        model = apps.get_model("attempts", model_name)
+        objects = model.objects.only("pk", "feedback").order_by("pk")
+        changed = []
+        for obj in objects.iterator(chunk_size=BATCH_SIZE):
+            obj.feedback = convert(obj.feedback)
+            changed.append(obj)
+            if len(changed) == BATCH_SIZE:
+                model.objects.bulk_update(changed, ["feedback"])
+                changed = []
+        model.objects.bulk_update(changed, ["feedback"])
+
+
+def encode_feedback(apps, schema_editor):
+    # Text columns are rewritten with JSON text before their type is changed.
+    # Compacted historical records have empty feedback.
+    _convert_feedback(
+        apps,
+        lambda feedback: json.dumps(
+            pack_feedback(normalize_feedback(feedback) if feedback else [])
+        ),
+    )
+
+
+def decode_feedback(apps, schema_editor):
+    _convert_feedback(
+        apps,
+        lambda feedback: json.dumps(json.dumps(unpack_feedback(json.loads(feedback)))),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("attempts", "0008_solutionsignature"),
+    ]
+
+    operations = [
+        migrations.RunPython(encode_feedback, decode_feedback),
+        migrations.AlterField(
+            model_name="attempt",
+            name="feedback",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AlterField(
+            model_name="historicalattempt",
+            name="feedback",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,9 +1,34 @@
+import hashlib
 import json
+import shutil
+from functools import partial
+from itertools import islice
+from pathlib import Path
 
-from django.db import models
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from simple_history.models import HistoricalRecords
 from users.models import User
-from utils import is_json_string_list
+
+from . import similarity
+from .feedback import unpack_feedback
+from .history import CompactHistoryDescriptor, CompactHistoryModel
+
+
+def attempt_hash(solution, valid, feedback):
+    """
+    Return the hash of a submitted attempt state, computed in the same way by
+    attempt files, which send only the hash for parts that have not changed.
+    Feedback is given as the JSON string of the list of messages, which is how
+    attempt files send it.
+    """
+    data = json.dumps([solution, valid, feedback]).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
 
 
 class Attempt(models.Model):
@@ -13,8 +38,13 @@ class Attempt(models.Model):
     )
     solution = models.TextField(blank=True)
     valid = models.BooleanField(default=False)
-    feedback = models.TextField(default="[]", validators=[is_json_string_list])
-    history = HistoricalRecords()
+    # list of messages, compressed if large, see attempts/feedback.py
+    feedback = models.JSONField(default=list)
+    # hash of the submitted state, by which unchanged submissions are recognised
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    history = HistoricalRecords(
+        excluded_fields=["content_hash"], bases=[CompactHistoryModel]
+    )
     submission_date = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -26,4 +56,246 @@ class Attempt(models.Model):
         )
 
     def feedback_list(self):
-        return json.loads(json.loads(self.feedback))
+        return unpack_feedback(self.feedback)
+
+    def get_content_hash(self):
+        return attempt_hash(self.solution, self.valid, json.dumps(self.feedback_list()))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.content_hash = self.get_content_hash()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "content_hash"}
+        # Saving an unchanged attempt would only add a duplicate history record.
+        loaded_values = getattr(self, "_loaded_values", {})
+        saved_fields = {
+            "content_hash": "content_hash",
+            "user_id": "user",
+            "part_id": "part",
+        }
+        if not self._state.adding and all(
+            loaded_values.get(field) == getattr(self, field) for field in saved_fields
+        ):
+            return
+        super().save(*args, **kwargs)
+        # The saved values are now the ones stored in the database.
+        update_fields = kwargs.get("update_fields")
+        self._loaded_values = {
+            **loaded_values,
+            **{
+                field: getattr(self, field)
+                for field, name in saved_fields.items()
+                if update_fields is None or {field, name} & set(update_fields)
+            },
+        }
+
+
+# compacted records reached through attempt.history are restored as well
+Attempt.history = CompactHistoryDescriptor(Attempt.history.model)
+
+
+class OutcomeCounter(models.Model):
+    """
+    Numbers of valid and invalid attempts of a user on the parts of a problem.
+
+    Counters are kept in sync with attempts, so that outcomes can be computed
+    without scanning the whole attempts table.
+    """
+
+    course = models.ForeignKey(
+        "courses.Course", on_delete=models.CASCADE, related_name="+"
+    )
+    problem_set = models.ForeignKey(
+        "courses.ProblemSet", on_delete=models.CASCADE, related_name="+"
+    )
+    problem = models.ForeignKey(
+        "problems.Problem", on_delete=models.CASCADE, related_name="outcome_counters"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="outcome_counters"
+    )
+    valid = models.PositiveIntegerField(default=0)
+    invalid = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "problem")
+
+    def __str__(self):
+        return "{} vs. {}: {} valid, {} invalid".format(
+            self.user.username, self.problem.title, self.valid, self.invalid
+        )
+
+    @classmethod
+    def refresh(cls, users=None, problems=None):
+        """Recompute counters of the given users on the given problems.
+
+        Both arguments may be lists of ids or querysets, and None stands for all
+        users or problems. Counters of pairs without attempts are reset to zero.
+        """
+        attempts = Attempt.objects.all()
+        counters = cls.objects.all()
+        if users is not None:
+            attempts = attempts.filter(user__in=users)
+            counters = counters.filter(user__in=users)
+        if problems is not None:
+            attempts = attempts.filter(part__problem__in=problems)
+            counters = counters.filter(problem__in=problems)
+        refreshed = {}
+        for user_id, problem_id, problem_set_id, course_id, valid, count in (
+            attempts.values_list(
+                "user",
+                "part__problem",
+                "part__problem__problem_set",
+                "part__problem__problem_set__course",
+                "valid",
+            )
+            .annotate(Count("id"))
+            .order_by()
+        ):
+            counter = refreshed.setdefault(
+                (user_id, problem_id),
+                cls(
+                    user_id=user_id,
+                    problem_id=problem_id,
+                    problem_set_id=problem_set_id,
+                    course_id=course_id,
+                ),
+            )
+            if valid:
+                counter.valid = count
+            else:
+                counter.invalid = count
+        with transaction.atomic():
+            counters.update(valid=0, invalid=0)
+            cls.objects.bulk_create(
+                refreshed.values(),
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["user", "problem"],
+                update_fields=["course", "problem_set", "valid", "invalid"],
+            )
+
+
+class SolutionSignature(models.Model):
+    """
+    MinHash signature of the solution of an attempt, by which similar solutions
+    are found, see attempts.similarity. Signatures are kept in sync with
+    attempts, except for attempts with empty solutions or solutions equal to the
+    template of the part, which have none.
+    """
+
+    attempt = models.OneToOneField(
+        Attempt, on_delete=models.CASCADE, related_name="signature"
+    )
+    part = models.ForeignKey(
+        "problems.Part", on_delete=models.CASCADE, related_name="+"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return "Signature of {}".format(self.attempt)
+
+    def values(self):
+        return np.frombuffer(self.signature, dtype=np.uint32)
+
+    @classmethod
+    def refresh(cls, attempts):
+        """Recompute signatures of the given saved attempts, which are processed
+        in batches, so any iterable of them may be given."""
+        part_model = apps.get_model("problems", "Part")
+        templates = {}
+        attempts = iter(attempts)
+        for batch in iter(lambda: list(islice(attempts, 1000)), []):
+            missing = {attempt.part_id for attempt in batch} - templates.keys()
+            if missing:
+                templates.update(
+                    part_model.objects.filter(pk__in=missing).values_list(
+                        "pk", "template"
+                    )
+                )
+            signatures = []
+            empty = []
+            for attempt in batch:
+                values = similarity.signature(
+                    attempt.solution, templates.get(attempt.part_id, "")
+                )
+                if values is None:
+                    empty.append(attempt.pk)
+                else:
+                    signatures.append(
+                        cls(
+                            attempt_id=attempt.pk,
+                            part_id=attempt.part_id,
+                            user_id=attempt.user_id,
+                            signature=values.tobytes(),
+                        )
+                    )
+            with transaction.atomic():
+                cls.objects.filter(attempt__in=empty).delete()
+                cls.objects.bulk_create(
+                    signatures,
+                    batch_size=1000,
+                    update_conflicts=True,
+                    unique_fields=["attempt"],
+                    update_fields=["part", "user", "signature"],
+                )
+
+
+class ArchivedCourse(models.Model):
+    """
+    A course whose attempts and historical attempts were moved from the
+    database into archive files under settings.ATTEMPT_ARCHIVE_ROOT, see
+    attempts.archive.
+    """
+
+    course = models.OneToOneField(
+        "courses.Course", on_delete=models.CASCADE, related_name="attempt_archive"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    history = models.PositiveIntegerField(default=0)
+    archived = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "{} ({} attempts)".format(self.course.title, self.attempts)
+
+    @property
+    def path(self):
+        return Path(settings.ATTEMPT_ARCHIVE_ROOT) / str(self.course_id)
+
+
+@receiver(post_save, sender=Attempt)
+def refresh_outcome_counter(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or "valid" in update_fields:
+        OutcomeCounter.refresh([instance.user_id], [instance.part.problem_id])
+
+
+@receiver(post_save, sender=Attempt)
+def refresh_solution_signature(sender, instance, update_fields, **kwargs):
+    if update_fields is None or "solution" in update_fields:
+        SolutionSignature.refresh([instance])
+
+
+@receiver(post_delete, sender=Attempt)
+def refresh_deleted_outcome_counter(sender, instance, **kwargs):
+    # the part is not fetched, as it may be deleted together with its attempts
+    parts = apps.get_model("problems", "Part").objects.filter(pk=instance.part_id)
+    OutcomeCounter.refresh([instance.user_id], parts.values("problem"))
+
+
+@receiver(post_save, sender="problems.Problem")
+def move_outcome_counters(sender, instance, **kwargs):
+    instance.outcome_counters.exclude(problem_set=instance.problem_set_id).update(
+        problem_set=instance.problem_set_id, course=instance.problem_set.course_id
+    )
+
+
+@receiver(post_delete, sender=ArchivedCourse)
+def remove_archive_files(sender, instance, **kwargs):
+    transaction.on_commit(partial(shutil.rmtree, instance.path, ignore_errors=True))
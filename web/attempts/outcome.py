@@ -1,10 +1,10 @@
 from collections import defaultdict
 from dataclasses import dataclass
 
-from django.db.models import Count
+from django.db.models import Count, Sum
 from django.utils.translation import gettext_lazy as _
 
-from .models import Attempt
+from .models import Attempt, OutcomeCounter
 
 
 def _group_sizes(queryset, *group_by):
@@ -75,6 +75,33 @@ class Outcome:
                 outcomes[part_group + user_group] = cls(
                     total=part_group_size * user_group_size
                 )
+        if all(g == "problem" or g.startswith("problem__") for g in parts_group_by):
+            counts = cls._counter_outcomes(parts, users, parts_group_by, users_group_by)
+        else:
+            counts = cls._attempt_outcomes(parts, users, parts_group_by, users_group_by)
+        for group, outcome in counts:
+            outcomes[group] += outcome
+        return outcomes
+
+    @classmethod
+    def _counter_outcomes(cls, parts, users, parts_group_by, users_group_by):
+        # Counters cover whole problems, so parts must include all parts of
+        # their problems, which holds whenever they are filtered by problem.
+        counters = OutcomeCounter.objects.filter(
+            problem__in=parts.values("problem"), user__in=users
+        ).order_by()
+        group_by = list(parts_group_by) + [f"user__{g}" for g in users_group_by]
+        if group_by:
+            counts = counters.values_list(*group_by).annotate(
+                Sum("valid"), Sum("invalid")
+            )
+        else:
+            counts = [counters.aggregate(Sum("valid"), Sum("invalid")).values()]
+        for *group, valid, invalid in counts:
+            yield tuple(group), cls(valid=valid or 0, invalid=invalid or 0)
+
+    @classmethod
+    def _attempt_outcomes(cls, parts, users, parts_group_by, users_group_by):
         attempts = Attempt.objects.filter(part__in=parts, user__in=users).distinct()
         group_by = [f"part__{g}" for g in parts_group_by] + [
             f"user__{g}" for g in users_group_by
@@ -82,5 +109,4 @@ class Outcome:
         for (*group, valid), count in _group_sizes(
             attempts, *group_by, "valid"
         ).items():
-            outcomes[tuple(group)] += cls(valid=count) if valid else cls(invalid=count)
-        return outcomes
+            yield tuple(group), cls(valid=count) if valid else cls(invalid=count)
@@ -0,0 +1,274 @@
+import json
+import os
+import pwd
+import queue
+import signal
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from simple_history.utils import bulk_update_with_history
+
+from .feedback import pack_feedback, truncate_feedback
+from .models import Attempt, OutcomeCounter
+from .sandbox import SETUP_FAILED, TIMEOUT
+
+# largest file, including the result, that graded solutions may write
+FILE_SIZE_LIMIT = 16 * 1024 * 1024
+# number of characters of the error output reported when grading fails
+ERROR_LENGTH = 2000
+TIMEOUT_MESSAGE = "Dovoljen čas izvajanja presežen"
+SANDBOX_SCRIPT = Path(__file__).resolve().parent / "sandbox.py"
+# script run by each new sandbox to check that it works
+CHECK_SCRIPT = 'import sys\nwith open(sys.argv[1], "w") as f:\n    f.write("[]")\n'
+
+
+class GradingError(Exception):
+    pass
+
+
+class SandboxError(Exception):
+    """Raised when the sandbox cannot run solutions at all, so that no solution
+    is graded."""
+
+
+def grading_script(parts, solutions):
+    """Return the source of a script that runs validations of the given parts of
+    a Python problem on the given solutions, keyed by part ids, and writes the
+    validity, feedback and secrets of parts with solutions into the file given
+    as its argument. Parts without a solution get their templates, as they do in
+    attempt files."""
+    solutions = [(part, solutions.get(part.id, part.template)) for part in parts]
+    return render_to_string(
+        "python/regrade.py",
+        {
+            "parts": solutions,
+            "parts_json": json.dumps(
+                [
+                    {"part": part.id, "solution": solution}
+                    for part, solution in solutions
+                ]
+            ),
+        },
+    )
+
+
+class Sandbox:
+    """
+    A separate interpreter running attempts/sandbox.py, which runs grading
+    scripts in forked processes with limited CPU time, memory, file sizes and
+    number of processes, each in its own empty directory and process group, as
+    settings.REGRADE_SANDBOX_USER and without network access. If the server
+    runs neither as root nor as that user, the interpreter is started through
+    sudo. A sandbox runs a single script at a time, and it runs a trivial
+    script when it starts, so that a misconfigured sandbox fails before it
+    grades any solutions.
+    """
+
+    def __init__(self, time_limit=None, memory_limit=None):
+        user = settings.REGRADE_SANDBOX_USER
+        limits = [
+            time_limit or settings.REGRADE_TIME_LIMIT,
+            memory_limit or settings.REGRADE_MEMORY_LIMIT,
+            FILE_SIZE_LIMIT,
+            settings.REGRADE_PROCESS_LIMIT,
+        ]
+        command = [sys.executable, "-I", "-X", "utf8", str(SANDBOX_SCRIPT)]
+        command += [str(limit) for limit in limits] + [user]
+        uid = os.getuid()
+        if uid != 0 and pwd.getpwuid(uid).pw_name != user:
+            command = ["sudo", "-n", "-u", user, "--"] + command
+        self.process = subprocess.Popen(
+            command,
+            env={},
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            self.run(CHECK_SCRIPT)
+        except Exception as error:
+            self.close()
+            if isinstance(error, SandboxError):
+                raise
+            raise SandboxError(f"The sandbox does not work: {error}") from error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+
+    def run(self, script):
+        """Run the grading script and return the list of graded parts. Raise
+        GradingError if the script does not finish, and SandboxError if the
+        sandbox could not run it."""
+        try:
+            self.process.stdin.write(json.dumps(script) + "\n")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            pass
+        response = self.process.stdout.readline()
+        if not response:
+            raise SandboxError("The sandbox has stopped, see its error output.")
+        response = json.loads(response)
+        if response["status"] == SETUP_FAILED:
+            raise SandboxError(
+                "The sandbox cannot isolate solutions:\n" + response["error"]
+            )
+        if response["status"] in (TIMEOUT, -signal.SIGXCPU, -signal.SIGKILL):
+            raise GradingError(TIMEOUT_MESSAGE)
+        try:
+            return json.loads(response["result"])
+        except (TypeError, ValueError):
+            error = response["error"][-ERROR_LENGTH:].strip()
+            raise GradingError(
+                "Rešitve ni bilo mogoče izvesti\n  {0}".format(
+                    "\n  ".join(error.splitlines())
+                )
+            )
+
+
+def grade(sandbox, parts, solutions):
+    """
+    Run validations of the given parts of a Python problem on the given
+    solutions, keyed by part ids, in the sandbox and return a dictionary of
+    (valid, feedback) pairs of parts with solutions, keyed by part ids. Secrets
+    are checked against the official ones, as they are when attempts are
+    submitted, and solutions that time out or fail are invalid. SandboxError
+    is propagated, since it says nothing about the solutions.
+    """
+    try:
+        graded_parts = sandbox.run(grading_script(parts, solutions))
+    except GradingError as error:
+        return {
+            part.id: (False, [str(error)])
+            for part in parts
+            if solutions.get(part.id, part.template).strip()
+        }
+    parts = {part.id: part for part in parts}
+    results = {}
+    for graded_part in graded_parts:
+        if not graded_part["solution"].strip():
+            continue
+        secret = [x for (x, _) in graded_part["secret"]]
+        secret_matches, _ = parts[graded_part["part"]].check_secret(secret)
+        valid = graded_part["valid"] and secret_matches
+        results[graded_part["part"]] = (valid, graded_part["feedback"])
+    return results
+
+
+class SandboxPool:
+    """
+    A pool of sandboxes, each driven by its own thread, that grade solutions
+    in parallel.
+    """
+
+    def __init__(self, workers=None, time_limit=None, memory_limit=None):
+        workers = workers or settings.REGRADE_WORKERS
+        self.sandboxes = queue.SimpleQueue()
+        try:
+            for _ in range(workers):
+                self.sandboxes.put(Sandbox(time_limit, memory_limit))
+        except SandboxError:
+            while not self.sandboxes.empty():
+                self.sandboxes.get().close()
+            raise
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+        while not self.sandboxes.empty():
+            self.sandboxes.get().close()
+
+    def _grade(self, job):
+        sandbox = self.sandboxes.get()
+        try:
+            return grade(sandbox, *job)
+        finally:
+            self.sandboxes.put(sandbox)
+
+    def grade(self, jobs):
+        """Grade the given (parts, solutions) pairs and yield the results of
+        grade in the same order."""
+        return self.executor.map(self._grade, jobs)
+
+
+def regrade(problems, users=None, workers=None, time_limit=None, memory_limit=None):
+    """
+    Grade stored solutions of the given Python problems by the given users, or
+    all users, and store the resulting validity and feedback. Solutions of each
+    user on each problem are graded together, as they are by attempt files, by
+    a pool of the given number of sandboxes. Return the
+    number of graded attempts and the list of attempts that changed. If the
+    sandboxes fail, SandboxError is raised and no attempts are changed.
+    """
+    problems = [problem for problem in problems if problem.language == "python"]
+    prefetch_related_objects(problems, "parts")
+    parts = {problem.id: list(problem.parts.all()) for problem in problems}
+    jobs = {}
+    attempts = Attempt.objects.filter(part__problem__in=problems).select_related("part")
+    if users is not None:
+        attempts = attempts.filter(user__in=users)
+    attempts = list(attempts)
+    for attempt in attempts:
+        job = jobs.setdefault((attempt.user_id, attempt.part.problem_id), {})
+        job[attempt.part_id] = attempt.solution
+
+    results = {}
+    with SandboxPool(workers, time_limit, memory_limit) as pool:
+        graded_jobs = pool.grade(
+            (parts[problem_id], solutions)
+            for (_, problem_id), solutions in jobs.items()
+        )
+        for (user_id, _), job_results in zip(jobs, graded_jobs):
+            for part_id, result in job_results.items():
+                results[user_id, part_id] = result
+
+    graded = 0
+    changed = []
+    for attempt in attempts:
+        result = results.get((attempt.user_id, attempt.part_id))
+        if result is None:
+            continue
+        graded += 1
+        valid, feedback = result
+        feedback = pack_feedback(truncate_feedback(feedback))
+        if (valid, feedback) != (attempt.valid, attempt.feedback):
+            attempt.valid = valid
+            attempt.feedback = feedback
+            attempt.content_hash = attempt.get_content_hash()
+            changed.append(attempt)
+    if not changed:
+        return graded, changed
+    with transaction.atomic():
+        bulk_update_with_history(
+            changed,
+            Attempt,
+            ["valid", "feedback", "content_hash"],
+            batch_size=1000,
+            default_change_reason="regrade",
+        )
+        OutcomeCounter.refresh(
+            {attempt.user_id for attempt in changed},
+            {attempt.part.problem_id for attempt in changed},
+        )
+    return graded, changed
@@ -1,17 +1,25 @@
 import json
+from copy import copy
 
 from django.core import signing
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import decorators, status, validators
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.response import Response
-from rest_framework.serializers import CharField, Field, ModelSerializer
+from rest_framework.serializers import (
+    CharField,
+    Field,
+    ModelSerializer,
+    ValidationError,
+)
 from rest_framework.viewsets import GenericViewSet
-from utils.rest import JSONStringField
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+from users.authentication import CachedTokenAuthentication
 
-from .models import Attempt
+from .feedback import pack_feedback, truncate_feedback, unpack_feedback
+from .models import ArchivedCourse, Attempt, OutcomeCounter, SolutionSignature
 
 
 def update_fields(obj, new_values):
@@ -28,6 +36,31 @@ class WritableJSONField(Field):
         return data
 
 
+class FeedbackField(Field):
+    """
+    Feedback of an attempt, received as a list of messages or as its JSON string,
+    which Python attempt files send, and stored truncated and compressed if large.
+    Feedback is decoded only when it is represented, as a JSON string unless the
+    feedback_as_string context variable is false.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                raise ValidationError("Not a JSON value.")
+        if type(data) is not list or any(type(x) is not str for x in data):
+            raise ValidationError("Not a list of strings.")
+        return pack_feedback(truncate_feedback(data))
+
+    def to_representation(self, value):
+        messages = unpack_feedback(value)
+        if self.context.get("feedback_as_string", True):
+            return json.dumps(messages)
+        return messages
+
+
 class AttemptSerializer(ModelSerializer):
     """
     Serialize an Attempt object.
@@ -36,7 +69,8 @@ class AttemptSerializer(ModelSerializer):
     solution = CharField(allow_blank=True, trim_whitespace=False)
     secret = WritableJSONField(write_only=True, required=False)
     token = CharField(write_only=True, required=False)
-    feedback = JSONStringField()
+    hash = CharField(write_only=True, required=False)
+    feedback = FeedbackField()
 
     class Meta:
         model = Attempt
@@ -45,7 +79,7 @@ class AttemptSerializer(ModelSerializer):
     @staticmethod
     def check_secret(validated_data):
         # Check and remove secret from the validated_data dictionary
-        user_secret = validated_data.pop("secret", "[]")
+        user_secret = validated_data.pop("secret", [])
         secret_matches, wrong_index = validated_data["part"].check_secret(user_secret)
         if not secret_matches:
             validated_data["valid"] = False
@@ -76,7 +110,9 @@ class AttemptViewSet(GenericViewSet):
     queryset = Attempt.objects.all()
 
     @decorators.action(
-        detail=False, methods=["post"], authentication_classes=[TokenAuthentication]
+        detail=False,
+        methods=["post"],
+        authentication_classes=[CachedTokenAuthentication],
     )
     @transaction.atomic
     def submit(self, request):
@@ -89,11 +125,34 @@ class AttemptViewSet(GenericViewSet):
 
         if serializer.is_valid():
             attempts = []
+            outdated_parts = []
             wrong_indices = {}
             obsolete_api = False
             valid_tokens = True
+            parts = [attempt_data["part"] for attempt_data in serializer.validated_data]
+            # Permission checks below follow part.problem.problem_set.course
+            prefetch_related_objects(parts, "problem__problem_set__course")
+            # attempts of archived courses are read-only until they are restored
+            if ArchivedCourse.objects.filter(
+                course__in={part.problem.problem_set.course_id for part in parts}
+            ).exists():
+                return Response(
+                    {"detail": "Predmet je arhiviran, zato oddaja ni mogoča."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            existing_attempts = {
+                attempt.part_id: attempt
+                for attempt in Attempt.objects.filter(user=request.user, part__in=parts)
+            }
+            now = timezone.now()
+            created_attempts = {}
+            updated_attempts = {}
+            updated_fields = set()
             for attempt_data in serializer.validated_data:
-                if not request.user.can_view_problem(attempt_data["part"].problem):
+                part = attempt_data["part"]
+                # the updated attempt file is the one of the last submitted part
+                problem = part.problem
+                if not request.user.can_view_problem(part.problem):
                     return Response(serializer.errors, status=status.HTTP_403_FORBIDDEN)
                 valid_token = AttemptSerializer.check_token(attempt_data, request.user)
                 valid_tokens &= bool(valid_token)
@@ -102,22 +161,80 @@ class AttemptViewSet(GenericViewSet):
                 elif not valid_token:
                     # if the token is not valid, do not save the attempt
                     continue
+                content_hash = attempt_data.pop("hash", None)
+                if content_hash is not None and "solution" not in attempt_data:
+                    # Unchanged parts are sent only by the hash of their last
+                    # submitted state, which is confirmed without any writes.
+                    attempt = existing_attempts.get(part.pk)
+                    if attempt is not None and attempt.content_hash == content_hash:
+                        attempt = copy(attempt)
+                        attempt.part = part
+                        attempts.append(attempt)
+                    else:
+                        outdated_parts.append(part.pk)
+                    continue
                 wrong_index = AttemptSerializer.check_secret(attempt_data)
-                wrong_indices[attempt_data["part"].pk] = wrong_index
-                updated_fields = None
-                try:
-                    attempt = Attempt.objects.get(
-                        user=request.user, part=attempt_data["part"]
-                    )
-                    updated_fields = update_fields(attempt, attempt_data)
-                except ObjectDoesNotExist:
+                wrong_indices[part.pk] = wrong_index
+                if part.pk in existing_attempts:
+                    # Copy the attempt so that each submitted part is reported
+                    # with its own state, even if the same part is sent twice.
+                    attempt = copy(existing_attempts[part.pk])
+                    changed_fields = update_fields(attempt, attempt_data)
+                    attempt.content_hash = attempt.get_content_hash()
+                    if part.pk in created_attempts:
+                        created_attempts[part.pk] = attempt
+                    elif (
+                        attempt.content_hash != existing_attempts[part.pk].content_hash
+                    ):
+                        # bulk updates do not apply auto_now of submission_date
+                        attempt.submission_date = now
+                        updated_attempts[part.pk] = attempt
+                        updated_fields.update(
+                            changed_fields, ["content_hash", "submission_date"]
+                        )
+                else:
                     attempt = Attempt(user=request.user, **attempt_data)
-                finally:
-                    attempt.save(update_fields=updated_fields)
-                    attempts.append(attempt)
+                    attempt.content_hash = attempt.get_content_hash()
+                    created_attempts[part.pk] = attempt
+                existing_attempts[part.pk] = attempt
+                attempts.append(attempt)
+            if created_attempts:
+                bulk_create_with_history(
+                    list(created_attempts.values()), Attempt, default_user=request.user
+                )
+            if updated_attempts:
+                bulk_update_with_history(
+                    list(updated_attempts.values()),
+                    Attempt,
+                    list(updated_fields),
+                    default_user=request.user,
+                )
+            if created_attempts or "valid" in updated_fields:
+                OutcomeCounter.refresh(
+                    [request.user.pk], {attempt.part.problem_id for attempt in attempts}
+                )
+            if created_attempts or "solution" in updated_fields:
+                SolutionSignature.refresh(
+                    [*created_attempts.values(), *updated_attempts.values()]
+                )
+            for attempt in attempts:
+                if attempt.pk is None:
+                    saved_attempt = existing_attempts[attempt.part_id]
+                    attempt.pk = saved_attempt.pk
+                    attempt.submission_date = saved_attempt.submission_date
+            # feedback is returned in the form in which it was sent
+            feedback_as_string = not any(
+                isinstance(attempt_data.get("feedback"), list)
+                for attempt_data in request.data
+            )
             data = {
-                "attempts": AttemptSerializer(attempts, many=True).data,
+                "attempts": AttemptSerializer(
+                    attempts,
+                    many=True,
+                    context={"feedback_as_string": feedback_as_string},
+                ).data,
                 "wrong_indices": wrong_indices,
+                "outdated": outdated_parts,
             }
             if not valid_tokens:
                 # if not all tokens were valid, invalidate all solutions
@@ -126,7 +243,7 @@ class AttemptViewSet(GenericViewSet):
                     attempt_data["valid"] = False
                 # if the file is a recent one, trigger an update
                 if not obsolete_api:
-                    data["update"] = attempt.part.problem.attempt_file(request.user)[1]
+                    data["update"] = problem.attempt_file(request.user)[1]
                 # if not, tell user where to get the new file
                 else:
                     last_part_feedback = json.loads(data["attempts"][-1]["feedback"])
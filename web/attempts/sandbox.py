@@ -0,0 +1,213 @@
+"""
+Run grading scripts in forked processes with limited resources
+
+This script runs in a separate interpreter without Django. It reads grading
+scripts from its standard input, each given as a line of JSON, runs each in a
+forked process in a new empty directory and answers with a line of JSON with
+the exit code, "timeout" if the process was killed after running too long, or
+"setup failed" if the process could not be isolated before the script started,
+and the result and error output of the script. Forking an already started
+interpreter is much faster than starting a new one.
+
+Scripts run as the given unprivileged user, without network access, without
+environment variables and with a limited number of processes. The interpreter
+either runs as that user already or as root, in which case forked processes
+drop their privileges before they run the scripts. Directories of scripts are
+created by the interpreter, so the server never shares its own files with the
+user.
+"""
+
+import ctypes
+import json
+import os
+import pwd
+import resource
+import shutil
+import signal
+import stat
+import sys
+import tempfile
+import traceback
+
+TIMEOUT = "timeout"
+SETUP_FAILED = "setup failed"
+# modules imported before forking, so that scripts can import them even if
+# the sandbox user cannot read the standard library of this interpreter
+PRELOADED_MODULES = [
+    "collections",
+    "contextlib",
+    "functools",
+    "io",
+    "itertools",
+    "math",
+    "random",
+    "re",
+    "threading",
+    "types",
+]
+# flags of unshare(2)
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+
+def isolate_network():
+    """Move the process into a new network namespace, in which it has no
+    network interfaces apart from loopback, which is down. Unprivileged
+    processes create a new user namespace first, in which they keep their
+    user and group ids."""
+    uid, gid = os.getuid(), os.getgid()
+    flags = CLONE_NEWNET if uid == 0 else CLONE_NEWUSER | CLONE_NEWNET
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(flags) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"Network cannot be isolated: {os.strerror(errno)}")
+    if uid != 0:
+        for filename, contents in [
+            ("uid_map", f"{uid} {uid} 1"),
+            ("setgroups", "deny"),
+            ("gid_map", f"{gid} {gid} 1"),
+        ]:
+            with open(f"/proc/self/{filename}", "w") as f:
+                f.write(contents)
+
+
+def drop_privileges(user):
+    """Switch to the given user if the process runs as root, and make sure that
+    it does not run as root otherwise."""
+    if os.getuid() == 0:
+        entry = pwd.getpwnam(user)
+        os.setgroups([])
+        os.setgid(entry.pw_gid)
+        os.setuid(entry.pw_uid)
+    if os.getuid() == 0 or os.geteuid() == 0:
+        raise PermissionError("Scripts must not run as root.")
+
+
+def isolate(user, limits):
+    isolate_network()
+    drop_privileges(user)
+    os.environ.clear()
+    for limit, value in limits:
+        resource.setrlimit(limit, (value, value))
+
+
+def run(directory, user, limits, ready_fd):
+    # the process gets its own group, so that its children can be killed too
+    os.setsid()
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    os.chdir(directory)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    stderr = os.open("stderr.txt", os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    # standard output is the channel to the server, so it must not be used
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.dup2(stderr, 2)
+    try:
+        isolate(user, limits)
+    except BaseException:
+        traceback.print_exc()
+        sys.stderr.flush()
+        os._exit(2)
+    # the script can only start once the isolation is reported, so it cannot
+    # report it itself
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+    sys.argv = ["regrade.py", os.path.join(directory, "result.json")]
+    try:
+        with open("regrade.py", encoding="utf-8") as f:
+            source = f.read()
+        exec(compile(source, "regrade.py", "exec"), {"__name__": "__main__"})
+        code = 0
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    sys.stderr.flush()
+    os._exit(code)
+
+
+def read_output(path):
+    """Return the contents of a file written by a script, or None if there is
+    no such regular file. Links are not followed, so that scripts cannot make
+    this process read files that they cannot read themselves."""
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+    except OSError:
+        return None
+    with open(fd, encoding="utf-8", errors="replace") as f:
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            return None
+        return f.read()
+
+
+def alarm(signum, frame):
+    raise TimeoutError
+
+
+def grade(script, user, limits, time_limit):
+    directory = tempfile.mkdtemp(prefix="sandbox-")
+    try:
+        with open(os.path.join(directory, "regrade.py"), "w", encoding="utf-8") as f:
+            f.write(script)
+        if os.getuid() == 0:
+            entry = pwd.getpwnam(user)
+            os.chown(directory, entry.pw_uid, entry.pw_gid)
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            run(directory, user, limits, ready_write)
+        os.close(ready_write)
+        status = None
+        try:
+            # sleeping solutions use no CPU time, so wall time is limited too
+            signal.setitimer(signal.ITIMER_REAL, 2 * time_limit)
+            _, status = os.waitpid(pid, 0)
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        except TimeoutError:
+            pass
+        # processes started by the solutions are killed as well
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        if status is None:
+            os.waitpid(pid, 0)
+        with open(ready_read, "rb") as f:
+            ready = f.read() == b"1"
+        if not ready:
+            status = SETUP_FAILED
+        elif status is None:
+            status = TIMEOUT
+        else:
+            status = os.waitstatus_to_exitcode(status)
+        return {
+            "status": status,
+            "result": read_output(os.path.join(directory, "result.json")),
+            "error": read_output(os.path.join(directory, "stderr.txt")) or "",
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(time_limit, memory_limit, file_size_limit, process_limit, user):
+    # soft and hard limits are equal, so graded solutions cannot raise them
+    limits = [
+        (resource.RLIMIT_CPU, time_limit),
+        (resource.RLIMIT_AS, memory_limit),
+        (resource.RLIMIT_FSIZE, file_size_limit),
+        (resource.RLIMIT_CORE, 0),
+        # processes and threads are counted over all processes of the user
+        (resource.RLIMIT_NPROC, process_limit),
+    ]
+    # numpy would reserve memory for a thread per core
+    os.environ.update(OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1")
+    for module in PRELOADED_MODULES:
+        __import__(module)
+    signal.signal(signal.SIGALRM, alarm)
+    for line in iter(sys.stdin.readline, ""):
+        response = grade(json.loads(line), user, limits, time_limit)
+        print(json.dumps(response), flush=True)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:5]), sys.argv[5])
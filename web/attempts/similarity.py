@@ -0,0 +1,151 @@
+import builtins
+import hashlib
+import keyword
+import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+# Signatures consist of BANDS bands of ROWS MinHash values. Solutions whose
+# similarity is s share at least one band with probability 1 - (1 - s^ROWS)^BANDS,
+# which is about 0.5 at s = 0.5 and over 0.99 at s = 0.8.
+BANDS = 16
+ROWS = 4
+PERMUTATIONS = BANDS * ROWS
+# solutions are compared by sets of this many consecutive tokens
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_LOW_BITS = np.uint64((1 << 29) - 1)
+# permutations must be the same in all processes, so they are not random
+_generator = np.random.RandomState(1)
+_A = _generator.randint(1, _MERSENNE_PRIME, size=PERMUTATIONS, dtype=np.uint64)
+_B = _generator.randint(0, _MERSENNE_PRIME, size=PERMUTATIONS, dtype=np.uint64)
+
+TOKEN_REGEX = re.compile(
+    r"""
+    (?P<comment>\#[^\n]*)
+    | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+    | (?P<name>[^\W\d]\w*)
+    | (?P<operator>\S)
+    """,
+    flags=re.VERBOSE,
+)
+# names that are kept when normalizing identifiers
+KEYWORDS = {
+    *keyword.kwlist,
+    *dir(builtins),
+    # R and Octave
+    "function",
+    "end",
+    "endfunction",
+    "endif",
+    "endfor",
+    "endwhile",
+    "repeat",
+    "next",
+    "NULL",
+    "TRUE",
+    "FALSE",
+}
+
+
+def tokenize(solution):
+    """Return the list of tokens of the solution without comments and
+    whitespace, with all identifiers replaced by the same token."""
+    tokens = []
+    for match in TOKEN_REGEX.finditer(solution):
+        kind, token = match.lastgroup, match.group()
+        if kind == "comment":
+            continue
+        if kind == "name" and token not in KEYWORDS:
+            token = "_"
+        tokens.append(token)
+    return tokens
+
+
+@lru_cache(maxsize=1024)
+def _template_tokens(template):
+    return tokenize(template)
+
+
+def _mod_prime(x):
+    """Return x modulo the Mersenne prime for any array of 64-bit values."""
+    x = (x & _MERSENNE_PRIME) + (x >> np.uint64(61))
+    return np.where(x >= _MERSENNE_PRIME, x - _MERSENNE_PRIME, x)
+
+
+def _permute(hashes):
+    """Return (a * h + b) mod p for all 32-bit hashes h and all permutations
+    given by a and b, split so that no product overflows 64 bits."""
+    hashes = hashes[:, np.newaxis]
+    shift = np.uint64(32)
+    # a = high * 2^32 + low, where h * high < 2^61 and h * low < 2^64
+    low = _mod_prime(hashes * (_A & _MAX_HASH))
+    high = hashes * (_A >> shift)
+    # high * 2^32 = (high >> 29) * 2^61 + (high & (2^29 - 1)) * 2^32 and 2^61 = 1
+    high = _mod_prime((high >> np.uint64(29)) + ((high & _LOW_BITS) << shift))
+    return _mod_prime(low + high + _B)
+
+
+def signature(solution, template=""):
+    """Return the MinHash signature of the solution as an array of 32-bit
+    values, or None if the solution contains no tokens or the same tokens as
+    the given template of the part, as all such solutions would be similar."""
+    tokens = tokenize(solution)
+    if not tokens or tokens == _template_tokens(template):
+        return None
+    shingles = {
+        "\x00".join(tokens[start:end])
+        for start, end in enumerate(
+            range(SHINGLE_SIZE, max(SHINGLE_SIZE, len(tokens)) + 1)
+        )
+    }
+    hashes = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(),
+                "little",
+            )
+            for shingle in shingles
+        ],
+        dtype=np.uint64,
+    )
+    return (_permute(hashes) & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+def similarity(first, second):
+    """Return the estimated Jaccard similarity of two signatures."""
+    return float(np.mean(first == second))
+
+
+def similar_pairs(signatures, threshold):
+    """
+    Return a list of (first key, second key, similarity) triples of all pairs of
+    the given (key, signature) pairs whose estimated similarity is at least the
+    threshold, sorted by decreasing similarity. Only pairs that share a band of
+    their signatures are compared, so pairs of rather similar solutions may be
+    missed, but the number of comparisons is not quadratic.
+    """
+    keys = [key for key, _ in signatures]
+    if not keys:
+        return []
+    matrix = np.stack([signature for _, signature in signatures])
+    buckets = defaultdict(list)
+    for band, rows in enumerate(np.hsplit(matrix, BANDS)):
+        for index, row in enumerate(rows):
+            buckets[band, row.tobytes()].append(index)
+    candidates = set()
+    for indices in buckets.values():
+        candidates.update(combinations(indices, 2))
+    pairs = []
+    for i, j in candidates:
+        pair_similarity = similarity(matrix[i], matrix[j])
+        if pair_similarity >= threshold:
+            pairs.append((keys[i], keys[j], pair_similarity))
+    pairs.sort(key=lambda pair: pair[2], reverse=True)
+    return pairs
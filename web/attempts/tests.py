@@ -1,10 +1,35 @@
 import json
+import tempfile
+from collections import defaultdict
+from io import StringIO
+from pathlib import Path
 
-from django.test import TestCase
+import numpy as np
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from model_bakery import baker
+from problems.models import Part
 from rest_framework.test import APIClient
+from users.models import User
 
-from .models import Attempt
+from .archive import attempt_lookup
+from .history import SNAPSHOT_INTERVAL, decompress
+from .matrix import OutcomeMatrix
+from .models import (
+    ArchivedCourse,
+    Attempt,
+    HistoricalAttempt,
+    OutcomeCounter,
+    SolutionSignature,
+    attempt_hash,
+)
+from .outcome import Outcome
+from .regrade import SandboxError, regrade
+from .rest import AttemptSerializer
+from .similarity import _A, _B, _permute, signature, similar_pairs, similarity
 
 
 class AttemptSubmitTestCase(TestCase):
@@ -12,13 +37,15 @@ class AttemptSubmitTestCase(TestCase):
         course = baker.make("courses.Course")
         problem_set = baker.make("courses.ProblemSet", course=course, visible=True)
         problem = baker.make("problems.Problem", problem_set=problem_set, visible=True)
-        self.part1 = baker.make("problems.Part", problem=problem, secret='["1"]')
-        self.part2 = baker.make("problems.Part", problem=problem, secret='["1", "2"]')
+        self.part1 = baker.make("problems.Part", problem=problem, secret=["1"])
+        self.part2 = baker.make("problems.Part", problem=problem, secret=["1", "2"])
         self.part3 = baker.make(
-            "problems.Part", problem=problem, secret='["1", "2", "3"]'
+            "problems.Part", problem=problem, secret=["1", "2", "3"]
         )
 
         user = baker.make("users.User")
+        self.user = user
+        self.problem = problem
         self.client = APIClient()
         self.client.credentials(HTTP_AUTHORIZATION="Token " + user.auth_token.key)
 
@@ -92,7 +119,7 @@ class AttemptSubmitTestCase(TestCase):
             "Saved and received data must be equal",
         )
         self.assertSequenceEqual(
-            json.loads(attempt.feedback),
+            attempt.feedback_list(),
             self.attempts_data[0]["feedback"],
             "Saved and received data must be equal",
         )
@@ -186,3 +213,789 @@ class AttemptSubmitTestCase(TestCase):
             "/api/attempts/submit/", [self.attempts_data[3]], format="json"
         )
         self.assertEqual(attempt.history.count(), 2)
+
+    def testResponse(self):
+        response = self.client.post(
+            "/api/attempts/submit/", self.attempts_data, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        attempts = response.data["attempts"]
+        self.assertEqual(len(attempts), 4)
+        self.assertEqual(attempts[0]["feedback"], ["f1", "f2"])
+        self.assertTrue(attempts[2]["valid"])
+        self.assertFalse(attempts[3]["valid"])
+        self.assertEqual(attempts[2]["id"], attempts[3]["id"])
+        self.assertEqual(
+            response.data["wrong_indices"],
+            {self.part1.pk: None, self.part2.pk: None, self.part3.pk: 1},
+        )
+        self.assertFalse(Attempt.objects.get(part=self.part3).valid)
+
+    def testHashSubmit(self):
+        # attempt files send feedback as a JSON string
+        attempt_data = dict(self.attempts_data[0], feedback=json.dumps(["f1", "f2"]))
+        self.client.post("/api/attempts/submit/", [attempt_data], format="json")
+        attempt = Attempt.objects.get()
+        part_hash = attempt_hash("s1", False, attempt_data["feedback"])
+        self.assertEqual(attempt.content_hash, part_hash)
+
+        unchanged_data = [
+            {"part": self.part1.pk, "hash": part_hash, "token": attempt_data["token"]},
+            {"part": self.part2.pk, "hash": part_hash, "token": attempt_data["token"]},
+        ]
+        unchanged_data[1]["token"] = self.part2.attempt_token(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                "/api/attempts/submit/", unchanged_data, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [
+                query
+                for query in context.captured_queries
+                if query["sql"].startswith(("INSERT", "UPDATE"))
+                and "silk_" not in query["sql"]
+            ]
+        )
+        # the unchanged part is confirmed, the part without an attempt is not
+        self.assertEqual(response.data["outdated"], [self.part2.pk])
+        self.assertEqual(len(response.data["attempts"]), 1)
+        self.assertEqual(response.data["attempts"][0]["id"], attempt.id)
+        self.assertEqual(response.data["attempts"][0]["solution"], "s1")
+        self.assertEqual(attempt.history.count(), 1)
+
+        unchanged_data[0]["hash"] = attempt_hash("s2", False, attempt_data["feedback"])
+        response = self.client.post(
+            "/api/attempts/submit/", unchanged_data[:1], format="json"
+        )
+        self.assertEqual(response.data["outdated"], [self.part1.pk])
+        self.assertEqual(response.data["attempts"], [])
+
+    def testHashSubmitInvalidToken(self):
+        # the last part is sent by a hash and has no stored attempt
+        submitted_data = [
+            dict(self.attempts_data[0], token=self.part2.attempt_token(self.user)),
+            {
+                "part": self.part2.pk,
+                "hash": attempt_hash("s2", False, "[]"),
+                "token": self.part2.attempt_token(self.user),
+            },
+        ]
+        response = self.client.post(
+            "/api/attempts/submit/", submitted_data, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["outdated"], [self.part2.pk])
+        self.assertEqual(response.data["attempts"], [])
+        self.assertIn(self.problem.title, response.data["update"])
+        self.assertFalse(Attempt.objects.exists())
+
+    @override_settings(FEEDBACK_MESSAGE_LIMIT=100, FEEDBACK_COMPRESSION_THRESHOLD=200)
+    def testLargeFeedback(self):
+        messages = ["short", 1000 * "x"]
+        attempt_data = dict(self.attempts_data[0], feedback=json.dumps(messages))
+        response = self.client.post(
+            "/api/attempts/submit/", [attempt_data], format="json"
+        )
+        attempt = Attempt.objects.get()
+        feedback = attempt.feedback_list()
+        self.assertEqual(feedback[0], "short")
+        self.assertEqual(len(feedback[1]), 100)
+        self.assertTrue(feedback[1].endswith("(sporočilo je skrajšano)"))
+        self.assertEqual(response.data["attempts"][0]["feedback"], json.dumps(feedback))
+        self.assertEqual(
+            attempt.content_hash, attempt_hash("s1", False, json.dumps(feedback))
+        )
+        self.assertEqual(attempt.feedback, feedback)
+
+        attempt_data["feedback"] = json.dumps(10 * messages)
+        self.client.post("/api/attempts/submit/", [attempt_data], format="json")
+        attempt = Attempt.objects.get()
+        self.assertEqual(list(attempt.feedback), ["zlib"])
+        self.assertEqual(attempt.feedback_list(), 10 * feedback)
+        self.assertEqual(attempt.history.first().feedback, attempt.feedback)
+
+        attempt_data["feedback"] = json.dumps([1, 2])
+        response = self.client.post(
+            "/api/attempts/submit/", [attempt_data], format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def testUnchangedSave(self):
+        self.client.post("/api/attempts/submit/", self.attempts_data, format="json")
+        attempt = Attempt.objects.get(part=self.part1)
+        self.assertEqual(attempt.content_hash, attempt.get_content_hash())
+        attempt.save()
+        attempt.feedback = ["f1", "f2"]
+        attempt.save()
+        self.assertEqual(attempt.history.count(), 1)
+        attempt.solution = "t1"
+        attempt.save()
+        self.assertEqual(attempt.history.count(), 2)
+        attempt = Attempt.objects.get(part=self.part1)
+        self.assertEqual(attempt.content_hash, attempt.get_content_hash())
+        attempt.save(update_fields=["valid"])
+        self.assertEqual(attempt.history.count(), 2)
+        attempt.solution = "u1"
+        attempt.save()
+        attempt.solution = "t1"
+        attempt.save()
+        self.assertEqual(attempt.history.count(), 4)
+        self.assertEqual(Attempt.objects.get(pk=attempt.pk).solution, "t1")
+
+    def testBatchedQueries(self):
+        parts = [baker.make("problems.Part", problem=self.problem) for _ in range(20)]
+        attempts_data = [
+            {
+                "solution": "s",
+                "valid": True,
+                "feedback": [],
+                "secret": [],
+                "part": part.pk,
+                "token": part.attempt_token(self.user),
+            }
+            for part in parts
+        ]
+
+        def attempt_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    "/api/attempts/submit/", attempts_data, format="json"
+                )
+            self.assertEqual(response.status_code, 200)
+            return [
+                query
+                for query in context.captured_queries
+                if query["sql"].startswith(("SELECT", "INSERT", "UPDATE"))
+                and '"attempts_' in query["sql"]
+                and '"attempts_outcomecounter"' not in query["sql"]
+                and '"attempts_solutionsignature"' not in query["sql"]
+                and '"attempts_archivedcourse"' not in query["sql"]
+                and "silk_" not in query["sql"]
+            ]
+
+        # one select, one insert, one history insert and one count of outcomes
+        self.assertEqual(len(attempt_queries()), 4)
+        for attempt_data in attempts_data:
+            attempt_data["solution"] = "t"
+        # one select, one update and one history insert
+        self.assertEqual(len(attempt_queries()), 3)
+        self.assertEqual(Attempt.objects.filter(solution="t").count(), len(parts))
+        for attempt in Attempt.objects.all():
+            self.assertEqual(attempt.history.count(), 2)
+
+    def testSubmissionDate(self):
+        self.client.post("/api/attempts/submit/", self.attempts_data[:1], format="json")
+        submitted = Attempt.objects.get().submission_date
+        attempt_data = dict(self.attempts_data[0], solution="t1")
+        response = self.client.post(
+            "/api/attempts/submit/", [attempt_data], format="json"
+        )
+        attempt = Attempt.objects.get()
+        self.assertGreater(attempt.submission_date, submitted)
+        self.assertEqual(
+            response.data["attempts"][0]["submission_date"],
+            AttemptSerializer(attempt).data["submission_date"],
+        )
+        self.assertEqual(
+            attempt.history.first().submission_date, attempt.submission_date
+        )
+
+
+class SimilarityTestCase(TestCase):
+    solution = """
+def vsota(seznam):
+    # sum of all elements
+    rezultat = 0
+    for x in seznam:
+        rezultat += x
+    return rezultat
+"""
+    disguised = """
+def total(xs):
+    s=0
+    for element in xs:  s+=element
+    return s  # my own solution
+"""
+    different = """
+def vsota(seznam):
+    if not seznam:
+        return 0
+    return seznam[0] + vsota(seznam[1:])
+"""
+
+    def setUp(self):
+        self.part = baker.make(
+            "problems.Part",
+            problem__visible=True,
+            problem__problem_set__visible=True,
+        )
+        self.users = baker.make("users.User", _quantity=3)
+
+    def test_signature(self):
+        self.assertTrue((signature(self.solution) == signature(self.disguised)).all())
+        self.assertLess(
+            similarity(signature(self.solution), signature(self.different)), 0.5
+        )
+        self.assertIsNone(signature("# nothing yet\n"))
+        template = "def vsota(seznam):\n    pass\n"
+        self.assertIsNone(signature("def vsota(seznam):  # TODO\n  pass", template))
+        self.assertIsNotNone(signature(self.solution, template))
+
+    def test_permutations(self):
+        hashes = np.array([0, 1, 12345, (1 << 32) - 1], dtype=np.uint64)
+        prime = (1 << 61) - 1
+        expected = [
+            [(int(a) * int(h) + int(b)) % prime for a, b in zip(_A, _B)] for h in hashes
+        ]
+        self.assertEqual(_permute(hashes).tolist(), expected)
+
+    def test_similar_pairs(self):
+        signatures = [
+            (user.pk, signature(solution))
+            for user, solution in zip(
+                self.users, [self.solution, self.different, self.disguised]
+            )
+        ]
+        self.assertEqual(
+            similar_pairs(signatures, 0.8), [(self.users[0].pk, self.users[2].pk, 1)]
+        )
+        self.assertEqual(similar_pairs([], 0.8), [])
+
+    def test_submit(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token " + self.users[0].auth_token.key)
+        attempt_data = {
+            "solution": self.solution,
+            "valid": True,
+            "feedback": [],
+            "secret": [],
+            "part": self.part.pk,
+            "token": self.part.attempt_token(self.users[0]),
+        }
+        client.post("/api/attempts/submit/", [attempt_data], format="json")
+        attempt = Attempt.objects.get()
+        self.assertTrue((attempt.signature.values() == signature(self.solution)).all())
+        client.post(
+            "/api/attempts/submit/",
+            [dict(attempt_data, solution=self.different)],
+            format="json",
+        )
+        attempt.signature.refresh_from_db()
+        self.assertTrue((attempt.signature.values() == signature(self.different)).all())
+        client.post(
+            "/api/attempts/submit/", [dict(attempt_data, solution="")], format="json"
+        )
+        self.assertFalse(SolutionSignature.objects.exists())
+        self.part.template = self.different
+        self.part.save()
+        client.post(
+            "/api/attempts/submit/",
+            [dict(attempt_data, solution=self.different)],
+            format="json",
+        )
+        self.assertFalse(SolutionSignature.objects.exists())
+
+    def test_save(self):
+        attempt = baker.make(
+            "attempts.Attempt", user=self.users[0], part=self.part, solution="x = 1"
+        )
+        attempt.solution = self.solution
+        attempt.save()
+        self.assertTrue(
+            (
+                SolutionSignature.objects.get(attempt=attempt).values()
+                == signature(self.solution)
+            ).all()
+        )
+        SolutionSignature.objects.all().delete()
+        call_command("rebuild_solution_signatures", stdout=StringIO())
+        self.assertEqual(SolutionSignature.objects.get().user, self.users[0])
+
+
+class RegradeTestCase(TestCase):
+    def setUp(self):
+        self.problem = baker.make("problems.Problem")
+        self.part1 = baker.make(
+            "problems.Part",
+            problem=self.problem,
+            validation='Check.equal("f(2)", 4)\nCheck.secret(f(3))',
+            secret=["9"],
+        )
+        self.part2 = baker.make(
+            "problems.Part",
+            problem=self.problem,
+            validation='with Check.time_limit(1):\n    Check.equal("g(2)", 8)',
+        )
+        self.users = baker.make("users.User", _quantity=2)
+
+    def make_attempt(self, user, part, solution, valid):
+        return baker.make(
+            "attempts.Attempt", user=user, part=part, solution=solution, valid=valid
+        )
+
+    def test_regrade(self):
+        valid = self.make_attempt(
+            self.users[0], self.part1, "def f(x):\n    return x * x", False
+        )
+        # the second part uses the function from the first part
+        invalid = self.make_attempt(
+            self.users[0], self.part2, "def g(x):\n    return f(x) + x", True
+        )
+        timeout = self.make_attempt(
+            self.users[1], self.part2, "def g(x):\n    while True:\n        pass", True
+        )
+        graded, changed = regrade([self.problem], workers=2)
+        self.assertEqual(graded, 3)
+        self.assertEqual(len(changed), 3)
+        for attempt in (valid, invalid, timeout):
+            attempt.refresh_from_db()
+            self.assertEqual(attempt.history.count(), 2)
+            self.assertEqual(attempt.content_hash, attempt.get_content_hash())
+        self.assertTrue(valid.valid)
+        self.assertEqual(valid.feedback_list(), [])
+        self.assertFalse(invalid.valid)
+        self.assertEqual(invalid.feedback_list(), ["Izraz g(2) vrne 6 namesto 8."])
+        self.assertFalse(timeout.valid)
+        self.assertEqual(timeout.feedback_list(), ["Dovoljen čas izvajanja presežen"])
+        self.assertEqual(
+            valid.history.latest("history_id").history_change_reason, "regrade"
+        )
+        counter = OutcomeCounter.objects.get(user=self.users[0])
+        self.assertEqual((counter.valid, counter.invalid), (1, 1))
+
+        # graded attempts that did not change are not saved again
+        graded, changed = regrade([self.problem], users=[self.users[0]])
+        self.assertEqual((graded, changed), (2, []))
+
+    def test_secret(self):
+        attempt = self.make_attempt(
+            self.users[0], self.part1, "def f(x):\n    return 2 * x", True
+        )
+        call_command("regrade_attempts", self.problem.pk, stdout=StringIO())
+        attempt.refresh_from_db()
+        # the result is correct, but the secret is not
+        self.assertFalse(attempt.valid)
+        self.assertEqual(attempt.feedback_list(), [])
+
+    def test_isolation(self):
+        part = baker.make(
+            "problems.Part",
+            problem=self.problem,
+            validation='Check.equal("isolated()", True)',
+        )
+        # the only network interface of the solution is the loopback
+        solution = """def isolated():
+    import os
+    with open("/proc/self/net/dev") as f:
+        interfaces = [line.split(":")[0].strip() for line in f.readlines()[2:]]
+    return interfaces == ["lo"] and not os.environ and os.getuid() != 0"""
+        attempt = self.make_attempt(self.users[0], part, solution, False)
+        regrade([self.problem])
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.valid)
+
+    @override_settings(REGRADE_SANDBOX_USER="root")
+    def test_sandbox_failure(self):
+        attempt = self.make_attempt(
+            self.users[0], self.part1, "def f(x):\n    return x * x", True
+        )
+        # solutions must not run as root, so the sandbox fails before grading
+        with self.assertRaises(SandboxError):
+            regrade([self.problem])
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.valid)
+        self.assertEqual(attempt.history.count(), 1)
+
+    def test_broken_solution(self):
+        attempt = self.make_attempt(
+            self.users[0], self.part1, "def f(x):\n    return x * x", True
+        )
+        self.make_attempt(self.users[0], self.part2, "def g(x:\n    pass", True)
+        regrade([self.problem])
+        attempt.refresh_from_db()
+        self.assertFalse(attempt.valid)
+        self.assertIn("SyntaxError", attempt.feedback_list()[0])
+
+
+class CourseArchiveTestCase(TestCase):
+    def setUp(self):
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings_override = override_settings(ATTEMPT_ARCHIVE_ROOT=archive_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.archive_root = Path(archive_root.name)
+
+        self.course = baker.make("courses.Course")
+        self.problem = baker.make("problems.Problem", problem_set__course=self.course)
+        parts = baker.make("problems.Part", problem=self.problem, _quantity=3)
+        self.users = baker.make("users.User", _quantity=3)
+        for i, user in enumerate(self.users[:2]):
+            for part in parts[i:]:
+                attempt = baker.make(
+                    "attempts.Attempt",
+                    user=user,
+                    part=part,
+                    solution=f"solution {i}",
+                    feedback=["feedback"],
+                )
+                attempt.valid = True
+                attempt.save()
+        self.other_attempt = baker.make("attempts.Attempt")
+
+    def records(self):
+        attempts = [
+            (
+                attempt.id,
+                attempt.user_id,
+                attempt.part_id,
+                attempt.valid,
+                attempt.solution,
+                attempt.feedback,
+                attempt.submission_date,
+            )
+            for attempt in Attempt.objects.order_by("id")
+        ]
+        history = [
+            (
+                record.history_id,
+                record.id,
+                record.solution,
+                record.valid,
+                record.history_date,
+                record.history_type,
+            )
+            for record in HistoricalAttempt.objects.order_by("history_id")
+        ]
+        counters = list(
+            OutcomeCounter.objects.order_by("id").values_list(
+                "user", "problem", "valid"
+            )
+        )
+        return attempts, history, counters
+
+    def test_archive_and_restore(self):
+        attempts, history, counters = self.records()
+        call_command("archive_course", self.course.pk, stdout=StringIO())
+        archived = ArchivedCourse.objects.get(course=self.course)
+        self.assertEqual((archived.attempts, archived.history), (5, 10))
+        self.assertEqual(list(Attempt.objects.all()), [self.other_attempt])
+        self.assertEqual(HistoricalAttempt.objects.count(), 1)
+        self.assertFalse(OutcomeCounter.objects.filter(course=self.course).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("restore_course", self.course.pk, stdout=StringIO())
+        self.assertFalse(ArchivedCourse.objects.exists())
+        self.assertFalse((self.archive_root / str(self.course.pk)).exists())
+        restored_attempts, restored_history, restored_counters = self.records()
+        self.assertEqual(restored_attempts, attempts)
+        self.assertEqual(restored_history, history)
+        self.assertCountEqual(restored_counters, counters)
+
+    def test_fallback(self):
+        user = self.users[1]
+        parts = self.problem.parts.all()
+
+        def lookup(users):
+            return {
+                key: (attempt.id, attempt.solution)
+                for key, attempt in attempt_lookup(users, parts, self.course).items()
+            }
+
+        attempts = lookup(self.users)
+        problem_sets = self.course.user_attempts(user)
+        call_command("archive_course", self.course.pk, stdout=StringIO())
+        self.assertEqual(lookup(self.users), attempts)
+        self.assertEqual(len(attempts), 5)
+        self.assertEqual(lookup([self.users[2]]), {})
+        archived_problem_sets = self.course.user_attempts(user)
+        self.assertEqual(archived_problem_sets[0].outcome, problem_sets[0].outcome)
+        self.assertEqual(archived_problem_sets[0].outcome, Outcome(2, 0, 3))
+
+        teacher = User.objects.create_user(username="teacher", password="PASS")
+        self.course.teachers.add(teacher)
+        self.client.login(username="teacher", password="PASS")
+        response = self.client.get(
+            reverse("problem_solution", args=[self.problem.pk, user.pk])
+        )
+        self.assertContains(response, "solution 1")
+
+    def test_submit(self):
+        call_command("archive_course", self.course.pk, stdout=StringIO())
+        part = self.problem.parts.first()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token " + self.users[0].auth_token.key)
+        attempt_data = {
+            "solution": "new solution",
+            "valid": True,
+            "feedback": [],
+            "secret": [],
+            "part": part.pk,
+            "token": part.attempt_token(self.users[0]),
+        }
+        response = client.post("/api/attempts/submit/", [attempt_data], format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("arhiviran", response.data["detail"])
+        self.assertFalse(Attempt.objects.filter(part=part).exists())
+
+
+class HistoryCompactionTestCase(TestCase):
+    def setUp(self):
+        self.attempt = baker.make(
+            "attempts.Attempt", solution="def f(x):\n    return x\n", feedback=[]
+        )
+        for i in range(SNAPSHOT_INTERVAL + 5):
+            self.attempt.solution += f"print(f({i}))\n"
+            self.attempt.feedback = [f"f({i})"]
+            self.attempt.valid = i % 2 == 0
+            self.attempt.save()
+
+    def states(self):
+        return [
+            (record.history_id, record.solution, record.feedback, record.valid)
+            for record in HistoricalAttempt.objects.order_by("history_id")
+        ]
+
+    def compact(self):
+        call_command("compact_attempt_history", batch_size=1, stdout=StringIO())
+
+    def test_compact(self):
+        states = self.states()
+        self.compact()
+        records = HistoricalAttempt._base_manager.all()
+        self.assertFalse(records.filter(delta__isnull=True).exists())
+        self.assertFalse(records.exclude(solution="").exists())
+        self.assertEqual(self.states(), states)
+        snapshots = [
+            record
+            for record in records.order_by("history_id")
+            if decompress(record.delta, ("", ""))[1]
+        ]
+        self.assertEqual(len(snapshots), 2)
+        # a single record is restored together with the records it depends on
+        history_id, solution, feedback, _ = states[-2]
+        record = HistoricalAttempt.objects.get(history_id=history_id)
+        self.assertEqual((record.solution, record.feedback), (solution, feedback))
+
+    def test_compact_new_records(self):
+        self.compact()
+        self.attempt.solution = "def f(x):\n    return 2 * x\n"
+        self.attempt.save()
+        baker.make("attempts.Attempt", solution="other")
+        states = self.states()
+        self.assertEqual(states[-2][1], self.attempt.solution)
+        self.compact()
+        self.assertEqual(self.states(), states)
+        self.assertFalse(
+            HistoricalAttempt._base_manager.filter(delta__isnull=True).exists()
+        )
+
+    def test_history_manager(self):
+        states = self.states()
+        self.compact()
+        self.assertEqual(
+            [
+                (record.history_id, record.solution, record.feedback, record.valid)
+                for record in self.attempt.history.order_by("history_id")
+            ],
+            states,
+        )
+        self.assertEqual(
+            self.attempt.history.values_list("history_id", flat=True).count(),
+            len(states),
+        )
+        records = HistoricalAttempt.objects.order_by("history_id").iterator(
+            chunk_size=4
+        )
+        self.assertEqual(
+            [record.solution for record in records], [s[1] for s in states]
+        )
+        with self.assertRaises(TypeError):
+            self.attempt.history.values("solution")
+        with self.assertRaises(TypeError):
+            HistoricalAttempt.objects.values_list()
+
+    def test_admin(self):
+        self.compact()
+        User.objects.create_superuser(username="ADMIN", password="PASS")
+        self.client.login(username="ADMIN", password="PASS")
+        record = self.attempt.history.order_by("history_id")[3]
+        response = self.client.get(
+            reverse(
+                "admin:attempts_attempt_simple_history",
+                args=[self.attempt.pk, record.history_id],
+            )
+        )
+        self.assertContains(response, "print(f(2))")
+
+    def test_delete(self):
+        states = self.states()
+        self.compact()
+        HistoricalAttempt.objects.get(history_id=states[3][0]).delete()
+        HistoricalAttempt.objects.filter(
+            history_id__in=[states[10][0], states[11][0]]
+        ).delete()
+        del states[10:12]
+        del states[3]
+        self.assertEqual(self.states(), states)
+
+
+class OutcomeCounterTestCase(TestCase):
+    def setUp(self):
+        self.course = baker.make("courses.Course")
+        problem_set = baker.make("courses.ProblemSet", course=self.course, visible=True)
+        self.problem = baker.make(
+            "problems.Problem", problem_set=problem_set, visible=True
+        )
+        self.other_problem = baker.make("problems.Problem", problem_set=problem_set)
+        self.parts = baker.make("problems.Part", problem=self.problem, _quantity=3)
+        baker.make("problems.Part", problem=self.other_problem)
+        self.user = baker.make("users.User")
+        self.course.enroll_student(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.user.auth_token.key)
+
+    def counter(self):
+        counter = OutcomeCounter.objects.get(user=self.user, problem=self.problem)
+        return counter.valid, counter.invalid
+
+    def submit(self, part, valid):
+        response = self.client.post(
+            "/api/attempts/submit/",
+            [
+                {
+                    "solution": "s",
+                    "valid": valid,
+                    "feedback": [],
+                    "secret": [],
+                    "part": part.pk,
+                    "token": part.attempt_token(self.user),
+                }
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_submit(self):
+        self.submit(self.parts[0], True)
+        self.submit(self.parts[1], False)
+        self.assertEqual(self.counter(), (1, 1))
+        self.submit(self.parts[1], True)
+        self.assertEqual(self.counter(), (2, 0))
+        self.submit(self.parts[0], False)
+        self.assertEqual(self.counter(), (1, 1))
+
+    def test_save_and_delete(self):
+        attempt = baker.make(Attempt, user=self.user, part=self.parts[0], valid=True)
+        self.assertEqual(self.counter(), (1, 0))
+        attempt.valid = False
+        attempt.save()
+        self.assertEqual(self.counter(), (0, 1))
+        attempt.delete()
+        self.assertEqual(self.counter(), (0, 0))
+        baker.make(Attempt, user=self.user, part=self.parts[1], valid=True)
+        self.parts[1].delete()
+        self.assertEqual(self.counter(), (0, 0))
+
+    def test_move_problem(self):
+        baker.make(Attempt, user=self.user, part=self.parts[0], valid=True)
+        problem_set = baker.make("courses.ProblemSet")
+        self.problem.problem_set = problem_set
+        self.problem.save()
+        counter = OutcomeCounter.objects.get(user=self.user, problem=self.problem)
+        self.assertEqual(counter.problem_set, problem_set)
+        self.assertEqual(counter.course, problem_set.course)
+
+    def test_rebuild(self):
+        for part in self.parts:
+            baker.make(Attempt, user=self.user, part=part, valid=bool(part.pk % 2))
+        counters = list(OutcomeCounter.objects.values_list("valid", "invalid"))
+        OutcomeCounter.objects.update(valid=0, invalid=0)
+        call_command("rebuild_outcome_counters", stdout=StringIO())
+        self.assertEqual(
+            list(OutcomeCounter.objects.values_list("valid", "invalid")), counters
+        )
+
+    def test_group_dict(self):
+        users = baker.make("users.User", _quantity=3)
+        for user, part in zip(users, self.parts):
+            baker.make(Attempt, user=user, part=part, valid=bool(user.pk % 2))
+        baker.make(Attempt, user=users[1], part=self.parts[2], valid=True)
+        parts = Part.objects.filter(problem__problem_set__course=self.course)
+        users = User.objects.filter(id__in=[user.id for user in users])
+        for group_by in [
+            ((), ()),
+            ((), ("id",)),
+            (("problem",), ()),
+            (("problem__problem_set",), ("id",)),
+        ]:
+            from_counters = defaultdict(Outcome)
+            for group, outcome in Outcome._counter_outcomes(parts, users, *group_by):
+                from_counters[group] += outcome
+            from_attempts = defaultdict(Outcome)
+            for group, outcome in Outcome._attempt_outcomes(parts, users, *group_by):
+                from_attempts[group] += outcome
+            self.assertEqual(from_counters, from_attempts)
+
+
+class OutcomeMatrixTestCase(TestCase):
+    def setUp(self):
+        self.course = baker.make("courses.Course")
+        problem_sets = baker.make("courses.ProblemSet", course=self.course, _quantity=2)
+        self.parts = []
+        for problem_set in problem_sets:
+            for problem in baker.make(
+                "problems.Problem", problem_set=problem_set, _quantity=2
+            ):
+                self.parts += baker.make("problems.Part", problem=problem, _quantity=3)
+        self.users = baker.make("users.User", _quantity=4)
+        for i, user in enumerate(self.users[:3]):
+            for j, part in enumerate(self.parts):
+                if (i + j) % 3:
+                    baker.make(Attempt, user=user, part=part, valid=(i * j) % 2)
+        self.part_queryset = Part.objects.filter(
+            problem__problem_set__course=self.course
+        )
+        self.user_queryset = User.objects.filter(
+            id__in=[user.id for user in self.users]
+        )
+        self.matrix = OutcomeMatrix(self.part_queryset, self.user_queryset)
+
+    def test_group_dict(self):
+        for parts_group_by in [(), ("id",), ("problem",), ("problem__problem_set",)]:
+            for users_group_by in [(), ("id",)]:
+                self.assertEqual(
+                    self.matrix.group_dict(parts_group_by, users_group_by),
+                    Outcome.group_dict(
+                        self.part_queryset,
+                        self.user_queryset,
+                        parts_group_by,
+                        users_group_by,
+                    ),
+                )
+
+    def test_course_group_dict(self):
+        first, second = baker.make(
+            "courses.CourseGroup", course=self.course, _quantity=2
+        )
+        first.students.add(self.users[0], self.users[1])
+        second.students.add(self.users[1], self.users[3])
+        groups = self.course.groups.all()
+        outcomes = self.matrix.course_group_dict(groups, ("problem",))
+        for group in groups:
+            users = group.students.all()
+            for (problem_id,), outcome in Outcome.group_dict(
+                self.part_queryset, users, ("problem",), ()
+            ).items():
+                self.assertEqual(outcomes[(problem_id, group.id)], outcome)
+
+    def test_rows(self):
+        attempts = {
+            (attempt.user_id, attempt.part_id): attempt.valid
+            for attempt in Attempt.objects.all()
+        }
+        parts = list(self.part_queryset)
+        for user, row in self.matrix.rows():
+            self.assertEqual(row, [attempts.get((user.id, part.id)) for part in parts])
+        self.assertEqual(self.matrix.active().tolist(), [True, True, True, False])
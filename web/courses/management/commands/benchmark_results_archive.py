@@ -0,0 +1,33 @@
+"""
+Measure rendering of a problem set results archive
+"""
+
+import time
+
+from courses.models import ProblemSet
+from courses.results import ResultsArchive
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = """Renders the results archive of a problem set and reports the number
+    of queries and the wall time for each given number of workers"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("problem_set", type=int)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1])
+
+    def handle(self, *args, **options):
+        problem_set = ProblemSet.objects.get(pk=options["problem_set"])
+        for workers in options["workers"]:
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                files = ResultsArchive(problem_set).files(workers=workers)
+                size = sum(len(contents) for _, contents in files)
+                duration = time.perf_counter() - start
+            self.stdout.write(
+                f"{workers} workers: {len(context.captured_queries)} queries, "
+                f"{duration:.2f} s, {size} characters"
+            )
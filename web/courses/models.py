@@ -1,16 +1,20 @@
 from copy import deepcopy
 
-from attempts.models import Attempt, HistoricalAttempt
+from attempts.archive import attempt_lookup
+from attempts.matrix import OutcomeMatrix
+from attempts.models import HistoricalAttempt
 from attempts.outcome import Outcome
+from django.conf import settings
 from django.db import models
 from django.template.defaultfilters import slugify
-from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
 from problems.models import Part
 from taggit.managers import TaggableManager
 from users.models import User
 from utils.models import OrderWithRespectToMixin
 
+from .results import Gradebook, ResultsArchive
+
 
 class Institution(models.Model):
     name = models.CharField(max_length=140)
@@ -50,20 +54,22 @@ class Course(models.Model):
         """This function ignores problem visibility, because it assumes it is only
         called from courses/views.py:course_progress() by a teacher user."""
         parts = Part.objects.filter(problem__problem_set__course=self)
-        users = User.objects.filter(id=user.id)
-        outcomes = Outcome.group_dict(parts, users, ("problem",), ())
-        attempts = {}
-        for attempt in user.attempts.filter(part__problem__problem_set__course=self):
-            attempts[attempt.part_id] = attempt
+        attempts = attempt_lookup([user], parts, self)
         sorted_attempts = []
         for problem_set in self.problem_sets.all().prefetch_related("problems__parts"):
             problem_set.outcome = Outcome()
             problem_set.attempts = []
             for problem in problem_set.problems.all():
-                problem.outcome = outcomes[(problem.id,)]
                 problem.attempts = [
-                    attempts.get(part.pk) for part in problem.parts.all()
+                    attempts.get((user.id, part.pk)) for part in problem.parts.all()
                 ]
+                problem.outcome = Outcome(
+                    valid=sum(attempt.valid for attempt in problem.attempts if attempt),
+                    invalid=sum(
+                        not attempt.valid for attempt in problem.attempts if attempt
+                    ),
+                    total=len(problem.attempts),
+                )
                 problem_set.attempts.append(problem)
                 problem_set.outcome += problem.outcome
             sorted_attempts.append(problem_set)
@@ -131,12 +137,15 @@ class Course(models.Model):
         parts = Part.objects.filter(
             problem__problem_set__course=self, problem__problem_set__visible=True
         )
-        users = self.observed_students()
-        outcomes = Outcome.group_dict(parts, users, (), ("id",))
-        annotated_users = list(users)
-        for user in annotated_users:
+        matrix = OutcomeMatrix(parts, self.observed_students())
+        outcomes = matrix.group_dict((), ("id",))
+        for user in matrix.users:
             user.outcome = outcomes[(user.id,)]
-        return annotated_users
+        return matrix.users
+
+    def gradebook(self):
+        """Return the name of the gradebook file and an iterable of its rows."""
+        return f"{slugify(self.title)}-gradebook", Gradebook(self).rows()
 
     def duplicate(self):
         new_course = deepcopy(self)
@@ -227,19 +236,20 @@ class ProblemSet(OrderWithRespectToMixin, models.Model):
 
     def attempts_archive(self, user):
         if user.can_edit_problem_set(self):
-            files = [problem.attempt_file(user) for problem in self.problems.all()]
+            problems = self.problems.all()
         else:
-            files = [problem.attempt_file(user) for problem in self.visible_problems]
+            problems = self.visible_problems
+        files = (problem.attempt_file(user) for problem in problems)
         archive_name = slugify(self.title)
         return archive_name, files
 
     def solutions_archive(self):
-        files = [problem.solution_file() for problem in self.problems.all()]
+        files = (problem.solution_file() for problem in self.problems.all())
         archive_name = "{0}-solution".format(slugify(self.title))
         return archive_name, files
 
     def edit_archive(self, user):
-        files = [problem.edit_file(user) for problem in self.problems.all()]
+        files = (problem.edit_file(user) for problem in self.problems.all())
         archive_name = "{0}-edit".format(slugify(self.title))
         return archive_name, files
 
@@ -256,59 +266,9 @@ class ProblemSet(OrderWithRespectToMixin, models.Model):
         return user_attempts
 
     def results_archive(self, user):
-        user_ids = set()
-        attempt_dict = {}
-        attempts = Attempt.objects.filter(part__problem__problem_set=self)
-        for attempt in attempts:
-            user_id = attempt.user_id
-            user_ids.add(user_id)
-            user_attempts = attempt_dict.get(user_id, {})
-            user_attempts[attempt.part_id] = attempt
-            attempt_dict[user_id] = user_attempts
-        users = User.objects.filter(id__in=user_ids)
-
+        archive = ResultsArchive(self)
         archive_name = f"{slugify(self.title)}-results"
-        files = []
-
-        bare_files = {}
-        for problem in self.problems.all():
-            folder = slugify(problem.title)
-            for user in users.all():
-                filename, contents = problem.marking_file(user)
-                files.append((f"{folder}/{filename}", contents))
-                filename, contents = problem.bare_file(user)
-                bare_files[filename] = bare_files.get(filename, "") + contents + "\n\n"
-
-        for filename, contents in bare_files.items():
-            files.append((f"bare/{filename}", contents))
-
-        for user, history in self.attempt_history().items():
-            username = user.get_full_name() or user.username
-            problem_slug = slugify(username).replace("-", "_")
-            extension = "py"
-            filename = f"{problem_slug}.{extension}"
-            contents = render_to_string(
-                f"history.{extension}",
-                {
-                    "history": history,
-                },
-            )
-            files.append((f"history/{filename}", contents))
-
-        users = []
-        for user in User.objects.filter(id__in=user_ids).order_by("last_name"):
-            user_attempts = []
-            for problem in self.problems.all():
-                for part in problem.parts.all():
-                    user_attempts.append(attempt_dict[user.id].get(part.id))
-            users.append((user, user_attempts))
-
-        spreadsheet_filename = "{0}.csv".format(self.title)
-        spreadsheet_contents = render_to_string(
-            "results.csv", {"problem_set": self, "users": users}
-        )
-        files.append((spreadsheet_filename, spreadsheet_contents))
-        return archive_name, files
+        return archive_name, archive.files(workers=settings.RESULTS_ARCHIVE_WORKERS)
 
     def outcomes_statistics(self, outcomes):
         statistics = []
@@ -336,15 +296,33 @@ class ProblemSet(OrderWithRespectToMixin, models.Model):
     def single_student_statistics(self, student):
         students = User.objects.filter(id=student.id)
         parts = Part.objects.filter(problem__problem_set=self, problem__visible=True)
-        outcomes = Outcome.group_dict(parts, students, ("id",), ())
+        outcomes = OutcomeMatrix(parts, students).group_dict(("id",), ())
         return self.outcomes_statistics(outcomes)
 
     def all_students_statistics(self):
         students = self.course.observed_students()
         parts = Part.objects.filter(problem__problem_set=self)
-        outcomes = Outcome.group_dict(parts, students, ("id",), ())
+        outcomes = OutcomeMatrix(parts, students).group_dict(("id",), ())
         return self.outcomes_statistics(outcomes)
 
+    def progress(self, students):
+        """Return problems annotated with student_progress, a list of triples of
+        a student, their outcome on the problem and a list of True, False or None
+        for each part, all computed from a single outcome matrix."""
+        problems = list(self.problems.prefetch_related("parts"))
+        parts = Part.objects.filter(problem__problem_set=self)
+        matrix = OutcomeMatrix(parts, students)
+        outcomes = matrix.group_dict(("problem",), ("id",))
+        columns = {part_id: j for j, part_id in enumerate(matrix.parts["id"].tolist())}
+        rows = list(matrix.rows())
+        for problem in problems:
+            indices = [columns[part.id] for part in problem.parts.all()]
+            problem.student_progress = [
+                (student, outcomes[(problem.id, student.id)], [row[j] for j in indices])
+                for student, row in rows
+            ]
+        return problems
+
     def toggle_visible(self):
         self.visible = not self.visible
         self.save()
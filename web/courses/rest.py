@@ -15,6 +15,7 @@ class ProblemSetBackupSerializer(ModelSerializer):
 
     class Meta:
         model = ProblemSet
+        fields = "__all__"
 
 
 class ProblemSetSerializer(ModelSerializer):
@@ -36,6 +37,7 @@ class CourseBackupSerializer(ModelSerializer):
 
     class Meta:
         model = Course
+        fields = "__all__"
 
 
 class CourseSerializer(ModelSerializer):
@@ -0,0 +1,153 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from attempts.matrix import EMPTY, INVALID, VALID, OutcomeMatrix
+from attempts.models import Attempt
+from django.template.defaultfilters import slugify
+from django.template.loader import render_to_string
+from problems.models import Part
+from users.models import User
+
+
+class ResultsArchive:
+    """
+    Files of the results archive of a problem set. All attempts, parts and
+    history are fetched in a constant number of queries when the archive is
+    created, and files are then rendered from memory, so rendering can be
+    spread over a pool of threads.
+    """
+
+    def __init__(self, problem_set):
+        self.problem_set = problem_set
+        self.problems = list(problem_set.problems.prefetch_related("parts"))
+        self.attempts = {}
+        for attempt in Attempt.objects.filter(part__problem__problem_set=problem_set):
+            self.attempts.setdefault(attempt.user_id, {})[attempt.part_id] = attempt
+        self.users = list(
+            User.objects.filter(id__in=self.attempts).order_by("last_name")
+        )
+        self.history = problem_set.attempt_history()
+
+    def __len__(self):
+        # bare files of users with equal names are merged, so this is an upper bound
+        return (len(self.problems) + 1) * len(self.users) + len(self.history) + 1
+
+    def _problem_files(self, problem, user):
+        attempts = self.attempts[user.id]
+        return problem.marking_file(user, attempts), problem.bare_file(user, attempts)
+
+    def _history_file(self, user_history):
+        user, history = user_history
+        username = user.get_full_name() or user.username
+        problem_slug = slugify(username).replace("-", "_")
+        extension = "py"
+        filename = f"{problem_slug}.{extension}"
+        contents = render_to_string(f"history.{extension}", {"history": history})
+        return f"history/{filename}", contents
+
+    def _spreadsheet_file(self):
+        users = []
+        for user in self.users:
+            user_attempts = []
+            for problem in self.problems:
+                for part in problem.parts.all():
+                    user_attempts.append(self.attempts[user.id].get(part.id))
+            users.append((user, user_attempts))
+        spreadsheet_filename = "{0}.csv".format(self.problem_set.title)
+        spreadsheet_contents = render_to_string(
+            "results.csv",
+            {
+                "problem_set": self.problem_set,
+                "problems": self.problems,
+                "users": users,
+            },
+        )
+        return spreadsheet_filename, spreadsheet_contents
+
+    def files(self, workers=1):
+        """Yield pairs of filenames and contents, rendered by the given number of
+        threads, or by the calling thread if there is only one. Files of each
+        problem are rendered together, so that at most one problem's worth of
+        rendered files is waiting to be consumed."""
+        if workers <= 1:
+            yield from self._rendered_files(map)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                yield from self._rendered_files(executor.map)
+        yield self._spreadsheet_file()
+
+    def _rendered_files(self, map):
+        bare_files = {}
+        for problem in self.problems:
+            folder = slugify(problem.title)
+            rendered = map(self._problem_files, [problem] * len(self.users), self.users)
+            for (filename, contents), (bare_filename, bare_contents) in rendered:
+                yield f"{folder}/{filename}", contents
+                bare_files[bare_filename] = (
+                    bare_files.get(bare_filename, "") + bare_contents + "\n\n"
+                )
+
+        for filename, contents in bare_files.items():
+            yield f"bare/{filename}", contents
+
+        yield from map(self._history_file, self.history.items())
+
+
+class Gradebook:
+    """
+    Outcomes of observed students on all parts of a course, with a column for
+    each part and the number of solved parts of each problem set. Outcomes are
+    fetched into an outcome matrix with a single query over attempts, and rows
+    are produced from it one at a time.
+    """
+
+    cells = {EMPTY: "", INVALID: 0, VALID: 1}
+
+    def __init__(self, course):
+        self.problem_sets = list(course.problem_sets.values_list("id", "title"))
+        parts = Part.objects.filter(problem__problem_set__course=course).order_by(
+            "problem__problem_set___order", "problem___order", "_order"
+        )
+        students = course.observed_students().order_by("last_name", "first_name")
+        self.matrix = OutcomeMatrix(parts, students)
+
+    def _columns(self):
+        """Return part labels and the range of part columns of each problem set."""
+        labels, ranges = [], {}
+        problem_ids = self.matrix.parts["problem"].tolist()
+        problem_set_ids = self.matrix.parts["problem__problem_set"].tolist()
+        for j, problem_set_id in enumerate(problem_set_ids):
+            if problem_set_id not in ranges:
+                ranges[problem_set_id] = [j, j]
+                problem, part = 0, 0
+            if j == ranges[problem_set_id][0] or problem_ids[j - 1] != problem_ids[j]:
+                problem, part = problem + 1, 0
+            part += 1
+            ranges[problem_set_id][1] = j + 1
+            labels.append(f"{problem}.{part}")
+        return labels, [
+            ranges.get(problem_set_id, (0, 0))
+            for problem_set_id, _ in self.problem_sets
+        ]
+
+    def rows(self):
+        """Yield the header row followed by a row for each observed student."""
+        labels, ranges = self._columns()
+        header = ["Ime", "Priimek"]
+        for k, ((_, title), (start, stop)) in enumerate(zip(self.problem_sets, ranges)):
+            header.extend(f"{k + 1}.{label}" for label in labels[start:stop])
+            header.append(title)
+        yield header
+        solved = self.matrix.values == VALID
+        totals = np.zeros((len(self.matrix.users), len(ranges)), dtype=np.int64)
+        for k, (start, stop) in enumerate(ranges):
+            totals[:, k] = solved[:, start:stop].sum(axis=1)
+        cells = self.cells
+        for user, values, user_totals in zip(
+            self.matrix.users, self.matrix.values.tolist(), totals.tolist()
+        ):
+            row = [user.first_name, user.last_name]
+            for (start, stop), total in zip(ranges, user_totals):
+                row.extend(cells[value] for value in values[start:stop])
+                row.append(total)
+            yield row
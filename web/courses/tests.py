@@ -0,0 +1,226 @@
+import csv
+import io
+from unittest import mock
+
+from attempts.models import Attempt
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.template.defaultfilters import slugify
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from users.models import User
+
+from .results import Gradebook, ResultsArchive
+
+
+class ProblemSetProgressTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="USER", password="PASS")
+        self.course = baker.make("courses.Course")
+        self.course.teachers.add(self.user)
+        self.problem_set = baker.make("courses.ProblemSet", course=self.course)
+        self.students = baker.make("users.User", _quantity=3)
+        for student in self.students:
+            self.course.enroll_student(student)
+        self.course.studentenrollment_set.update(observed=True)
+        self.group = baker.make("courses.CourseGroup", course=self.course)
+        self.group.students.add(self.students[0])
+        self.client.login(username="USER", password="PASS")
+
+    def add_problem(self):
+        problem = baker.make("problems.Problem", problem_set=self.problem_set)
+        parts = baker.make("problems.Part", problem=problem, _quantity=2)
+        baker.make(Attempt, user=self.students[0], part=parts[0], valid=True)
+        baker.make(Attempt, user=self.students[1], part=parts[1], valid=False)
+        return problem
+
+    def progress_queries(self, view, *args):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(view, args=[self.problem_set.pk, *args]))
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT") and "silk_" not in query["sql"]
+        ]
+        return response, len(queries)
+
+    def test_progress(self):
+        problem = self.add_problem()
+        [annotated_problem] = self.problem_set.progress(self.course.observed_students())
+        self.assertEqual(annotated_problem, problem)
+        progress = {
+            student: (outcome.valid, outcome.invalid, outcome.total, outcomes)
+            for student, outcome, outcomes in annotated_problem.student_progress
+        }
+        self.assertEqual(
+            progress,
+            {
+                self.students[0]: (1, 0, 2, [True, None]),
+                self.students[1]: (0, 1, 2, [None, False]),
+                self.students[2]: (0, 0, 2, [None, None]),
+            },
+        )
+
+    def test_queries(self):
+        for view, args in [
+            ("problem_set_progress", []),
+            ("problem_set_progress_groups", [self.group.pk]),
+        ]:
+            self.add_problem()
+            _, queries = self.progress_queries(view, *args)
+            for _ in range(5):
+                self.add_problem()
+            response, more_queries = self.progress_queries(view, *args)
+            self.assertEqual(more_queries, queries)
+
+    def test_group(self):
+        self.add_problem()
+        response, _ = self.progress_queries(
+            "problem_set_progress_groups", self.group.pk
+        )
+        for problem in response.context["problems"]:
+            students = [student for student, _, _ in problem.student_progress]
+            self.assertEqual(students, [self.students[0]])
+
+
+class ResultsArchiveTestCase(TestCase):
+    def setUp(self):
+        self.problem_set = baker.make("courses.ProblemSet")
+        self.problems = baker.make(
+            "problems.Problem",
+            problem_set=self.problem_set,
+            language="python",
+            _quantity=2,
+        )
+        self.parts = [
+            part
+            for problem in self.problems
+            for part in baker.make("problems.Part", problem=problem, _quantity=2)
+        ]
+
+    def add_students(self, number):
+        for student in baker.make("users.User", _quantity=number):
+            for i, part in enumerate(self.parts[1:]):
+                baker.make(
+                    Attempt,
+                    user=student,
+                    part=part,
+                    valid=i % 2,
+                    feedback=[f"feedback {i}"],
+                )
+
+    def archive_queries(self, workers=1):
+        # queries are counted in all threads, not only over this connection
+        queries = []
+        execute = CursorWrapper._execute
+
+        def counting_execute(cursor, sql, *args):
+            if sql.startswith("SELECT") and "silk_" not in sql:
+                queries.append(sql)
+            return execute(cursor, sql, *args)
+
+        with mock.patch.object(CursorWrapper, "_execute", counting_execute):
+            files = list(ResultsArchive(self.problem_set).files(workers=workers))
+        return files, len(queries)
+
+    def test_queries(self):
+        self.add_students(1)
+        _, queries = self.archive_queries()
+        self.add_students(10)
+        for workers in [1, 4]:
+            files, more_queries = self.archive_queries(workers=workers)
+            self.assertEqual(more_queries, queries)
+        # marking files, bare files, history files and the spreadsheet
+        self.assertEqual(len(files), 2 * 11 + 11 + 11 + 1)
+
+    def test_contents(self):
+        self.add_students(3)
+        files, _ = self.archive_queries(workers=3)
+        self.assertEqual(files, self.archive_queries(workers=1)[0])
+        files = dict(files)
+        for student in User.objects.exclude(attempts=None):
+            for problem in self.problems:
+                filename, contents = problem.marking_file(student)
+                folder = slugify(problem.title)
+                self.assertEqual(files[f"{folder}/{filename}"], contents)
+
+
+class GradebookTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="USER", password="PASS")
+        self.course = baker.make("courses.Course")
+        self.course.teachers.add(self.user)
+        self.problem_sets = [
+            baker.make("courses.ProblemSet", course=self.course, title=title)
+            for title in ["First", "Empty", "Second"]
+        ]
+        self.parts = []
+        for problem_set, problems in zip(self.problem_sets, [2, 0, 1]):
+            for _ in range(problems):
+                problem = baker.make("problems.Problem", problem_set=problem_set)
+                self.parts.extend(
+                    baker.make("problems.Part", problem=problem, _quantity=2)
+                )
+        self.client.login(username="USER", password="PASS")
+
+    def add_students(self, number):
+        students = baker.make("users.User", _quantity=number)
+        for student in students:
+            self.course.enroll_student(student)
+            for i, part in enumerate(self.parts[1:]):
+                baker.make(Attempt, user=student, part=part, valid=i % 2)
+        self.course.studentenrollment_set.update(observed=True)
+        return students
+
+    def gradebook_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("course_gradebook", args=[self.course.pk])
+            )
+            content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT") and "silk_" not in query["sql"]
+        ]
+        return list(csv.reader(io.StringIO(content))), len(queries)
+
+    def test_rows(self):
+        [student] = self.add_students(1)
+        unobserved = baker.make("users.User")
+        self.course.enroll_student(unobserved)
+        self.course.toggle_observed(unobserved)
+        baker.make(Attempt, user=unobserved, part=self.parts[0], valid=True)
+        rows = list(Gradebook(self.course).rows())
+        self.assertEqual(
+            rows,
+            [
+                ["Ime", "Priimek", "1.1.1", "1.1.2", "1.2.1", "1.2.2", "First"]
+                + ["Empty", "3.1.1", "3.1.2", "Second"],
+                [student.first_name, student.last_name, "", 0, 1, 0, 1, 0, 1, 0, 1],
+            ],
+        )
+
+    def test_queries(self):
+        self.add_students(1)
+        _, queries = self.gradebook_queries()
+        students = self.add_students(10)
+        rows, more_queries = self.gradebook_queries()
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(len(rows), 1 + 11)
+        self.assertEqual(rows[-1][-2:], ["0", "1"])
+        self.assertIn(
+            [students[0].first_name, students[0].last_name], [row[:2] for row in rows]
+        )
+
+    def test_permissions(self):
+        self.client.logout()
+        student = User.objects.create_user(username="STUDENT", password="PASS")
+        self.course.enroll_student(student)
+        self.client.login(username="STUDENT", password="PASS")
+        response = self.client.get(reverse("course_gradebook", args=[self.course.pk]))
+        self.assertNotEqual(response.status_code, 200)
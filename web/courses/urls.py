@@ -108,6 +108,11 @@ course_urls = [
         views.course_progress,
         name="course_progress",
     ),
+    path(
+        "gradebook/",
+        views.course_gradebook,
+        name="course_gradebook",
+    ),
     path(
         "problem_set/create/",
         ProblemSetCreate.as_view(),
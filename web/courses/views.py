@@ -7,7 +7,7 @@ from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from users.models import User
 from utils import verify
-from utils.views import zip_archive
+from utils.views import csv_file, zip_archive
 
 from .models import Course, CourseGroup, ProblemSet
 
@@ -30,6 +30,7 @@ def problem_set_progress(request, problem_set_pk):
         "courses/problem_set_progress.html",
         {
             "problem_set": problem_set,
+            "problems": problem_set.progress(problem_set.course.observed_students()),
         },
     )
 
@@ -39,10 +40,15 @@ def problem_set_progress_groups(request, problem_set_pk, group_pk):
     problem_set = get_object_or_404(ProblemSet, pk=problem_set_pk)
     group = get_object_or_404(CourseGroup, pk=group_pk)
     verify(request.user.can_view_problem_set_attempts(problem_set))
+    students = problem_set.course.observed_students().filter(course_groups=group)
     return render(
         request,
         "courses/problem_set_progress_groups.html",
-        {"problem_set": problem_set, "group": group},
+        {
+            "problem_set": problem_set,
+            "group": group,
+            "problems": problem_set.progress(students),
+        },
     )
 
 
@@ -188,7 +194,7 @@ def homepage(request):
     for course in (
         Course.objects.order_by("institution__name")
         .select_related("institution")
-        .prefetch_related("students", "teachers")
+        .prefetch_related("teachers")
     ):
         if request.user.is_favourite_course(course):
             user_courses.append(course)
@@ -332,6 +338,15 @@ def problem_set_results(request, problem_set_pk):
     return zip_archive(archive_name, files)
 
 
+@login_required
+def course_gradebook(request, course_pk):
+    """Download a spreadsheet of outcomes of observed students in a course."""
+    course = get_object_or_404(Course, pk=course_pk)
+    verify(request.user.can_view_course_attempts(course))
+    name, rows = course.gradebook()
+    return csv_file(name, rows)
+
+
 ###############################################################################
 # Course Groups related views
 
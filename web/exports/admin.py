@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import ExportJob
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("user", "kind", "course", "problem_set", "status", "created")
+    list_filter = ("kind", "status")
+    search_fields = ("user__username", "course__title", "problem_set__title")
+    date_hierarchy = "created"
+
+
+admin.site.register(ExportJob, ExportJobAdmin)
@@ -0,0 +1,55 @@
+"""
+Run pending export jobs
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management import BaseCommand
+from exports.models import ExportJob
+
+
+def run_export_job(job_pk):
+    ExportJob.objects.get(pk=job_pk).run()
+
+
+class Command(BaseCommand):
+    help = """Runs pending export jobs in a pool of worker processes"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2)
+        parser.add_argument(
+            "--interval", type=float, default=2, help="Seconds between polls"
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when no jobs are left"
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        # workers are spawned afresh, so they do not share database connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            processes, mp_context=context, initializer=django.setup
+        ) as executor:
+            running = {}
+            while True:
+                requeued = ExportJob.requeue_stale()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale export jobs.")
+                ExportJob.remove_expired()
+                for job_pk, future in list(running.items()):
+                    if future.done():
+                        del running[job_pk]
+                        self.stdout.write(f"Finished export job {job_pk}.")
+                while len(running) < processes:
+                    job = ExportJob.claim()
+                    if job is None:
+                        break
+                    self.stdout.write(f"Running export job {job.pk}...")
+                    running[job.pk] = executor.submit(run_export_job, job.pk)
+                if options["once"] and not running:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("exports", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,194 @@
+import os
+import shutil
+import tempfile
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from courses.rest import CourseBackupSerializer
+from courses.results import ResultsArchive
+from django.conf import settings
+from django.db import models
+from django.template.defaultfilters import slugify
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.renderers import JSONRenderer
+from users.models import User
+from utils.views import zip_chunks
+
+
+class ExportJob(models.Model):
+    """
+    An export that is too large to be prepared within a request. Jobs are run
+    by the run_export_workers command, which stores the exported archives
+    under settings.EXPORT_ROOT, from where they are downloaded.
+    """
+
+    RESULTS = "R"
+    SOLUTIONS = "S"
+    COURSE_BACKUP = "B"
+    KIND_CHOICES = (
+        (RESULTS, _("Files with results")),
+        (SOLUTIONS, _("Solution files")),
+        (COURSE_BACKUP, _("Course backup")),
+    )
+    PENDING = "P"
+    RUNNING = "R"
+    FINISHED = "F"
+    FAILED = "E"
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (FINISHED, _("Finished")),
+        (FAILED, _("Failed")),
+    )
+    # progress is stored after every this many exported files
+    PROGRESS_STEP = 10
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="export_jobs")
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES)
+    course = models.ForeignKey(
+        "courses.Course", on_delete=models.CASCADE, related_name="+"
+    )
+    problem_set = models.ForeignKey(
+        "courses.ProblemSet",
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    filename = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    # updated while the job is running, so that jobs of crashed workers are noticed
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return "{} ({}): {}".format(
+            self.get_kind_display(), self.user.username, self.get_status_display()
+        )
+
+    def get_absolute_url(self):
+        return reverse("export_job_detail", args=[str(self.pk)])
+
+    @property
+    def title(self):
+        return self.problem_set.title if self.problem_set else self.course.title
+
+    @property
+    def percentage(self):
+        if self.status == self.FINISHED:
+            return 100
+        return min(99, 100 * self.progress // self.total) if self.total else 0
+
+    @property
+    def path(self):
+        return Path(settings.EXPORT_ROOT) / str(self.pk) / self.filename
+
+    @classmethod
+    def claim(cls):
+        """Mark the oldest pending job as running and return it, or return None
+        if there are no pending jobs. Several workers may claim jobs at once."""
+        while True:
+            job = cls.objects.filter(status=cls.PENDING).order_by("created").first()
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = cls.objects.filter(pk=job.pk, status=cls.PENDING).update(
+                status=cls.RUNNING, heartbeat=now
+            )
+            if claimed:
+                job.status = cls.RUNNING
+                job.heartbeat = now
+                return job
+
+    @classmethod
+    def requeue_stale(cls):
+        """Return running jobs without a heartbeat in the last EXPORT_JOB_TIMEOUT
+        seconds, whose workers have crashed or were restarted, to pending jobs.
+        Return the number of such jobs."""
+        deadline = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+        return cls.objects.filter(status=cls.RUNNING, heartbeat__lt=deadline).update(
+            status=cls.PENDING, progress=0
+        )
+
+    @classmethod
+    def remove_expired(cls):
+        """Delete jobs finished more than EXPORT_EXPIRY seconds ago together
+        with their exported archives. Return the number of deleted jobs."""
+        deadline = timezone.now() - timedelta(seconds=settings.EXPORT_EXPIRY)
+        expired = cls.objects.filter(finished__lt=deadline)
+        for job_pk in expired.values_list("pk", flat=True):
+            shutil.rmtree(Path(settings.EXPORT_ROOT) / str(job_pk), ignore_errors=True)
+        deleted, _ = expired.delete()
+        return deleted
+
+    def archive(self):
+        """Return the name of the archive, an iterable of its files and the
+        expected number of files."""
+        if self.kind == self.RESULTS:
+            archive = ResultsArchive(self.problem_set)
+            files = archive.files(workers=settings.RESULTS_ARCHIVE_WORKERS)
+            return f"{slugify(self.title)}-results", files, len(archive)
+        elif self.kind == self.SOLUTIONS:
+            archive_name, files = self.problem_set.solutions_archive()
+            return archive_name, files, self.problem_set.problems.count()
+        elif self.kind == self.COURSE_BACKUP:
+            serializer = CourseBackupSerializer(self.course)
+            contents = JSONRenderer().render(
+                serializer.data, renderer_context={"indent": 4}
+            )
+            filename = "{0}.txt".format(slugify(self.title))
+            return f"{slugify(self.title)}-backup", [(filename, contents.decode())], 1
+
+    def _heartbeat(self, **fields):
+        ExportJob.objects.filter(pk=self.pk).update(heartbeat=timezone.now(), **fields)
+
+    def _track_progress(self, files):
+        for progress, file in enumerate(files, start=1):
+            yield file
+            self.progress = progress
+            if progress % self.PROGRESS_STEP == 0:
+                self._heartbeat(progress=progress)
+
+    def run(self):
+        """Write the exported archive to disk and record the outcome. The archive
+        is written to a temporary file of its own, so that a run of a job that
+        was requeued while still running cannot corrupt the archive of another
+        run."""
+        partial_path = None
+        try:
+            # preparing the archive may take a while, so the heartbeat is
+            # refreshed around it
+            self._heartbeat()
+            archive_name, files, total = self.archive()
+            self._heartbeat(total=total)
+            self.total = total
+            self.filename = f"{archive_name}.zip"
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, partial_path = tempfile.mkstemp(
+                suffix=".partial", prefix=f"{self.filename}.", dir=self.path.parent
+            )
+            partial_path = Path(partial_path)
+            with os.fdopen(fd, "wb") as archive:
+                for chunk in zip_chunks(self._track_progress(files)):
+                    archive.write(chunk)
+            partial_path.chmod(0o644)
+            partial_path.rename(self.path)
+        except Exception:
+            if partial_path is not None:
+                partial_path.unlink(missing_ok=True)
+            self.status = self.FAILED
+            self.error = traceback.format_exc()
+        else:
+            self.status = self.FINISHED
+        self.finished = timezone.now()
+        self.save(update_fields=["status", "progress", "filename", "error", "finished"])
@@ -0,0 +1,157 @@
+import json
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from attempts.models import Attempt
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from users.models import User
+
+from .models import ExportJob
+
+
+class ExportJobTestCase(TestCase):
+    def setUp(self):
+        self.export_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(EXPORT_ROOT=self.export_root.name)
+        self.settings.enable()
+        self.user = User.objects.create_user(username="USER", password="PASS")
+        self.course = baker.make("courses.Course", title="Course")
+        self.course.teachers.add(self.user)
+        self.problem_set = baker.make(
+            "courses.ProblemSet", course=self.course, title="Problem set"
+        )
+        problem = baker.make(
+            "problems.Problem", problem_set=self.problem_set, language="python"
+        )
+        parts = baker.make("problems.Part", problem=problem, _quantity=2)
+        for student in baker.make("users.User", _quantity=3):
+            baker.make(Attempt, user=student, part=parts[0], feedback=[])
+        self.client.login(username="USER", password="PASS")
+
+    def tearDown(self):
+        self.settings.disable()
+        self.export_root.cleanup()
+
+    def start(self, view, pk):
+        response = self.client.post(reverse(view, args=[pk]))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, job.get_absolute_url())
+        self.assertEqual(job.status, ExportJob.PENDING)
+        return job
+
+    def run_job(self):
+        job = ExportJob.claim()
+        self.assertEqual(job.status, ExportJob.RUNNING)
+        self.assertIsNone(ExportJob.claim())
+        job.run()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FINISHED, job.error)
+        return job
+
+    def download(self, job):
+        response = self.client.get(reverse("export_job_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        return archive.namelist()
+
+    def test_results(self):
+        job = self.start("problem_set_results_export", self.problem_set.pk)
+        response = self.client.get(reverse("export_job_download", args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+        job = self.run_job()
+        self.assertEqual(job.filename, "problem-set-results.zip")
+        self.assertEqual(job.progress, 3 + 3 + 3 + 1)
+        self.assertEqual(job.percentage, 100)
+        self.assertEqual(len(self.download(job)), 10)
+
+    def test_solutions(self):
+        self.start("problem_set_solution_export", self.problem_set.pk)
+        job = self.run_job()
+        self.assertEqual(len(self.download(job)), 1)
+
+    def test_course_backup(self):
+        self.start("course_backup_export", self.course.pk)
+        job = self.run_job()
+        self.assertEqual(self.download(job), ["course.txt"])
+
+    def test_status(self):
+        job = self.start("problem_set_results_export", self.problem_set.pk)
+        response = self.client.get(reverse("export_job_detail", args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse("export_job_status", args=[job.pk]))
+        self.assertEqual(json.loads(response.content)["status"], ExportJob.PENDING)
+
+    def test_permissions(self):
+        job = self.start("problem_set_results_export", self.problem_set.pk)
+        other_user = User.objects.create_user(username="OTHER", password="PASS")
+        self.client.login(username="OTHER", password="PASS")
+        for view in ["export_job_detail", "export_job_status", "export_job_download"]:
+            response = self.client.get(reverse(view, args=[job.pk]))
+            self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            reverse("problem_set_results_export", args=[self.problem_set.pk])
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(other_user.export_jobs.exists())
+
+    def test_failure(self):
+        self.start("problem_set_results_export", self.problem_set.pk)
+        self.problem_set.problems.update(language="octave")
+        job = ExportJob.claim()
+        job.run()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertIn("TemplateDoesNotExist", job.error)
+        self.assertEqual(list(job.path.parent.iterdir()), [])
+
+    @override_settings(EXPORT_JOB_TIMEOUT=60)
+    def test_stale(self):
+        self.start("course_backup_export", self.course.pk)
+        job = ExportJob.claim()
+        self.assertEqual(ExportJob.requeue_stale(), 0)
+        ExportJob.objects.update(heartbeat=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(ExportJob.requeue_stale(), 1)
+        self.assertEqual(self.run_job().pk, job.pk)
+
+    @override_settings(EXPORT_JOB_TIMEOUT=60)
+    def test_overlapping_runs(self):
+        self.start("problem_set_results_export", self.problem_set.pk)
+        archive = ExportJob.archive
+        runs = []
+
+        def slow_archive(job):
+            # the archive is prepared for longer than the timeout
+            ExportJob.objects.update(heartbeat=timezone.now() - timedelta(minutes=2))
+            archive_name, files, total = archive(job)
+            return archive_name, overlapping_files(files), total
+
+        def overlapping_files(files):
+            # the heartbeat is refreshed once the archive is prepared
+            self.assertEqual(ExportJob.requeue_stale(), 0)
+            if not runs:
+                # another worker runs the same job in the meantime
+                runs.append(ExportJob.objects.get())
+                runs[0].run()
+            yield from files
+
+        with mock.patch.object(ExportJob, "archive", slow_archive):
+            job = self.run_job()
+        self.assertEqual(runs[0].status, ExportJob.FINISHED, runs[0].error)
+        self.assertEqual(len(self.download(job)), 10)
+        self.assertEqual(list(job.path.parent.iterdir()), [job.path])
+
+    @override_settings(EXPORT_EXPIRY=60)
+    def test_expired(self):
+        self.start("course_backup_export", self.course.pk)
+        job = self.run_job()
+        self.assertEqual(ExportJob.remove_expired(), 0)
+        ExportJob.objects.update(finished=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(ExportJob.remove_expired(), 1)
+        self.assertFalse(job.path.parent.exists())
+        self.assertFalse(ExportJob.objects.exists())
@@ -0,0 +1,28 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path(
+        "problem_set/<int:problem_set_pk>/results/",
+        views.problem_set_results_export,
+        name="problem_set_results_export",
+    ),
+    path(
+        "problem_set/<int:problem_set_pk>/solution/",
+        views.problem_set_solution_export,
+        name="problem_set_solution_export",
+    ),
+    path(
+        "course/<int:course_pk>/backup/",
+        views.course_backup_export,
+        name="course_backup_export",
+    ),
+    path("<int:job_pk>/", views.export_job_detail, name="export_job_detail"),
+    path("<int:job_pk>/status/", views.export_job_status, name="export_job_status"),
+    path(
+        "<int:job_pk>/download/",
+        views.export_job_download,
+        name="export_job_download",
+    ),
+]
@@ -0,0 +1,83 @@
+from courses.models import Course, ProblemSet
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+from utils import verify
+
+from .models import ExportJob
+
+
+@login_required
+@require_POST
+def problem_set_results_export(request, problem_set_pk):
+    """Start an export of the results archive of a given problem set."""
+    problem_set = get_object_or_404(ProblemSet, pk=problem_set_pk)
+    verify(request.user.can_view_problem_set_attempts(problem_set))
+    job = ExportJob.objects.create(
+        user=request.user,
+        kind=ExportJob.RESULTS,
+        course=problem_set.course,
+        problem_set=problem_set,
+    )
+    return redirect(job)
+
+
+@login_required
+@require_POST
+def problem_set_solution_export(request, problem_set_pk):
+    """Start an export of the solution files of a given problem set."""
+    problem_set = get_object_or_404(ProblemSet, pk=problem_set_pk)
+    verify(request.user.can_edit_problem_set(problem_set))
+    job = ExportJob.objects.create(
+        user=request.user,
+        kind=ExportJob.SOLUTIONS,
+        course=problem_set.course,
+        problem_set=problem_set,
+    )
+    return redirect(job)
+
+
+@login_required
+@require_POST
+def course_backup_export(request, course_pk):
+    """Start an export of the backup of a given course."""
+    course = get_object_or_404(Course, pk=course_pk)
+    verify(request.user.can_edit_course(course))
+    job = ExportJob.objects.create(
+        user=request.user, kind=ExportJob.COURSE_BACKUP, course=course
+    )
+    return redirect(job)
+
+
+@login_required
+def export_job_detail(request, job_pk):
+    """Show the progress of an export, refreshing until it is done."""
+    job = get_object_or_404(ExportJob, pk=job_pk)
+    verify(request.user == job.user)
+    return render(request, "exports/export_job_detail.html", {"job": job})
+
+
+@login_required
+def export_job_status(request, job_pk):
+    """Report the progress of an export for polling clients."""
+    job = get_object_or_404(ExportJob, pk=job_pk)
+    verify(request.user == job.user)
+    return JsonResponse(
+        {
+            "status": job.status,
+            "progress": job.progress,
+            "total": job.total,
+            "percentage": job.percentage,
+        }
+    )
+
+
+@login_required
+def export_job_download(request, job_pk):
+    """Download the file of a finished export."""
+    job = get_object_or_404(ExportJob, pk=job_pk)
+    verify(request.user == job.user)
+    if job.status != ExportJob.FINISHED or not job.path.exists():
+        raise Http404("The export is not available.")
+    return FileResponse(open(job.path, "rb"), as_attachment=True, filename=job.filename)
@@ -0,0 +1,41 @@
+# Generated by Django 4.1.13 on 2026-10-17 20:06
+
+import json
+
+import utils
+from django.db import migrations, models
+
+
+def normalize_secrets(apps, schema_editor):
+    # Secrets are already stored as JSON text, but blank or malformed ones
+    # would not survive the change of the column type and are emptied.
+    for model_name in ["Part", "HistoricalPart"]:
+        model = apps.get_model("problems", model_name)
+        changed = []
+        for obj in model.objects.only("pk", "secret").iterator(chunk_size=1000):
+            try:
+                json.loads(obj.secret)
+            except ValueError:
+                obj.secret = json.dumps([])
+                changed.append(obj)
+        model.objects.bulk_update(changed, ["secret"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("problems", "0005_alter_historicalproblem_visible_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_secrets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="historicalpart",
+            name="secret",
+            field=models.JSONField(default=list, validators=[utils.is_string_list]),
+        ),
+        migrations.AlterField(
+            model_name="part",
+            name="secret",
+            field=models.JSONField(default=list, validators=[utils.is_string_list]),
+        ),
+    ]
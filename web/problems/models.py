@@ -1,21 +1,32 @@
+import hashlib
 import json
+import re
+import secrets
 from copy import deepcopy
 
-from attempts.outcome import Outcome
 from django.conf import settings
 from django.core import signing
+from django.core.cache import cache
 from django.db import models
 from django.template.defaultfilters import slugify
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.html import conditional_escape
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 from rest_framework.authtoken.models import Token
 from simple_history.models import HistoricalRecords
 from taggit.managers import TaggableManager
-from utils import is_json_string_list, truncate
+from utils import is_string_list, truncate
 from utils.models import OrderWithRespectToMixin
 
 
+def _field_values(instance):
+    return [
+        getattr(instance, field.attname) for field in instance._meta.concrete_fields
+    ]
+
+
 class Problem(OrderWithRespectToMixin, models.Model):
     title = models.CharField(max_length=70)
     description = models.TextField(blank=True)
@@ -65,27 +76,62 @@ class Problem(OrderWithRespectToMixin, models.Model):
     def slug(self):
         return slugify(self.title).replace("-", "_")
 
+    def attempt_file_skeleton(self, parts):
+        """Return the user-independent parts of the attempt file, split into a
+        list in which every odd item is the name of a field that is filled in for
+        each user. Skeletons are cached under a fingerprint of everything they
+        depend on, so any change of the problem or its parts invalidates them."""
+        fingerprint = hashlib.sha256(
+            json.dumps(
+                [
+                    _field_values(self),
+                    self.problem_set.solution_visibility,
+                    [_field_values(part) for part in parts],
+                    settings.SUBMISSION_URL,
+                    get_language(),
+                ],
+                default=str,
+            ).encode()
+        ).hexdigest()
+        key = f"problems:attempt_file_skeleton:{fingerprint}"
+        skeleton = cache.get(key)
+        if skeleton is None:
+            # placeholders consist of letters and digits only, so that they
+            # pass through autoescaping unchanged
+            nonce = secrets.token_hex(8)
+            extension = self.EXTENSIONS[self.language]
+            contents = render_to_string(
+                f"{self.language}/attempt.{extension}",
+                {
+                    "problem": self,
+                    "parts": [
+                        (part, f"TOMO{nonce}S{i}END", f"TOMO{nonce}T{i}END")
+                        for i, part in enumerate(parts)
+                    ],
+                    "submission_url": settings.SUBMISSION_URL
+                    + reverse("attempts-submit"),
+                    "authentication_token": f"TOMO{nonce}AEND",
+                },
+            )
+            skeleton = re.split(f"TOMO{nonce}([A-Z][0-9]*)END", contents)
+            cache.set(key, skeleton, timeout=None)
+        return skeleton
+
     def attempt_file(self, user):
         authentication_token = Token.objects.get(user=user)
         solutions = self.user_solutions(user)
-        parts = [
-            (part, solutions.get(part.id, part.template), part.attempt_token(user))
-            for part in self.parts.all()
-        ]
-        url = settings.SUBMISSION_URL + reverse("attempts-submit")
+        parts = list(self.parts.all())
+        # solutions are inserted as they are, while tokens are autoescaped
+        fields = {"A": conditional_escape(authentication_token)}
+        for i, part in enumerate(parts):
+            fields[f"S{i}"] = solutions.get(part.id, part.template)
+            fields[f"T{i}"] = conditional_escape(part.attempt_token(user))
+        pieces = self.attempt_file_skeleton(parts)[:]
+        pieces[1::2] = [fields[field] for field in pieces[1::2]]
         problem_slug = slugify(self.title).replace("-", "_")
         extension = self.EXTENSIONS[self.language]
         filename = f"{problem_slug}.{extension}"
-        contents = render_to_string(
-            f"{self.language}/attempt.{extension}",
-            {
-                "problem": self,
-                "parts": parts,
-                "submission_url": url,
-                "authentication_token": authentication_token,
-            },
-        )
-        return filename, contents
+        return filename, "".join(pieces)
 
     def solution_file(self):
         parts = [(part, part.solution) for part in self.parts.all()]
@@ -101,11 +147,16 @@ class Problem(OrderWithRespectToMixin, models.Model):
         )
         return filename, contents
 
-    def marking_file(self, user):
+    def marking_file(self, user, attempts=None):
         """This function ignores problem visibility because it assumes its
-        called only from courses/models.py:results_archive() by a teacher user
+        called only from courses/results.py:ResultsArchive by a teacher user.
+        Attempts of the user, given as a dictionary keyed by part ids, are
+        fetched if they are not given.
         """
-        attempts = {attempt.part.id: attempt for attempt in self.user_attempts(user)}
+        if attempts is None:
+            attempts = {
+                attempt.part_id: attempt for attempt in self.user_attempts(user)
+            }
         parts = [(part, attempts.get(part.id)) for part in self.parts.all()]
         username = user.get_full_name() or user.username
         problem_slug = slugify(username).replace("-", "_")
@@ -121,11 +172,16 @@ class Problem(OrderWithRespectToMixin, models.Model):
         )
         return filename, contents
 
-    def bare_file(self, user):
+    def bare_file(self, user, attempts=None):
         """This function ignores problem visibility because it assumes its
-        called only from courses/models.py:results_archive() by a teacher user
+        called only from courses/results.py:ResultsArchive by a teacher user.
+        Attempts of the user, given as a dictionary keyed by part ids, are
+        fetched if they are not given.
         """
-        attempts = {attempt.part.id: attempt for attempt in self.user_attempts(user)}
+        if attempts is None:
+            attempts = {
+                attempt.part_id: attempt for attempt in self.user_attempts(user)
+            }
         parts = [(part, attempts.get(part.id)) for part in self.parts.all()]
         username = user.get_full_name() or user.username
         problem_slug = slugify(username).replace("-", "_")
@@ -159,28 +215,6 @@ class Problem(OrderWithRespectToMixin, models.Model):
         )
         return filename, contents
 
-    def attempts_by_user(self, active_only=True):
-        attempts = {}
-        parts = self.parts.all().prefetch_related("attempts", "attempts__user")
-        for part in parts:
-            for attempt in part.attempts.all():
-                if attempt.user in attempts:
-                    attempts[attempt.user][part] = attempt
-                else:
-                    attempts[attempt.user] = {part: attempt}
-        users = self.problem_set.course.observed_students()
-        if active_only:
-            users = users.filter(attempts__part__problem=self).distinct()
-        outcomes = Outcome.group_dict(parts, users, (), ("id",))
-        observed_students = list(users)
-        for user in observed_students:
-            user.these_attempts = [attempts.get(user, {}).get(part) for part in parts]
-            user.outcome = outcomes[(user.id,)]
-        return observed_students
-
-    def attempts_by_user_all(self):
-        return self.attempts_by_user(active_only=False)
-
     def copy_to(self, problem_set):
         new_problem = deepcopy(self)
         new_problem.pk = None
@@ -204,7 +238,7 @@ class Part(OrderWithRespectToMixin, models.Model):
     template = models.TextField(blank=True)
     solution = models.TextField(blank=True)
     validation = models.TextField(blank=True)
-    secret = models.TextField(default="[]", validators=[is_json_string_list])
+    secret = models.JSONField(default=list, validators=[is_string_list])
     history = HistoricalRecords()
 
     class Meta:
@@ -237,11 +271,11 @@ class Part(OrderWithRespectToMixin, models.Model):
         False, None -- if secret has an incorrect length
         False, i -- if secret first differs from the official one at index i
         """
-        official_secret = json.loads(self.secret)
+        official_secret = self.secret
         if len(official_secret) != len(secret):
             return False, None
-        for i in range(len(secret)):
-            if secret[i] != official_secret[i]:
+        for i, (x, official_x) in enumerate(zip(secret, official_secret)):
+            if x != official_x:
                 return False, i
         return True, None
 
@@ -1,20 +1,41 @@
 from django.db import transaction
 from rest_framework import decorators, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.fields import JSONField
 from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
 from rest_framework.viewsets import GenericViewSet
-from utils.rest import DownloadMixin, JSONStringField
+from users.authentication import CachedTokenAuthentication
+from utils import is_string_list
+from utils.rest import DownloadMixin
 
 from .models import Part, Problem
 
 
+class SecretField(JSONField):
+    """
+    A list of strings. R edit files send each string as a list with a single
+    element, since R has no scalars, so such lists are replaced by their
+    elements.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(validators=[is_string_list], **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            data = [
+                value[0] if isinstance(value, list) and len(value) == 1 else value
+                for value in data
+            ]
+        return super().to_internal_value(data)
+
+
 class PartSerializer(ModelSerializer):
     """
     Serialize a Part object instance.
     """
 
-    secret = JSONStringField()
+    secret = SecretField(required=False)
 
     class Meta:
         model = Part
@@ -43,7 +64,9 @@ class ProblemViewSet(GenericViewSet, DownloadMixin):
     queryset = Problem.objects.all()
 
     @decorators.action(
-        detail=False, methods=["post"], authentication_classes=[TokenAuthentication]
+        detail=False,
+        methods=["post"],
+        authentication_classes=[CachedTokenAuthentication],
     )
     @transaction.atomic
     def submit(self, request):
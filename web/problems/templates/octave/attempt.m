@@ -7,7 +7,7 @@ check = struct();
 % =============================================================================
 % {{ problem.title|safe }}{% if problem.description %}
 %
-% {{ problem.description|indent:'% '|safe }}{% endif %}{% for part, solution_attempt in parts %}
+% {{ problem.description|indent:'% '|safe }}{% endif %}{% for part, solution_attempt, _ in parts %}
 % =====================================================================@{{ part.id|stringformat:'06d'}}=
 % {{ forloop.counter }}. podnaloga
 % {{ part.description|indent:'% '|safe }}
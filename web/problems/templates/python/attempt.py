@@ -116,16 +116,24 @@
 "Kode od tu naprej NE SPREMINJAJTE!"
 
 # isort: off
+import hashlib
 import json
 import os
 import re
+import select
 import shutil
+import signal
 import sys
+import time
 import traceback
 import urllib.error
 import urllib.request
 {% include 'python/check.py' %}
 
+# seconds after which validation of a part is stopped in parallel mode
+PART_TIMEOUT = 60
+
+
 def _validate_current_file():
     def extract_parts(filename):
         with open(filename, encoding="utf-8") as f:
@@ -156,7 +164,95 @@ def _validate_current_file():
         shutil.copy(filename, backup_filename)
         return backup_filename
 
-    def submit_parts(parts, url, token):
+    def hashes_filename(filename):
+        directory, basename = os.path.split(filename)
+        return os.path.join(directory, ".{0}.tomo".format(basename))
+
+    def cache_filename(filename):
+        directory, basename = os.path.split(filename)
+        return os.path.join(directory, ".{0}.tomo-cache".format(basename))
+
+    def cache_keys(filename, parts):
+        # Validation of a part depends on the validation code, which changes
+        # whenever the file is updated, on the solution of the part and on the
+        # solutions of all the parts before it, whose definitions it may use.
+        with open(filename, encoding="utf-8") as f:
+            source = f.read()
+        validation_code = source[re.search(r"^# =+@$", source, re.M).start() :]
+        digest = hashlib.sha256(validation_code.encode("utf-8"))
+        keys = []
+        for part in parts:
+            digest.update(json.dumps(part["solution"]).encode("utf-8"))
+            part_digest = digest.copy()
+            part_digest.update(json.dumps(part["part"]).encode("utf-8"))
+            keys.append(part_digest.hexdigest())
+        return keys
+
+    def load_cache(filename):
+        if "--no-cache" in sys.argv[1:]:
+            return {}
+        try:
+            with open(cache_filename(filename), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def store_cache(filename, parts, keys):
+        cache = {
+            key: {
+                "valid": part["valid"],
+                "feedback": part["feedback"],
+                "secret": part["secret"],
+            }
+            for part, key in zip(parts, keys)
+            if Check.has_solution(part)
+        }
+        try:
+            with open(cache_filename(filename), "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def load_hashes(filename):
+        try:
+            with open(hashes_filename(filename), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def store_hashes(filename, response):
+        # Hashes of the states acknowledged by the server, by which unchanged
+        # parts are sent on the next submission.
+        hashes = load_hashes(filename)
+        for part in response["attempts"]:
+            hashes[str(part["part"])] = content_hash(
+                part["solution"], part["valid"], part["feedback"]
+            )
+        try:
+            with open(hashes_filename(filename), "w", encoding="utf-8") as f:
+                json.dump(hashes, f)
+        except OSError:
+            pass
+
+    def content_hash(solution, valid, feedback):
+        data = json.dumps([solution, valid, feedback]).encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def post(url, data, token):
+        data = json.dumps(data).encode("utf-8")
+        headers = {"Authorization": token, "content-type": "application/json"}
+        request = urllib.request.Request(url, data=data, headers=headers)
+        # This is a workaround because some clients (and not macOS ones!) report
+        # <urlopen error [SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed: certificate has expired (_ssl.c:1129)>
+        import ssl
+
+        context = ssl._create_unverified_context()
+        response = urllib.request.urlopen(request, context=context)
+        # When the issue is resolved, the following should be used
+        # response = urllib.request.urlopen(request)
+        return json.loads(response.read().decode("utf-8"))
+
+    def submit_parts(parts, url, token, hashes):
         submitted_parts = []
         for part in parts:
             if Check.has_solution(part):
@@ -167,21 +263,27 @@ def _validate_current_file():
                     "secret": [x for (x, _) in part["secret"]],
                     "feedback": json.dumps(part["feedback"]),
                 }
+                part_hash = content_hash(
+                    submitted_part["solution"],
+                    submitted_part["valid"],
+                    submitted_part["feedback"],
+                )
+                if hashes.get(str(part["part"])) == part_hash:
+                    submitted_part = {"part": part["part"], "hash": part_hash}
                 if "token" in part:
                     submitted_part["token"] = part["token"]
                 submitted_parts.append(submitted_part)
-        data = json.dumps(submitted_parts).encode("utf-8")
-        headers = {"Authorization": token, "content-type": "application/json"}
-        request = urllib.request.Request(url, data=data, headers=headers)
-        # This is a workaround because some clients (and not macOS ones!) report
-        # <urlopen error [SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed: certificate has expired (_ssl.c:1129)>
-        import ssl
-
-        context = ssl._create_unverified_context()
-        response = urllib.request.urlopen(request, context=context)
-        # When the issue is resolved, the following should be used
-        # response = urllib.request.urlopen(request)
-        return json.loads(response.read().decode("utf-8"))
+        response = post(url, submitted_parts, token)
+        outdated = set(response.get("outdated", []))
+        if outdated:
+            # The server no longer has the state we remember, so send it again.
+            outdated_parts = [part for part in parts if part["part"] in outdated]
+            outdated_response = submit_parts(outdated_parts, url, token, {})
+            response["attempts"].extend(outdated_response["attempts"])
+            response["wrong_indices"].update(outdated_response["wrong_indices"])
+            if "update" in outdated_response:
+                response["update"] = outdated_response["update"]
+        return response
 
     def update_attempts(old_parts, response):
         updates = {}
@@ -199,29 +301,141 @@ def _validate_current_file():
                     if hint:
                         part["feedback"].append("Namig: {}".format(hint))
 
+    def start_part():
+        # Parts validated before with the same solutions are not validated again.
+        cached_part = cache.get(keys[Check.part_counter])
+        if cached_part is not None:
+            Check.current_part.update(cached_part)
+            return False
+        # In parallel mode, the current part is validated in a forked process,
+        # while this process carries on with the next part.
+        if not parallel:
+            return True
+        wait_parallel_parts((os.cpu_count() or 1) - 1)
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            # the process gets its own group, so that processes started by the
+            # solution are killed together with it
+            os.setpgid(0, 0)
+            os.close(read_fd)
+            worker["fd"] = write_fd
+            # output is printed by the main process in the order of parts
+            sys.stdout = io.StringIO()
+            return True
+        try:
+            # the group is also set here, in case the timeout comes first
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        os.close(write_fd)
+        deadline = time.monotonic() + PART_TIMEOUT
+        running[Check.part_counter] = (pid, read_fd, deadline, [])
+        return False
+
+    def finish_part():
+        # a forked process sends its part to the main process and exits
+        if worker["fd"] is None:
+            return
+        try:
+            data = json.dumps(
+                {"part": Check.current_part, "output": sys.stdout.getvalue()}
+            )
+            with os.fdopen(worker["fd"], "w", encoding="utf-8") as f:
+                f.write(data)
+        finally:
+            os._exit(0)
+
+    def wait_parallel_parts(limit):
+        # Pipes of all running processes are read together, so that none of
+        # them blocks on a full pipe while another is waited for, and only the
+        # processes that have not closed their pipes by their deadlines are
+        # killed.
+        while len(running) > limit:
+            first_deadline = min(deadline for _, _, deadline, _ in running.values())
+            timeout = max(0, first_deadline - time.monotonic())
+            fds = {read_fd: index for index, (_, read_fd, _, _) in running.items()}
+            for read_fd in select.select(list(fds), [], [], timeout)[0]:
+                chunk = os.read(read_fd, 65536)
+                if chunk:
+                    running[fds[read_fd]][3].append(chunk)
+                else:
+                    finish_parallel_part(fds[read_fd], timed_out=False)
+            now = time.monotonic()
+            for index, (_, _, deadline, _) in list(running.items()):
+                if deadline <= now:
+                    finish_parallel_part(index, timed_out=True)
+        # results are reported in the order of parts, once all the parts
+        # before them are finished
+        first_running = min(running, default=float("inf"))
+        for index in sorted(finished):
+            if index < first_running:
+                report_parallel_part(index, finished.pop(index))
+
+    def finish_parallel_part(index, timed_out):
+        pid, read_fd, _, chunks = running.pop(index)
+        os.close(read_fd)
+        # processes left behind by the solution are killed as well
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        os.waitpid(pid, 0)
+        finished[index] = None if timed_out else b"".join(chunks)
+
+    def report_parallel_part(index, data):
+        part = Check.parts[index]
+        if data is None:
+            part["valid"] = False
+            part["feedback"].append("Dovoljen čas izvajanja presežen")
+            return
+        try:
+            result = json.loads(data.decode("utf-8"))
+        except ValueError:
+            part["valid"] = False
+            part["feedback"].append("Testi se niso izvedli do konca")
+        else:
+            print(result["output"], end="")
+            part.update(result["part"])
+
     filename = os.path.abspath(sys.argv[0])
     file_parts = extract_parts(filename)
     Check.initialize(file_parts)
+    keys = cache_keys(filename, file_parts)
+    cache = load_cache(filename)
+    # With the --parallel option, parts are validated concurrently, which is
+    # only correct if their validations do not depend on each other.
+    parallel = "--parallel" in sys.argv[1:] and hasattr(os, "fork")
+    running = {}
+    finished = {}
+    worker = {"fd": None}
 {% for part, _, token in parts %}
     if Check.part():
         Check.current_part[
             "token"
         ] = "{{ token }}"
-        try:
-            {{ part.validation|default:"pass"|indent:"            "|safe }}
-        except TimeoutError:
-            Check.error("Dovoljen čas izvajanja presežen")
-        except Exception:
-            Check.error(
-                "Testi sprožijo izjemo\n  {0}",
-                "\n  ".join(traceback.format_exc().split("\n"))[:-2],
-            )
+        if start_part():
+            try:
+                try:
+                    {{ part.validation|default:"pass"|indent:"                    "|safe }}
+                except TimeoutError:
+                    Check.error("Dovoljen čas izvajanja presežen")
+                except Exception:
+                    Check.error(
+                        "Testi sprožijo izjemo\n  {0}",
+                        "\n  ".join(traceback.format_exc().split("\n"))[:-2],
+                    )
+            finally:
+                finish_part()
 {% endfor %}
+    wait_parallel_parts(0)
+    store_cache(filename, Check.parts, keys)
     print("Shranjujem rešitve na strežnik... ", end="")
     try:
         url = "{{ submission_url }}"
         token = "Token {{ authentication_token }}"
-        response = submit_parts(Check.parts, url, token)
+        response = submit_parts(Check.parts, url, token, load_hashes(filename))
     except urllib.error.URLError:
         message = (
             "\n"
@@ -236,6 +450,7 @@ def _validate_current_file():
         sys.exit(1)
     else:
         print("Rešitve so shranjene.")
+        store_hashes(filename, response)
         update_attempts(Check.parts, response)
         if "update" in response:
             print("{% trans 'Updating file' %}... ", end="")
@@ -1,5 +1,8 @@
 import io
+import sys
+from collections import deque
 from contextlib import contextmanager
+from functools import partial
 
 
 class VisibleStringIO(io.StringIO):
@@ -18,6 +21,257 @@ class TimeoutError(Exception):
     pass
 
 
+class OutputLimitExceeded(BaseException):
+    # not an Exception, so that solutions cannot catch it and keep printing
+    pass
+
+
+class OutputComparison(io.TextIOBase):
+    """
+    A writable stream that compares lines with the expected ones as they are
+    written, ignoring trailing whitespace. Only the lines around the first
+    difference are kept, and writing fails with OutputLimitExceeded once there
+    are more than margin lines more than expected, or a line is more than margin
+    characters longer than the longest expected line.
+    """
+
+    def __init__(self, expected_lines, margin=100, context=3):
+        self.expected_lines = [line.rstrip() for line in expected_lines]
+        self.max_lines = len(self.expected_lines) + margin
+        self.max_line_length = max(map(len, self.expected_lines), default=0) + margin
+        self.context = context
+        self.lines = 0
+        self.pending = ""
+        self.exceeded = False
+        # index of the first differing line, the lines before it,
+        # and the lines starting with it
+        self.mismatch = None
+        self.before = deque(maxlen=context)
+        self.after = []
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if self.exceeded:
+            raise OutputLimitExceeded
+        lines = (self.pending + s).splitlines(True)
+        self.pending = ""
+        # \r may be followed by \n in the next write
+        if lines and (lines[-1].endswith("\r") or lines[-1].splitlines() == lines[-1:]):
+            self.pending = lines.pop()
+        for line in lines:
+            self.add_line(line)
+        if len(self.pending) > self.max_line_length:
+            self.exceeded = True
+            raise OutputLimitExceeded
+        return len(s)
+
+    def add_line(self, line):
+        line = line.rstrip()
+        if self.lines == self.max_lines:
+            self.exceeded = True
+            raise OutputLimitExceeded
+        if self.mismatch is None:
+            if line == self.expected_line(self.lines):
+                self.before.append(line)
+            else:
+                self.mismatch = self.lines
+                self.after.append(line)
+        elif len(self.after) <= self.context:
+            self.after.append(line)
+        self.lines += 1
+
+    def expected_line(self, index):
+        return self.expected_lines[index] if index < len(self.expected_lines) else ""
+
+    def finish(self):
+        # an overlong last line is shortened to just over the limit
+        if self.pending and self.lines < self.max_lines:
+            self.add_line(self.pending[: self.max_line_length + 1])
+        self.pending = ""
+        # missing lines are empty
+        if self.mismatch is None:
+            for index in range(self.lines, len(self.expected_lines)):
+                if self.expected_lines[index]:
+                    self.mismatch = index
+                    break
+
+    @property
+    def equal(self):
+        return self.mismatch is None and not self.exceeded
+
+    def diff(self, title):
+        """Return the lines of a side-by-side comparison of actual and expected
+        lines around the first difference and the width of the actual lines, which
+        are at least as wide as the given title."""
+        start = self.mismatch - len(self.before)
+        end = min(
+            self.mismatch + self.context + 1, max(self.lines, len(self.expected_lines))
+        )
+        actual_lines = list(self.before) + self.after
+        actual_lines += (end - start - len(actual_lines)) * [""]
+        line_width = max(len(line) for line in actual_lines + [title])
+        diff = ["..."] if start > 0 else []
+        for index, out in enumerate(actual_lines[: end - start], start):
+            given = self.expected_line(index)
+            diff.append(
+                "{0} {1} {2}".format(
+                    out.ljust(line_width), "|" if out == given else "*", given
+                )
+            )
+        if end < max(self.lines, len(self.expected_lines)):
+            diff.append("...")
+        return diff, line_width
+
+
+class Cleaner:
+    """
+    Cleaning of values before they are compared, so that floats are rounded and
+    dictionaries and sets do not depend on the order of their items. Long
+    containers of scalars are cleaned in a single pass, while containers nested
+    deeper than max_depth are cleaned with a stack instead of recursion, so that
+    they do not exceed the recursion limit.
+    """
+
+    containers = (list, tuple, dict, set)
+    sequences = (list, tuple)
+    # containers shorter than this are not checked for nested containers,
+    # as the check would cost more than it saves
+    min_flat_length = 8
+    max_depth = 100
+
+    def __init__(self, digits=6, typed=False):
+        self.digits = digits
+        self.typed = typed
+
+    def scalar(self, x):
+        t = type(x)
+        if t is float:
+            x = round(x, self.digits)
+            # Since -0.0 differs from 0.0 even after rounding,
+            # we change it to 0.0 abusing the fact it behaves as False.
+            x = x if x else 0.0
+        elif t is complex:
+            real, imag = round(x.real, self.digits), round(x.imag, self.digits)
+            x = complex(real if real else 0.0, imag if imag else 0.0)
+        return (t, x) if self.typed else x
+
+    def items(self, t, x):
+        # Return the cleaned items of a container, or None if it contains other
+        # containers. Key-value pairs of dictionaries have no type.
+        if t is dict:
+            types = set(map(type, x))
+            types.update(map(type, x.values()))
+        else:
+            types = set(map(type, x))
+        if not types.isdisjoint(self.containers):
+            return None
+        if t is dict:
+            return [(self.scalar(k), self.scalar(v)) for k, v in x.items()]
+        if self.typed or float in types or complex in types:
+            if types == {float} and not self.typed:
+                return [round(y, self.digits) or 0.0 for y in x]
+            return [self.scalar(y) for y in x]
+        return list(x)
+
+    def finish(self, t, items):
+        if t is None:
+            return tuple(items)
+        if t is tuple:
+            items = tuple(items)
+        elif t is not list:
+            items = sorted(items)
+        return (t, items) if self.typed else items
+
+    def clean(self, x):
+        digits, typed, containers = self.digits, self.typed, self.containers
+        items, finish = self.items, self.finish
+        min_flat_length, max_depth = self.min_flat_length, self.max_depth
+
+        # Scalars are cleaned inline, as function calls are the main cost.
+        def clean(x, depth):
+            t = type(x)
+            if t is float:
+                x = round(x, digits)
+                v = x if x else 0.0
+            elif t not in containers:
+                # immutable scalars other than complex numbers are kept as they are
+                if t is not complex:
+                    return (t, x) if typed else x
+                real, imag = round(x.real, digits), round(x.imag, digits)
+                v = complex(real if real else 0.0, imag if imag else 0.0)
+            else:
+                if len(x) >= min_flat_length:
+                    v = items(t, x)
+                    if v is not None:
+                        return finish(t, v)
+                if depth >= max_depth:
+                    return self.clean_deep(x)
+                depth += 1
+                if t is dict:
+                    v = sorted(
+                        [(clean(k, depth), clean(y, depth)) for k, y in x.items()]
+                    )
+                else:
+                    v = [clean(y, depth) for y in x]
+                    if t is tuple:
+                        v = tuple(v)
+                    elif t is set:
+                        v = sorted(v)
+            return (t, v) if typed else v
+
+        return clean(x, 0)
+
+    def clean_deep(self, x):
+        t = type(x)
+        # each frame holds the type of a container, an iterator over its items
+        # and the list of its items cleaned so far
+        stack = [(t, iter(x.items() if t is dict else x), [])]
+        while True:
+            t, iterator, cleaned = stack[-1]
+            for y in iterator:
+                ty = None if t is dict else type(y)
+                if ty is not None and ty not in self.containers:
+                    cleaned.append(self.scalar(y))
+                    continue
+                items = self.items(ty, y)
+                if items is not None:
+                    cleaned.append(self.finish(ty, items))
+                    continue
+                stack.append((ty, iter(y.items() if ty is dict else y), []))
+                break
+            else:
+                stack.pop()
+                value = self.finish(t, cleaned)
+                if not stack:
+                    return value
+                stack[-1][2].append(value)
+
+    def equal(self, x, y):
+        # Lists and tuples are compared item by item, so that comparison stops
+        # at the first difference, while other values are cleaned as a whole.
+        stack = [(x, y)]
+        while stack:
+            x, y = stack.pop()
+            tx, ty = type(x), type(y)
+            if self.typed and tx is not ty:
+                return False
+            if tx in self.sequences and ty in self.sequences:
+                if tx is not ty or len(x) != len(y):
+                    return False
+                items_x = self.items(tx, x)
+                items_y = None if items_x is None else self.items(ty, y)
+                if items_y is None:
+                    stack.extend(zip(reversed(x), reversed(y)))
+                elif items_x != items_y:
+                    return False
+            # scalars are compared inside lists, which compare them by identity first
+            elif [self.clean(x)] != [self.clean(y)]:
+                return False
+        return True
+
+
 class Check:
     parts = None
     current_part = None
@@ -55,32 +309,17 @@ class Check:
 
     @staticmethod
     def clean(x, digits=6, typed=False):
-        t = type(x)
-        if t is float:
-            x = round(x, digits)
-            # Since -0.0 differs from 0.0 even after rounding,
-            # we change it to 0.0 abusing the fact it behaves as False.
-            v = x if x else 0.0
-        elif t is complex:
-            v = complex(
-                Check.clean(x.real, digits, typed), Check.clean(x.imag, digits, typed)
-            )
-        elif t is list:
-            v = list([Check.clean(y, digits, typed) for y in x])
-        elif t is tuple:
-            v = tuple([Check.clean(y, digits, typed) for y in x])
-        elif t is dict:
-            v = sorted(
-                [
-                    (Check.clean(k, digits, typed), Check.clean(v, digits, typed))
-                    for (k, v) in x.items()
-                ]
-            )
-        elif t is set:
-            v = sorted([Check.clean(y, digits, typed) for y in x])
-        else:
-            v = x
-        return (t, v) if typed else v
+        return Cleaner(digits, typed).clean(x)
+
+    @staticmethod
+    def clean_equal(x, y, clean=None):
+        clean = Check.get("clean", clean)
+        # values are compared lazily if they are cleaned in the default way
+        if clean is Check.clean:
+            return Cleaner().equal(x, y)
+        if isinstance(clean, partial) and clean.func is Check.clean and not clean.args:
+            return Cleaner(**clean.keywords).equal(x, y)
+        return clean(x) == clean(y)
 
     @staticmethod
     def secret(x, hint=None, clean=None):
@@ -92,7 +331,7 @@ class Check:
         global_env = Check.init_environment(env=env, update_env=update_env)
         clean = Check.get("clean", clean)
         actual_result = eval(expression, global_env)
-        if clean(actual_result) != clean(expected_result):
+        if not Check.clean_equal(actual_result, expected_result, clean):
             Check.error(
                 "Izraz {0} vrne {1!r} namesto {2!r}.",
                 expression,
@@ -156,7 +395,7 @@ class Check:
                 errors.append(
                     "morajo nastaviti spremenljivko {0}, vendar je ne".format(x)
                 )
-            elif clean(global_env[x]) != clean(v):
+            elif not Check.clean_equal(global_env[x], v, clean):
                 errors.append(
                     "nastavijo {0} na {1!r} namesto na {2!r}".format(
                         x, global_env[x], v
@@ -210,72 +449,60 @@ class Check:
             )
 
     @staticmethod
-    def out_file(filename, content, encoding=None):
+    def out_file(filename, content, encoding=None, margin=None):
         encoding = Check.get("encoding", encoding)
+        comparison = OutputComparison(content, Check.get("output_margin", margin))
         with open(filename, encoding=encoding) as f:
-            out_lines = f.readlines()
-        equal, diff, line_width = Check.difflines(out_lines, content)
-        if equal:
+            try:
+                for chunk in iter(lambda: f.read(io.DEFAULT_BUFFER_SIZE), ""):
+                    comparison.write(chunk)
+            except OutputLimitExceeded:
+                pass
+        comparison.finish()
+        if comparison.equal:
             return True
-        else:
+        if comparison.exceeded:
+            Check.error("Izhodna datoteka {0} je predolga.", filename)
+        if comparison.mismatch is not None:
+            diff, line_width = comparison.diff("je enaka")
             Check.error(
                 "Izhodna datoteka {0}\n  je enaka{1}  namesto:\n  {2}",
                 filename,
                 (line_width - 7) * " ",
                 "\n  ".join(diff),
             )
-            return False
+        return False
 
     @staticmethod
-    def output(expression, content, env=None, update_env=None):
+    def output(expression, content, env=None, update_env=None, margin=None):
         global_env = Check.init_environment(env=env, update_env=update_env)
+        comparison = OutputComparison(content, Check.get("output_margin", margin))
         old_stdout = sys.stdout
-        sys.stdout = io.StringIO()
+        sys.stdout = comparison
         too_many_read_requests = False
         try:
             exec(expression, global_env)
         except EOFError:
             too_many_read_requests = True
+        except OutputLimitExceeded:
+            pass
         finally:
-            output = sys.stdout.getvalue().rstrip().splitlines()
             sys.stdout = old_stdout
-        equal, diff, line_width = Check.difflines(output, content)
-        if equal and not too_many_read_requests:
+        comparison.finish()
+        if comparison.equal and not too_many_read_requests:
             return True
-        else:
-            if too_many_read_requests:
-                Check.error("Program prevečkrat zahteva uporabnikov vnos.")
-            if not equal:
-                Check.error(
-                    "Program izpiše{0}  namesto:\n  {1}",
-                    (line_width - 13) * " ",
-                    "\n  ".join(diff),
-                )
-            return False
-
-    @staticmethod
-    def difflines(actual_lines, expected_lines):
-        actual_len, expected_len = len(actual_lines), len(expected_lines)
-        if actual_len < expected_len:
-            actual_lines += (expected_len - actual_len) * ["\n"]
-        else:
-            expected_lines += (actual_len - expected_len) * ["\n"]
-        equal = True
-        line_width = max(
-            len(actual_line.rstrip())
-            for actual_line in actual_lines + ["Program izpiše"]
-        )
-        diff = []
-        for out, given in zip(actual_lines, expected_lines):
-            out, given = out.rstrip(), given.rstrip()
-            if out != given:
-                equal = False
-            diff.append(
-                "{0} {1} {2}".format(
-                    out.ljust(line_width), "|" if out == given else "*", given
-                )
+        if too_many_read_requests:
+            Check.error("Program prevečkrat zahteva uporabnikov vnos.")
+        if comparison.exceeded:
+            Check.error("Program izpiše preveč, zato je bil prekinjen.")
+        if comparison.mismatch is not None:
+            diff, line_width = comparison.diff("Program izpiše")
+            Check.error(
+                "Program izpiše{0}  namesto:\n  {1}",
+                (line_width - 13) * " ",
+                "\n  ".join(diff),
             )
-        return equal, diff, line_width
+        return False
 
     @staticmethod
     def init_environment(env=None, update_env=None):
@@ -307,7 +534,7 @@ class Check:
         try:
             for iteration, expected_value in enumerate(expected_values):
                 actual_value = next(gen)
-                if clean(actual_value) != clean(expected_value):
+                if not Check.clean_equal(actual_value, expected_value, clean):
                     Check.error(
                         "Vrednost #{0}, ki jo vrne generator {1} je {2!r} namesto {3!r}.",
                         iteration,
@@ -348,6 +575,7 @@ class Check:
             "encoding": None,
             "env": {},
             "further_iter": 0,
+            "output_margin": 100,
             "should_stop": False,
             "stringio": VisibleStringIO,
             "update_env": False,
@@ -375,7 +603,7 @@ class Check:
     @contextmanager
     def set_clean(clean=None, **kwargs):
         clean = clean or Check.clean
-        with Check.set(clean=(lambda x: clean(x, **kwargs)) if kwargs else clean):
+        with Check.set(clean=partial(clean, **kwargs) if kwargs else clean):
             yield
 
     @staticmethod
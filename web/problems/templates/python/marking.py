@@ -2,8 +2,8 @@
 # {{ problem.title|safe }} ({{ user.get_full_name }}){% for part, attempt in parts %}
 # =====================================================================@{{ part.id|stringformat:'06d'}}=
 # {{ forloop.counter }}. podnaloga
-# {% if not attempt %}BREZ REŠITVE{% elif attempt.valid %}VELJAVNA REŠITEV{% else %}NEVELJAVNA REŠITEV{% endif %}{% if attempt and attempt.feedback_list %}{% for feedback in attempt.feedback_list %}
-# - {{ feedback|indent:"#   "|safe }}{% endfor %}{% endif %}
+# {% if not attempt %}BREZ REŠITVE{% elif attempt.valid %}VELJAVNA REŠITEV{% else %}NEVELJAVNA REŠITEV{% endif %}{% if attempt %}{% with messages=attempt.feedback_list %}{% for feedback in messages %}
+# - {{ feedback|indent:"#   "|safe }}{% endfor %}{% endwith %}{% endif %}
 # =============================================================================
 {% if attempt %}{{ attempt.solution|safe }}{% endif %}{% endfor %}
 
@@ -0,0 +1,32 @@
+{% for part, solution in parts %}
+# =====================================================================@{{ part.id|stringformat:'06d'}}=
+{{ solution|safe }}{% endfor %}
+
+# ============================================================================@
+# fmt: off
+# isort: off
+import json
+import sys
+import traceback
+{% include 'python/check.py' %}
+
+def _regrade():
+    Check.initialize({{ parts_json|safe }})
+{% for part, _ in parts %}
+    if Check.part():
+        try:
+            {{ part.validation|default:"pass"|indent:"            "|safe }}
+        except TimeoutError:
+            Check.error("Dovoljen čas izvajanja presežen")
+        except Exception:
+            Check.error(
+                "Testi sprožijo izjemo\n  {0}",
+                "\n  ".join(traceback.format_exc().split("\n"))[:-2],
+            )
+{% endfor %}
+
+
+if __name__ == "__main__":
+    _regrade()
+    with open(sys.argv[1], "w", encoding="utf-8") as _result_file:
+        json.dump(Check.parts, _result_file)
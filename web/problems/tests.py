@@ -1,6 +1,22 @@
-from django.test import TestCase
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from attempts.models import Attempt
+from django.conf import settings
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from model_bakery import baker
+from problems.models import Part
+from problems.rest import PartSerializer
 from problems.templates.python.check import Check
+from rest_framework.authtoken.models import Token
 
 
 class PartTestCase(TestCase):
@@ -13,13 +29,13 @@ class PartTestCase(TestCase):
         self.assertEqual(part0.check_secret([]), (True, None))
         self.assertEqual(part0.check_secret(["1"]), (False, None))
 
-        part1 = baker.make("problems.Part", problem=prob, secret='["1"]')
+        part1 = baker.make("problems.Part", problem=prob, secret=["1"])
         self.assertEqual(part1.check_secret([]), (False, None))
         self.assertEqual(part1.check_secret(["1"]), (True, None))
         self.assertEqual(part1.check_secret([1]), (False, 0))
         self.assertEqual(part1.check_secret(["1", "2"]), (False, None))
 
-        part2 = baker.make("problems.Part", problem=prob, secret='["1", "2"]')
+        part2 = baker.make("problems.Part", problem=prob, secret=["1", "2"])
         self.assertEqual(part2.check_secret([]), (False, None))
         self.assertEqual(part2.check_secret(["1"]), (False, None))
         self.assertEqual(part2.check_secret(["1", "2"]), (True, None))
@@ -27,6 +43,25 @@ class PartTestCase(TestCase):
         self.assertEqual(part2.check_secret(["1", 2]), (False, 1))
         self.assertEqual(part2.check_secret(["1", "2", "3"]), (False, None))
 
+    def test_serialized_secret(self):
+        part = baker.make("problems.Part", secret=["1", "2"])
+        self.assertEqual(PartSerializer(part).data["secret"], ["1", "2"])
+        serializer = PartSerializer(part, data={"secret": ["3"]}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        part.refresh_from_db()
+        self.assertEqual(part.check_secret(["3"]), (True, None))
+        serializer = PartSerializer(part, data={"secret": '["3"]'}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        # R edit files send each secret as a list with a single element
+        serializer = PartSerializer(part, data={"secret": [["4"], ["5"]]}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        part.refresh_from_db()
+        self.assertEqual(part.secret, ["4", "5"])
+        serializer = PartSerializer(part, data={"secret": [["4", "5"]]}, partial=True)
+        self.assertFalse(serializer.is_valid())
+
 
 class ApproxTestCase(TestCase):
     def test_basic(self):
@@ -50,3 +85,381 @@ class ApproxTestCase(TestCase):
         self.assertRegexpMatches(
             Check.current_part["feedback"][-1], r"Rezultat ni pravilen\..*"
         )
+
+
+def recursive_clean(x, digits=6, typed=False):
+    # the original recursive implementation of Check.clean
+    t = type(x)
+    if t is float:
+        x = round(x, digits)
+        v = x if x else 0.0
+    elif t is complex:
+        v = complex(recursive_clean(x.real, digits), recursive_clean(x.imag, digits))
+    elif t in (list, tuple):
+        v = t([recursive_clean(y, digits, typed) for y in x])
+    elif t is dict:
+        v = sorted(
+            (recursive_clean(k, digits, typed), recursive_clean(v, digits, typed))
+            for (k, v) in x.items()
+        )
+    elif t is set:
+        v = sorted([recursive_clean(y, digits, typed) for y in x])
+    else:
+        v = x
+    return (t, v) if typed else v
+
+
+class CleanTestCase(TestCase):
+    values = [
+        1,
+        -0.0,
+        1.23456789,
+        2 - 0.0000001j,
+        "abc",
+        None,
+        [1, 2.0000001, (3, -0.0), {"a": [1.5, {2, 1}]}],
+        {(1, 2): [0.1 * i for i in range(20)], (0, 1): {3: "x"}},
+        [list(range(10)), [0.5] * 10, tuple("abcdefghij"), set(range(10))],
+        ({1: 2.0, 2: 1 + 1j}, [[[[]]]], ()),
+    ]
+
+    def test_clean(self):
+        for value in self.values:
+            for kwargs in [{}, {"digits": 2}, {"typed": True}]:
+                self.assertEqual(
+                    repr(Check.clean(value, **kwargs)),
+                    repr(recursive_clean(value, **kwargs)),
+                )
+
+    def test_clean_equal(self):
+        for x in self.values:
+            for y in self.values:
+                self.assertEqual(Check.clean_equal(x, y), x is y)
+        self.assertTrue(Check.clean_equal([1.0000001] * 10, [1.0] * 10))
+        self.assertFalse(Check.clean_equal([1.0001] * 10, [1.0] * 10))
+        self.assertFalse(Check.clean_equal([1, 2], (1, 2)))
+        self.assertTrue(Check.clean_equal({1: [2.0]}, {1: [2]}))
+        with Check.set_clean(digits=1):
+            self.assertTrue(Check.clean_equal([1.01] * 10, [1.04] * 10))
+        with Check.set_clean(typed=True):
+            self.assertFalse(Check.clean_equal({1: [2.0]}, {1: [2]}))
+        with Check.set_clean(lambda x: len(x)):
+            self.assertTrue(Check.clean_equal([1, 2], "ab"))
+
+    def test_deep(self):
+        x = y = 1.0
+        for i in range(10000):
+            x = [x, {i: (i,)}]
+            y = [y, {i: (i,)}]
+        self.assertEqual(Check.clean(x)[1], [(9999, (9999,))])
+        self.assertTrue(Check.clean_equal(x, y))
+        self.assertFalse(Check.clean_equal(x, [y]))
+
+    def test_benchmark(self):
+        def best_time(f, *args):
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                f(*args)
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        matrix = [[i * j for j in range(100)] for i in range(1000)]
+        other = [[i * j for j in range(100)] for i in range(1000)]
+        other[0][0] = -1
+        self.assertLess(
+            best_time(Check.clean, matrix), best_time(recursive_clean, matrix)
+        )
+        self.assertLess(
+            10 * best_time(Check.clean_equal, matrix, other),
+            best_time(
+                lambda x, y: recursive_clean(x) == recursive_clean(y), matrix, other
+            ),
+        )
+
+
+class OutputTestCase(TestCase):
+    def setUp(self):
+        Check.initialize([{"solution": "..."}])
+        Check.part_counter = None
+        Check.part()
+
+    def test_equal(self):
+        self.assertTrue(Check.output("print('a  ')\nprint('b', end='')", ["a", "b"]))
+        self.assertTrue(Check.output("print('a\\r\\n\\n\\n')", ["a", "", ""]))
+        self.assertTrue(Check.output("pass", ["", ""]))
+        self.assertFalse(Check.output("print('a')", ["a", "b"]))
+        self.assertFalse(Check.output("print('a\\nb')", ["a"]))
+        self.assertEqual(Check.current_part["feedback"][-1].count("*"), 1)
+
+    def test_diff_window(self):
+        expected = [str(i) for i in range(100)]
+        self.assertFalse(
+            Check.output("for i in range(100): print(i if i != 50 else 'x')", expected)
+        )
+        self.assertEqual(
+            Check.current_part["feedback"][-1],
+            "Program izpiše   namesto:\n  ...\n"
+            "  47             | 47\n"
+            "  48             | 48\n"
+            "  49             | 49\n"
+            "  x              * 50\n"
+            "  51             | 51\n"
+            "  52             | 52\n"
+            "  53             | 53\n"
+            "  ...",
+        )
+
+    def test_limit(self):
+        self.assertFalse(Check.output("while True: print('a')", ["a"]))
+        self.assertEqual(
+            Check.current_part["feedback"][-2],
+            "Program izpiše preveč, zato je bil prekinjen.",
+        )
+        self.assertFalse(Check.output("while True: print('a', end='')", ["a"]))
+        self.assertEqual(
+            Check.current_part["feedback"][-2],
+            "Program izpiše preveč, zato je bil prekinjen.",
+        )
+        # solutions that catch exceptions are stopped as well
+        program = "while True:\n    try:\n        print('a')\n    except Exception:\n"
+        program += "        pass"
+        self.assertFalse(Check.output(program, ["a"]))
+        self.assertEqual(
+            Check.current_part["feedback"][-2],
+            "Program izpiše preveč, zato je bil prekinjen.",
+        )
+        self.assertTrue(Check.output("print(10 * '\\n')", [], margin=11))
+        self.assertFalse(Check.output("print(10 * '\\n')", [], margin=5))
+
+    def test_out_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = Path(directory) / "izhod.txt"
+            filename.write_text("a\nb\n")
+            self.assertTrue(Check.out_file(filename, ["a", "b", ""]))
+            self.assertFalse(Check.out_file(filename, ["a", "c"]))
+            self.assertEqual(
+                Check.current_part["feedback"][-1],
+                f"Izhodna datoteka {filename}\n"
+                "  je enaka   namesto:\n"
+                "  a        | a\n"
+                "  b        * c",
+            )
+            filename.write_text(1000 * "a\n")
+            with Check.set(output_margin=10):
+                self.assertFalse(Check.out_file(filename, ["a"]))
+            self.assertEqual(
+                Check.current_part["feedback"][-2],
+                f"Izhodna datoteka {filename} je predolga.",
+            )
+
+
+class AttemptFileTestCase(TestCase):
+    def setUp(self):
+        self.user = baker.make("users.User")
+        self.problem_set = baker.make("courses.ProblemSet")
+
+    def direct_render(self, problem, user):
+        solutions = problem.user_solutions(user)
+        extension = problem.EXTENSIONS[problem.language]
+        return render_to_string(
+            f"{problem.language}/attempt.{extension}",
+            {
+                "problem": problem,
+                "parts": [
+                    (
+                        part,
+                        solutions.get(part.id, part.template),
+                        part.attempt_token(user),
+                    )
+                    for part in problem.parts.all()
+                ],
+                "submission_url": settings.SUBMISSION_URL + reverse("attempts-submit"),
+                "authentication_token": Token.objects.get(user=user),
+            },
+        )
+
+    def test_identical(self):
+        for language in ["python", "octave", "r"]:
+            problem = baker.make(
+                "problems.Problem",
+                problem_set=self.problem_set,
+                language=language,
+                description="Opis <s> & {{ posebnimi }} znaki",
+            )
+            parts = baker.make(
+                "problems.Part",
+                problem=problem,
+                description="Podnaloga\\nv dveh vrsticah",
+                template="# predloga",
+                _quantity=3,
+            )
+            baker.make(
+                "attempts.Attempt",
+                user=self.user,
+                part=parts[1],
+                solution='print("<&>")\\nTOMO0S0END',
+            )
+            for user in [self.user, baker.make("users.User")]:
+                filename, contents = problem.attempt_file(user)
+                self.assertEqual(contents, self.direct_render(problem, user))
+
+    def test_invalidation(self):
+        problem = baker.make("problems.Problem", problem_set=self.problem_set)
+        part = baker.make("problems.Part", problem=problem, validation="pass")
+        _, contents = problem.attempt_file(self.user)
+        with mock.patch("problems.models.render_to_string") as render:
+            self.assertEqual(problem.attempt_file(self.user)[1], contents)
+            render.assert_not_called()
+        part.validation = "Check.equal('1 + 1', 2)"
+        part.save()
+        _, new_contents = problem.attempt_file(self.user)
+        self.assertNotEqual(new_contents, contents)
+        self.assertEqual(new_contents, self.direct_render(problem, self.user))
+        problem.title = "Nov naslov"
+        problem.save()
+        _, contents = problem.attempt_file(self.user)
+        self.assertIn("# Nov naslov", contents)
+
+
+class AttemptFileValidationTestCase(LiveServerTestCase):
+    def setUp(self):
+        self.user = baker.make("users.User")
+        problem_set = baker.make("courses.ProblemSet", visible=True)
+        self.problem = baker.make(
+            "problems.Problem", problem_set=problem_set, visible=True
+        )
+        for validation in [
+            "print('prvi')\nCheck.equal('f(2)', 4)",
+            "print('drugi')\nCheck.equal('f(3)', 10)",
+            "print('tretji')\nwith Check.time_limit(0.5):\n    Check.equal('g()', 1)",
+        ]:
+            baker.make("problems.Part", problem=self.problem, validation=validation)
+        for part, solution in zip(
+            self.problem.parts.all(),
+            ["def f(x):\n    return x * x", "# f", "def g():\n    while True: pass"],
+        ):
+            baker.make("attempts.Attempt", user=self.user, part=part, solution=solution)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def download_attempt_file(self):
+        with override_settings(SUBMISSION_URL=self.live_server_url):
+            filename, contents = self.problem.attempt_file(self.user)
+        self.path = self.directory / filename
+        self.path.write_text(contents, encoding="utf-8")
+
+    def run_attempt_file(self, *options, download=True):
+        if download:
+            self.download_attempt_file()
+        process = subprocess.run(
+            [sys.executable, self.path, *options], capture_output=True, text=True
+        )
+        return process.stdout, [
+            (attempt.valid, attempt.feedback_list())
+            for attempt in Attempt.objects.order_by("part___order")
+        ]
+
+    def test_parallel(self):
+        output, attempts = self.run_attempt_file()
+        self.assertEqual(
+            attempts,
+            [
+                (True, []),
+                (False, ["Izraz f(3) vrne 9 namesto 10."]),
+                (False, ["Dovoljen čas izvajanja presežen"]),
+            ],
+        )
+        Attempt.objects.update(valid=False, feedback=[], content_hash="")
+        parallel_output, parallel_attempts = self.run_attempt_file(
+            "--parallel", "--no-cache"
+        )
+        self.assertEqual(parallel_attempts, attempts)
+        self.assertEqual(parallel_output, output)
+        self.assertTrue(output.startswith("prvi\ndrugi\ntretji\n"))
+
+    def test_parallel_output(self):
+        # outputs larger than pipe buffers are read while earlier parts run
+        part = baker.make(
+            "problems.Part",
+            problem=self.problem,
+            validation="print('četrti')\nprint(100000 * 'x')",
+        )
+        baker.make("attempts.Attempt", user=self.user, part=part, solution="# x")
+        output, attempts = self.run_attempt_file("--parallel", "--no-cache")
+        self.assertTrue(output.startswith("prvi\ndrugi\ntretji\nčetrti\n"))
+        self.assertIn(100000 * "x", output)
+        self.assertEqual(attempts[2], (False, ["Dovoljen čas izvajanja presežen"]))
+        self.assertEqual(attempts[3], (True, []))
+
+    def test_cache(self):
+        _, attempts = self.run_attempt_file()
+        # unchanged parts are not validated again
+        output, cached_attempts = self.run_attempt_file(download=False)
+        self.assertFalse(output.startswith("prvi"))
+        self.assertEqual(cached_attempts, attempts)
+        # only the changed part is validated again
+        contents = self.path.read_text(encoding="utf-8")
+        self.path.write_text(
+            contents.replace("while True: pass", "return 1"), encoding="utf-8"
+        )
+        output, cached_attempts = self.run_attempt_file(download=False)
+        self.assertTrue(output.startswith("tretji\n"))
+        self.assertEqual(cached_attempts, attempts[:2] + [(True, [])])
+        # later parts may use definitions of the changed part
+        contents = self.path.read_text(encoding="utf-8")
+        self.path.write_text(
+            contents.replace("return x * x", "return 3 * x"), encoding="utf-8"
+        )
+        output, updated_attempts = self.run_attempt_file(download=False)
+        self.assertTrue(output.startswith("prvi\ndrugi\ntretji\n"))
+        self.assertFalse(updated_attempts[0][0])
+        self.assertEqual(
+            updated_attempts[1], (False, ["Izraz f(3) vrne 9 namesto 10."])
+        )
+        output, _ = self.run_attempt_file("--no-cache", download=False)
+        self.assertTrue(output.startswith("prvi\ndrugi\ntretji\n"))
+        # changes of the validation code invalidate the cache
+        Part.objects.filter(validation__contains="f(3)").update(
+            validation="print('drugi')\nCheck.equal('f(3)', 9)"
+        )
+        output, updated_attempts = self.run_attempt_file()
+        self.assertTrue(output.startswith("prvi\ndrugi\ntretji\n"))
+        self.assertEqual(updated_attempts[1], (True, []))
+
+
+class ProblemSolutionTestCase(TestCase):
+    def setUp(self):
+        self.student = baker.make("users.User")
+        self.problem_set = baker.make("courses.ProblemSet")
+        teacher = baker.make("users.User")
+        teacher.set_password("PASS")
+        teacher.save()
+        self.problem_set.course.teachers.add(teacher)
+        self.client.login(username=teacher.username, password="PASS")
+
+    def solution_queries(self, number_of_parts):
+        problem = baker.make("problems.Problem", problem_set=self.problem_set)
+        parts = baker.make("problems.Part", problem=problem, _quantity=number_of_parts)
+        for part in parts[1:]:
+            baker.make(
+                "attempts.Attempt",
+                user=self.student,
+                part=part,
+                solution=f"solution of {part.pk}",
+            )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("problem_solution", args=[problem.pk, self.student.pk])
+            )
+        self.assertEqual(response.status_code, 200)
+        for part in parts[1:]:
+            self.assertContains(response, f"solution of {part.pk}")
+        self.assertEqual(response.context["parts"][0].attempt, None)
+        return [
+            query for query in context.captured_queries if "silk_" not in query["sql"]
+        ]
+
+    def test_queries(self):
+        self.assertEqual(len(self.solution_queries(2)), len(self.solution_queries(20)))
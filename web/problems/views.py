@@ -1,6 +1,6 @@
+from attempts.archive import attempt_lookup
 from courses.models import ProblemSet
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import ObjectDoesNotExist
 from django.forms import Form, IntegerField
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
@@ -163,14 +163,11 @@ def problem_solution(request, problem_pk, user_pk):
     student = get_object_or_404(User, pk=user_pk)
     verify(request.user.can_view_problem_solution(problem, student))
     problem_set = problem.problem_set
-    attempts = student.attempts.filter(part__problem__id=problem_pk)
     parts = problem.parts.all()
+    attempts = attempt_lookup([student], parts, problem_set.course)
 
     for part in parts:
-        try:
-            part.attempt = attempts.get(part=part)
-        except ObjectDoesNotExist:
-            part.attempt = None
+        part.attempt = attempts.get((student.pk, part.pk))
     return render(
         request,
         "problems/solutions.html",
@@ -1,7 +1,34 @@
 import datetime
+from collections import namedtuple
+from operator import attrgetter
 
 from attempts.models import HistoricalAttempt
-from django.core.exceptions import ObjectDoesNotExist
+
+# submissions within this time are shown as a single point of the timeline
+SAME_TIME = datetime.timedelta(seconds=5)
+
+HistoryEntry = namedtuple("HistoryEntry", ["pk", "part_id", "history_date", "valid"])
+
+
+def history_entries(user, **filters):
+    """
+    Return a list of historical attempts of the user as HistoryEntry tuples
+    sorted by time. Solutions are not loaded, so that the whole history of a
+    user can be loaded at once.
+
+    Parameters:
+        user : User instance or its id
+        filters : additional filters of the HistoricalAttempt queryset
+
+    Returns:
+        list(HistoryEntry)
+    """
+    return [
+        HistoryEntry(*row)
+        for row in HistoricalAttempt.objects.filter(user=user, **filters)
+        .order_by("history_date", "history_id")
+        .values_list("pk", "part_id", "history_date", "valid")
+    ]
 
 
 def problem_timeline(problem, submissions):
@@ -18,47 +45,35 @@ def problem_timeline(problem, submissions):
     Parameters:
         problem : Problem instance
             instance of the Problem model, for which we are calculating the timeline
-        submissions : list of HistoricalAttempt instances
+        submissions : list of HistoricalAttempt instances or HistoryEntry tuples
             a list of user attempts on given problem
 
     Returns:
-        dictionary of (submission_date : solve state of current problem )
+        list of (submission_date, solve state of current problem)
     """
 
-    sorted_attempts = []
-    for attempt in submissions:
-        sorted_attempts.append((attempt.history_date, attempt))
-
-    # Since historicalattempts dont have "<" defined
-    sorted_attempts.sort(key=lambda x: x[0])
-
+    part_indices = {part.id: index for index, part in enumerate(problem.parts.all())}
+    state = [None] * len(part_indices)
     timeline = []
-    parts_list = list(problem.parts.all())
-    state = [None] * len(parts_list)
-
-    index = 0
-    while index < len(sorted_attempts):
-        current_time = sorted_attempts[index][0]
-
-        same_time_index = index
-        while same_time_index < len(sorted_attempts) and (
-            sorted_attempts[same_time_index][0] - current_time
-        ) < datetime.timedelta(seconds=5):
-            historical_attempt = sorted_attempts[same_time_index][1]
-            part = historical_attempt.part
-            part_index = parts_list.index(part)
-            state[part_index] = historical_attempt
-            same_time_index += 1
-
+    current_time = None
+    # sorting is linear when submissions are already sorted
+    for submission in sorted(submissions, key=attrgetter("history_date")):
+        if current_time is None or submission.history_date - current_time >= SAME_TIME:
+            if current_time is not None:
+                timeline.append(
+                    (current_time.strftime("%H:%M:%S - %d.%m.%Y"), state[:])
+                )
+            current_time = submission.history_date
+        state[part_indices[submission.part_id]] = submission
+    if current_time is not None:
         timeline.append((current_time.strftime("%H:%M:%S - %d.%m.%Y"), state[:]))
-        index = same_time_index
-
     return timeline
 
 
 def get_submission_history(problemset, user):
     """
-    Function that will return a queryset of users submissions in a given course.
+    Function that will return the timelines of users submissions in a given
+    problem set, loading the whole history of the user in a single query.
 
     Parameters:
         problemset : ProblemSet instance
@@ -67,25 +82,21 @@ def get_submission_history(problemset, user):
             user for which we want the submission history
 
     Returns:
-        dictionary of { problem : {part : [history] }}
+        dictionary of { problem : timeline }
     """
 
-    submission_history = {}
-    for problem in problemset.problems.all():
-        submission_history[problem] = []
-
-    user_attempts = HistoricalAttempt.objects.filter(
-        user=user, part__problem__problem_set=problemset
-    ).prefetch_related("part", "part__problem", "part__problem__problem_set")
-
-    for attempt in user_attempts:
-        problem = attempt.part.problem
-        submission_history[problem].append(attempt)
-
-    for problem, submissions in submission_history.items():
-        submission_history[problem] = problem_timeline(problem, submissions)
+    problems = list(problemset.problems.prefetch_related("parts"))
+    submissions = {problem.id: [] for problem in problems}
+    problem_ids = {
+        part.id: problem.id for problem in problems for part in problem.parts.all()
+    }
+    for entry in history_entries(user, part__problem__problem_set=problemset):
+        submissions[problem_ids[entry.part_id]].append(entry)
 
-    return submission_history
+    return {
+        problem: problem_timeline(problem, submissions[problem.id])
+        for problem in problems
+    }
 
 
 def get_problem_solve_state_at_time(historical_attempt):
@@ -105,23 +116,21 @@ def get_problem_solve_state_at_time(historical_attempt):
     """
 
     problem = historical_attempt.part.problem
-    user = historical_attempt.user
-    point_in_time = historical_attempt.history_date
     parts = problem.parts.all()
+    # In timeline we group solutions that are within 5 seconds of eachother.
+    # Therefore we need to add those 5 seconds here,
+    # in order to get the correct solution state of all problem parts.
+    entries = history_entries(
+        historical_attempt.user_id,
+        part__problem=problem,
+        history_date__lte=historical_attempt.history_date + SAME_TIME,
+    )
+    # later entries of the same part replace earlier ones
+    latest = {entry.part_id: entry.pk for entry in entries}
+    attempts = HistoricalAttempt.objects.in_bulk(latest.values())
 
     for part in parts:
-        try:
-            user_attempt = HistoricalAttempt.objects.filter(
-                user=user,
-                part=part,
-                history_date__lte=point_in_time + datetime.timedelta(seconds=5)
-                # In timeline we group solutions that are within 5 seconds of eachother.
-                # Therefore we need to add those 5 seconds here,
-                # in order to get the correct solution state of all problem parts.
-            ).latest("history_date")
-            part.attempt = user_attempt
-        except ObjectDoesNotExist:
-            part.attempt = None
+        part.attempt = attempts.get(latest.get(part.pk))
 
     return parts
 
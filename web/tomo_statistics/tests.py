@@ -0,0 +1,187 @@
+import datetime
+
+from attempts.models import HistoricalAttempt
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from users.models import User
+
+from .statistics_utils import get_problem_solve_state_at_time, get_submission_history
+
+
+class SubmissionHistoryTestCase(TestCase):
+    def setUp(self):
+        self.problem_set = baker.make("courses.ProblemSet")
+        self.problem = baker.make("problems.Problem", problem_set=self.problem_set)
+        self.parts = baker.make("problems.Part", problem=self.problem, _quantity=3)
+        self.user = baker.make("users.User")
+        self.start = timezone.now().replace(microsecond=0)
+        self.attempts = {}
+        self.solutions = {}
+        # seconds at which parts were saved
+        for seconds, part_index, valid in [
+            (0, 0, False),
+            (2, 1, False),
+            (30, 0, True),
+            (60, 2, False),
+            (64, 1, True),
+            (120, 2, True),
+        ]:
+            self.save(seconds, self.parts[part_index], valid)
+
+    def save(self, seconds, part, valid):
+        attempt = self.attempts.get(part.pk)
+        if attempt is None:
+            attempt = baker.make(
+                "attempts.Attempt", user=self.user, part=part, valid=valid
+            )
+            self.attempts[part.pk] = attempt
+        else:
+            attempt.valid = valid
+            attempt.solution = f"{attempt.solution}{seconds}\n"
+            attempt.save()
+        self.solutions[seconds] = attempt.solution
+        record = attempt.history.latest("history_id")
+        HistoricalAttempt.objects.filter(pk=record.pk).update(
+            history_date=self.start + datetime.timedelta(seconds=seconds)
+        )
+
+    def test_timeline(self):
+        timeline = get_submission_history(self.problem_set, self.user)[self.problem]
+        states = [[entry and entry.valid for entry in state] for _, state in timeline]
+        self.assertEqual(
+            states,
+            [
+                [False, False, None],
+                [True, False, None],
+                [True, True, False],
+                [True, True, True],
+            ],
+        )
+        self.assertEqual(timeline[0][0], self.start.strftime("%H:%M:%S - %d.%m.%Y"))
+
+    def test_timeline_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            get_submission_history(self.problem_set, self.user)
+        queries = len(context.captured_queries)
+        for seconds in range(200, 400, 10):
+            self.save(seconds, self.parts[seconds % 3], True)
+        with CaptureQueriesContext(connection) as context:
+            get_submission_history(self.problem_set, self.user)
+        self.assertEqual(len(context.captured_queries), queries)
+
+    def test_state_at_time(self):
+        record = HistoricalAttempt.objects.get(
+            history_date=self.start + datetime.timedelta(seconds=60)
+        )
+        parts = get_problem_solve_state_at_time(record)
+        # the state includes saves within a few seconds after the given one
+        self.assertEqual(
+            [(part.attempt.valid, part.attempt.solution) for part in parts],
+            [
+                (True, self.solutions[30]),
+                (True, self.solutions[64]),
+                (False, self.solutions[60]),
+            ],
+        )
+
+    def test_views(self):
+        teacher = User.objects.create_user(username="teacher", password="PASS")
+        self.problem_set.course.teachers.add(teacher)
+        self.client.login(username="teacher", password="PASS")
+        response = self.client.get(
+            reverse(
+                "statistics_submission_history_problemset_user",
+                args=[self.problem_set.course.pk, self.problem_set.pk, self.user.pk],
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        record = HistoricalAttempt.objects.earliest()
+        response = self.client.get(
+            reverse("user_problem_solution_at_time", args=[record.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class CompareSolutionsTestCase(TestCase):
+    def setUp(self):
+        self.course = baker.make("courses.Course")
+        self.students = baker.make("users.User", _quantity=2)
+        teacher = User.objects.create_user(username="teacher", password="PASS")
+        self.course.teachers.add(teacher)
+        self.client.login(username="teacher", password="PASS")
+
+    def make_problem_set(self, problems, parts):
+        problem_set = baker.make("courses.ProblemSet", course=self.course)
+        for problem in baker.make(
+            "problems.Problem", problem_set=problem_set, _quantity=problems
+        ):
+            for i, part in enumerate(
+                baker.make("problems.Part", problem=problem, _quantity=parts)
+            ):
+                # the first student skips the first part of each problem
+                students = self.students[1:] if i == 0 else self.students
+                for student in students:
+                    baker.make(
+                        "attempts.Attempt", user=student, part=part, valid=i % 2 == 0
+                    )
+        return problem_set
+
+    def compare(self, problem_set):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                reverse("compare_solutions", args=[self.course.pk]),
+                {
+                    "problemSetSelect": problem_set.pk,
+                    "firstStudentSelect": self.students[0].pk,
+                    "secondStudentSelect": self.students[1].pk,
+                    "compare_type": "problems",
+                },
+            )
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            query for query in context.captured_queries if "silk_" not in query["sql"]
+        ]
+        return response, len(queries)
+
+    def test_compare_solutions(self):
+        _, queries = self.compare(self.make_problem_set(2, 2))
+        response, realistic_queries = self.compare(self.make_problem_set(10, 6))
+        self.assertEqual(realistic_queries, queries)
+        for parts in response.context["problems"].values():
+            for i, part in enumerate(parts):
+                if i == 0:
+                    self.assertIsNone(part.attempt_student1)
+                else:
+                    self.assertEqual(part.attempt_student1.user, self.students[0])
+                self.assertEqual(part.attempt_student2.user, self.students[1])
+                self.assertEqual(part.attempt_student2.valid, i % 2 == 0)
+
+
+class SimilarSolutionsTestCase(TestCase):
+    def test_similar_solutions(self):
+        problem_set = baker.make("courses.ProblemSet")
+        part = baker.make("problems.Part", problem__problem_set=problem_set)
+        students = baker.make("users.User", _quantity=3)
+        for student, solution in zip(
+            students, ["x = 1 + 2\nprint(x)\n", "print(4)\n", "y=1+2\nprint(y)\n"]
+        ):
+            baker.make("attempts.Attempt", user=student, part=part, solution=solution)
+        teacher = User.objects.create_user(username="teacher", password="PASS")
+        problem_set.course.teachers.add(teacher)
+        self.client.login(username="teacher", password="PASS")
+        response = self.client.get(
+            reverse("similar_solutions", args=[problem_set.course.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse("similar_solutions", args=[problem_set.course.pk, problem_set.pk]),
+            {"threshold": "0.9"},
+        )
+        self.assertEqual(response.status_code, 200)
+        [problem] = response.context["problems"]
+        [part] = problem.parts.all()
+        self.assertEqual(part.similar_pairs, [(students[0], students[2], 1)])
@@ -30,4 +30,14 @@ urlpatterns = [
         name="user_problem_solution_through_time",
     ),
     path("<int:course_pk>/compare", views.compare_solutions, name="compare_solutions"),
+    path(
+        "<int:course_pk>/similar_solutions",
+        views.similar_solutions,
+        name="similar_solutions",
+    ),
+    path(
+        "<int:course_pk>/similar_solutions/<int:problemset_pk>",
+        views.similar_solutions,
+        name="similar_solutions",
+    ),
 ]
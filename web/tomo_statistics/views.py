@@ -1,7 +1,9 @@
-from attempts.models import Attempt, HistoricalAttempt
+import numpy as np
+from attempts.archive import attempt_lookup
+from attempts.models import HistoricalAttempt, SolutionSignature
+from attempts.similarity import similar_pairs
 from courses.models import Course, ProblemSet
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import ObjectDoesNotExist
 from django.shortcuts import get_object_or_404, render
 from problems.models import Part
 from tomo_statistics.statistics_utils import (
@@ -12,6 +14,8 @@ from tomo_statistics.statistics_utils import (
 from users.models import User
 from utils import verify
 
+SIMILARITY_THRESHOLD = 0.8
+
 
 @login_required
 def course_statistics(request, course_pk):
@@ -154,31 +158,27 @@ def compare_solutions(request, course_pk):
         )
 
     else:
-        attempts = Attempt.objects.filter(
-            part__problem__problem_set=problem_set,
-            user__in=[first_student, second_student],
-        )
-
         problems = None
 
         if problem_set is not None:
             problems = {
-                problem: problem.parts.all() for problem in problem_set.problems.all()
+                problem: problem.parts.all()
+                for problem in problem_set.problems.prefetch_related("parts")
             }
-            for problem in problems:
-                for part in problems[problem]:
-                    try:
-                        part.attempt_student1 = attempts.get(
-                            user=first_student, part=part
-                        )
-                    except ObjectDoesNotExist:
-                        part.attempt_student1 = None
-                    try:
-                        part.attempt_student2 = attempts.get(
-                            user=second_student, part=part
-                        )
-                    except ObjectDoesNotExist:
-                        part.attempt_student2 = None
+            students = [
+                student for student in (first_student, second_student) if student
+            ]
+            attempts = attempt_lookup(
+                students, Part.objects.filter(problem__problem_set=problem_set), course
+            )
+            for parts in problems.values():
+                for part in parts:
+                    part.attempt_student1 = attempts.get(
+                        (getattr(first_student, "pk", None), part.pk)
+                    )
+                    part.attempt_student2 = attempts.get(
+                        (getattr(second_student, "pk", None), part.pk)
+                    )
 
         return render(
             request,
@@ -192,3 +192,53 @@ def compare_solutions(request, course_pk):
                 "cmp_type": "problems",
             },
         )
+
+
+@login_required
+def similar_solutions(request, course_pk, problemset_pk=None):
+    course = get_object_or_404(Course, pk=course_pk)
+    verify(request.user.can_view_course_statistics(course))
+    try:
+        threshold = min(1, max(0, float(request.GET.get("threshold", ""))))
+    except ValueError:
+        threshold = SIMILARITY_THRESHOLD
+    problemset = None
+    problems = []
+    if problemset_pk is not None:
+        problemset = get_object_or_404(ProblemSet, pk=problemset_pk, course=course)
+        problems = list(problemset.problems.prefetch_related("parts"))
+        signatures = {}
+        for part_id, user_id, signature in SolutionSignature.objects.filter(
+            part__problem__problem_set=problemset
+        ).values_list("part", "user", "signature"):
+            signatures.setdefault(part_id, []).append(
+                (user_id, np.frombuffer(signature, dtype=np.uint32))
+            )
+        pairs = {
+            part_id: similar_pairs(part_signatures, threshold)
+            for part_id, part_signatures in signatures.items()
+        }
+        users = User.objects.in_bulk(
+            {
+                user_id
+                for part_pairs in pairs.values()
+                for pair in part_pairs
+                for user_id in pair[:2]
+            }
+        )
+        for problem in problems:
+            for part in problem.parts.all():
+                part.similar_pairs = [
+                    (users[first], users[second], similarity)
+                    for first, second, similarity in pairs.get(part.pk, [])
+                ]
+    return render(
+        request,
+        "statistics/similar_solutions.html",
+        {
+            "course": course,
+            "problemset": problemset,
+            "problems": problems,
+            "threshold": threshold,
+        },
+    )
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+
+class TokenCache:
+    """
+    A bounded least recently used cache of tokens together with their users,
+    kept in the memory of the process. Entries expire TOKEN_CACHE_TIMEOUT
+    seconds after they were added, and at most TOKEN_CACHE_SIZE entries are
+    kept. Entries of a user are removed when the user or any of their tokens
+    is saved or deleted in this process, so expiry only bounds how long changes
+    made by other processes or by bulk updates go unnoticed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = OrderedDict()
+        self.user_keys = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.tokens.get(key)
+            if entry is None:
+                return None
+            token, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self.tokens.move_to_end(key)
+            return token
+
+    def add(self, token):
+        if settings.TOKEN_CACHE_SIZE <= 0:
+            return
+        expires = time.monotonic() + settings.TOKEN_CACHE_TIMEOUT
+        with self.lock:
+            self.tokens[token.key] = (token, expires)
+            self.tokens.move_to_end(token.key)
+            self.user_keys.setdefault(token.user_id, set()).add(token.key)
+            while len(self.tokens) > settings.TOKEN_CACHE_SIZE:
+                self._remove(next(iter(self.tokens)))
+
+    def _remove(self, key):
+        token, _ = self.tokens.pop(key)
+        keys = self.user_keys[token.user_id]
+        keys.discard(key)
+        if not keys:
+            del self.user_keys[token.user_id]
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for key in list(self.user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+            self.user_keys.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that looks tokens up in the token cache before the
+    database. Each request gets its own copies of the cached token and user,
+    so that roles cached on the user object still live for a single request.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.add(copy(token))
+        token = copy(token)
+        token.user = copy(token.user)
+        return token.user, token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def discard_token_user(sender, instance, **kwargs):
+    token_cache.discard_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def discard_user(sender, instance, **kwargs):
+    token_cache.discard_user(instance.pk)
@@ -0,0 +1,49 @@
+"""
+Measure authentication of submissions with and without the token cache
+"""
+
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.authentication import CachedTokenAuthentication, token_cache
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = """Authenticates the given number of requests with the token of the
+    given user and reports the number of queries and the requests per second
+    of stock and cached token authentication"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", type=int)
+        parser.add_argument("--requests", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        user = User.objects.get(pk=options["user"])
+        factory = APIRequestFactory()
+        requests = [
+            Request(
+                factory.post(
+                    "/api/attempts/submit/",
+                    HTTP_AUTHORIZATION=f"Token {user.auth_token.key}",
+                )
+            )
+            for _ in range(options["requests"])
+        ]
+        token_cache.clear()
+        for authentication in [TokenAuthentication(), CachedTokenAuthentication()]:
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                for request in requests:
+                    authentication.authenticate(request)
+                duration = time.perf_counter() - start
+            self.stdout.write(
+                f"{type(authentication).__name__}: "
+                f"{len(context.captured_queries)} queries, "
+                f"{len(requests) / duration:.0f} requests/s"
+            )
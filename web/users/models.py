@@ -46,15 +46,25 @@ class User(AbstractUser):
         except AttributeError:
             return False
 
+    @cached_property
+    def taught_course_ids(self):
+        # The user object lives for a single request, so the roles are resolved
+        # at most once per request, no matter how many permissions are checked.
+        return set(self.taught_courses.order_by().values_list("id", flat=True))
+
+    @cached_property
+    def enrolled_course_ids(self):
+        return set(self.courses.order_by().values_list("id", flat=True))
+
     def is_teacher(self, course):
-        return self in course.teachers.all()
+        return course.pk in self.taught_course_ids
 
     @cached_property
     def is_teacher_anywhere(self):
-        return self.taught_courses.exists()
+        return bool(self.taught_course_ids)
 
     def is_student(self, course):
-        return self in course.students.all()
+        return course.pk in self.enrolled_course_ids
 
     def can_edit_course(self, course):
         return self.is_teacher(course)
@@ -0,0 +1,173 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import token_cache
+from .models import User
+
+
+def permission_queries(captured_queries):
+    return [
+        query
+        for query in captured_queries
+        if query["sql"].startswith("SELECT")
+        and (
+            '"courses_course_teachers"' in query["sql"]
+            or '"courses_studentenrollment"' in query["sql"]
+        )
+        # observed students are selected by outcome statistics, not permissions
+        and '"observed"' not in query["sql"] and "silk_" not in query["sql"]
+    ]
+
+
+class RolesTestCase(TestCase):
+    def setUp(self):
+        self.user = baker.make("users.User")
+        self.taught_course = baker.make("courses.Course")
+        self.enrolled_course = baker.make("courses.Course")
+        self.other_course = baker.make("courses.Course")
+        self.taught_course.teachers.add(self.user)
+        self.enrolled_course.enroll_student(self.user)
+
+    def test_roles(self):
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(user.is_teacher(self.taught_course))
+            self.assertFalse(user.is_teacher(self.enrolled_course))
+            self.assertFalse(user.is_teacher(self.other_course))
+            self.assertFalse(user.is_student(self.taught_course))
+            self.assertTrue(user.is_student(self.enrolled_course))
+            self.assertFalse(user.is_student(self.other_course))
+            self.assertTrue(user.is_favourite_course(self.taught_course))
+            self.assertTrue(user.is_favourite_course(self.enrolled_course))
+            self.assertFalse(user.is_favourite_course(self.other_course))
+            self.assertTrue(user.is_teacher_anywhere)
+        self.assertEqual(len(permission_queries(context.captured_queries)), 2)
+
+
+class PermissionQueriesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="USER", password="PASS")
+        self.course = baker.make("courses.Course")
+        self.course.teachers.add(self.user)
+
+    def submit_queries(self, number_of_parts):
+        problem_set = baker.make("courses.ProblemSet", course=self.course)
+        problem = baker.make("problems.Problem", problem_set=problem_set)
+        parts = baker.make("problems.Part", problem=problem, _quantity=number_of_parts)
+        attempts_data = [
+            {
+                "solution": "s",
+                "valid": True,
+                "feedback": [],
+                "secret": [],
+                "part": part.pk,
+                "token": part.attempt_token(self.user),
+            }
+            for part in parts
+        ]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token " + self.user.auth_token.key)
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(
+                "/api/attempts/submit/", attempts_data, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        return permission_queries(context.captured_queries)
+
+    def homepage_queries(self):
+        self.client.login(username="USER", password="PASS")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("homepage"))
+        self.assertEqual(response.status_code, 200)
+        return permission_queries(context.captured_queries)
+
+    def test_submit(self):
+        self.assertEqual(len(self.submit_queries(1)), 1)
+        self.assertEqual(len(self.submit_queries(20)), 1)
+
+    def test_homepage(self):
+        baker.make("courses.Course").enroll_student(self.user)
+        queries = self.homepage_queries()
+        for _ in range(10):
+            baker.make("courses.Course").teachers.add(self.user)
+            baker.make("courses.Course").enroll_student(self.user)
+        self.assertEqual(len(self.homepage_queries()), len(queries))
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username="USER", password="PASS")
+        self.course = baker.make("courses.Course")
+        self.course.teachers.add(self.user)
+        problem_set = baker.make("courses.ProblemSet", course=self.course)
+        problem = baker.make("problems.Problem", problem_set=problem_set)
+        self.part = baker.make("problems.Part", problem=problem)
+
+    def submit(self, key=None):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Token " + (key or self.user.auth_token.key)
+        )
+        attempts_data = [
+            {
+                "solution": "s",
+                "valid": True,
+                "feedback": [],
+                "secret": [],
+                "part": self.part.pk,
+                "token": self.part.attempt_token(self.user),
+            }
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(
+                "/api/attempts/submit/", attempts_data, format="json"
+            )
+        token_queries = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+            and '"authtoken_token"' in query["sql"]
+            and "silk_" not in query["sql"]
+        ]
+        return response.status_code, len(token_queries)
+
+    def test_cached(self):
+        self.assertEqual(self.submit(), (200, 1))
+        self.assertEqual(self.submit(), (200, 0))
+        self.assertEqual(self.submit("invalid"), (401, 1))
+
+    def test_roles_per_request(self):
+        self.submit()
+        self.course.teachers.remove(self.user)
+        self.assertEqual(self.submit(), (403, 0))
+
+    def test_regenerated_token(self):
+        old_key = self.user.auth_token.key
+        self.submit()
+        self.user.auth_token.delete()
+        self.assertEqual(self.submit(old_key)[0], 401)
+        self.assertEqual(self.submit(Token.objects.create(user=self.user).key)[0], 200)
+
+    def test_deactivated_user(self):
+        self.submit()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.submit()[0], 401)
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=0)
+    def test_timeout(self):
+        self.assertEqual(self.submit(), (200, 1))
+        self.assertEqual(self.submit(), (200, 1))
+
+    @override_settings(TOKEN_CACHE_SIZE=1)
+    def test_size(self):
+        other = User.objects.create_user(username="OTHER", password="PASS")
+        self.submit()
+        self.submit(other.auth_token.key)
+        self.assertEqual(self.submit(), (200, 1))
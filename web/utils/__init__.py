@@ -18,6 +18,16 @@ def is_json_string_list(s):
         val = json.loads(s)
     except (TypeError, json.decoder.JSONDecodeError):
         raise ValidationError("Not a JSON value.")
+    is_string_list(val)
+
+
+def is_string_list(val):
+    """
+    Checks if the value val is a list of strings.
+
+    The function does nothing if val is a list of strings,
+    or raises a suitable ValidationError if not.
+    """
     if type(val) is not list:
         raise ValidationError("Not a JSON list.")
     for x in val:
@@ -1,27 +1,10 @@
-import json
-
 from django.utils.text import slugify
 from rest_framework.decorators import action
-from rest_framework.fields import Field
 from rest_framework.renderers import JSONRenderer
 
 from .views import plain_text
 
 
-class JSONStringField(Field):
-    """
-    Store a JSON object in a TextField.
-    When object is received store its json dump.
-    When object is retrieved load JSON object from string representation.
-    """
-
-    def to_internal_value(self, data):
-        return json.dumps(data)
-
-    def to_representation(self, value):
-        return json.loads(value)
-
-
 class DownloadMixin(object):
     @action(detail=True, methods=["get"])
     def download(self, request, pk=None):
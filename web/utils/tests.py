@@ -1,7 +1,11 @@
+import zipfile
+from io import BytesIO
+
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-from . import is_json_string_list, truncate
+from . import is_json_string_list, is_string_list, truncate
+from .views import zip_archive, zip_chunks
 
 
 class IsJSONStringListTestCase(TestCase):
@@ -39,6 +43,13 @@ class IsJSONStringListTestCase(TestCase):
         self.assertIsNone(is_json_string_list('["1", "2"]'))
         self.assertIsNone(is_json_string_list('["1", "2", "3"]'))
 
+    def test_string_list(self):
+        self.assertIsNone(is_string_list(["1", "2"]))
+        with self.assertRaisesRegexp(ValidationError, "Not a JSON list."):
+            is_string_list('["1", "2"]')
+        with self.assertRaisesRegexp(ValidationError, "Not a JSON list of strings."):
+            is_string_list(["1", 2])
+
 
 class TruncateTestCase(TestCase):
     def test_truncate(self):
@@ -55,3 +66,32 @@ class TruncateTestCase(TestCase):
             self.assertEqual(truncate("Long string", max_length=1), "L...")
         self.assertEqual(truncate("String", max_length=0, indicator=""), "")
         self.assertEqual(truncate("", max_length=0), "")
+
+
+class ZipArchiveTestCase(TestCase):
+    def test_archive(self):
+        files = [(f"folder/file{i}.txt", f"Vsebina {i} čšž\n" * 1000) for i in range(5)]
+        response = zip_archive("archive", files)
+        self.assertEqual(
+            response["Content-Disposition"], "attachment; filename=archive.zip"
+        )
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            [(name, archive.read(name).decode("utf-8")) for name in archive.namelist()],
+            files,
+        )
+
+    def test_lazy(self):
+        consumed = []
+
+        def files():
+            for i in range(3):
+                consumed.append(i)
+                yield f"file{i}.txt", "contents"
+
+        chunks = zip_chunks(files())
+        next(chunks)
+        self.assertEqual(consumed, [0])
+        next(chunks)
+        self.assertEqual(consumed, [0, 1])
@@ -1,7 +1,7 @@
+import csv
 import zipfile
-from io import BytesIO
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 
 
@@ -28,18 +28,79 @@ def plain_text(name, contents, content_type="text/plain"):
     return response
 
 
+class _Echo:
+    """
+    A write-only file that returns the data written into it, so that a CSV
+    writer produces chunks of the file instead of writing them.
+    """
+
+    def write(self, data):
+        return data
+
+
+def csv_file(name, rows):
+    """
+    Downloads a CSV file with the given name and the given iterable of rows,
+    each given as a list of values. The file is streamed, so the iterable may
+    produce the rows lazily.
+    """
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows), content_type="text/csv; charset=utf-8"
+    )
+    response["Content-Disposition"] = "attachment; filename={0}.csv".format(name)
+    return response
+
+
+class _StreamBuffer:
+    """
+    A write-only file that collects the data written into it until it is
+    taken away, so that an archive can be sent out while it is being written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(files):
+    """
+    Yields chunks of a zip archive containing the given iterable of files,
+    each represented by a pair of the filename and the contents. Files are
+    consumed one at a time, so the whole archive is never held in memory.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for filename, contents in files:
+            archive.writestr(filename, contents.encode("utf-8"))
+            yield buffer.take()
+    yield buffer.take()
+
+
 def zip_archive(archive_name, files):
     """
     Downloads a zip archive with the given name and containing the given
     iterable of files, each represented by a pair, where the first component
-    gives the filename and the second one gives the contents.
-    """
-    string_buffer = BytesIO()
-    archive = zipfile.ZipFile(string_buffer, "w", zipfile.ZIP_DEFLATED)
-    for filename, contents in files:
-        archive.writestr(filename, contents.encode("utf-8"))
-    archive.close()
-    response = HttpResponse(string_buffer.getvalue(), content_type="application/zip")
+    gives the filename and the second one gives the contents. The archive is
+    streamed, so the iterable may produce the files lazily.
+    """
+    response = StreamingHttpResponse(zip_chunks(files), content_type="application/zip")
     response["Content-Disposition"] = "attachment; filename={0}.zip".format(
         archive_name
     )
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "taggit",
     "social_django",
     "expurtka",
+    "exports",
 ]
 
 MIDDLEWARE = [
@@ -142,4 +143,33 @@ LOGGING = {
 
 SUBMISSION_URL = os.environ.get("SUBMISSION_URL", "http://127.0.0.1:8000")
 LOGIN_REDIRECT_URL = "/"
+# Number of threads rendering files of a problem set results archive
+RESULTS_ARCHIVE_WORKERS = int(os.environ.get("RESULTS_ARCHIVE_WORKERS", 1))
+# Directory in which export workers store finished exports
+EXPORT_ROOT = os.environ.get("EXPORT_ROOT", BASE_DIR / "exports")
+# Seconds after which running export jobs without progress are run again
+EXPORT_JOB_TIMEOUT = int(os.environ.get("EXPORT_JOB_TIMEOUT", 60 * 60))
+# Seconds after which finished exports are deleted
+EXPORT_EXPIRY = int(os.environ.get("EXPORT_EXPIRY", 7 * 24 * 60 * 60))
+# Directory in which attempts of archived courses are stored
+ATTEMPT_ARCHIVE_ROOT = os.environ.get("ATTEMPT_ARCHIVE_ROOT", BASE_DIR / "archive")
+# Number of sandboxed interpreters that regrade attempts at once
+REGRADE_WORKERS = int(os.environ.get("REGRADE_WORKERS", os.cpu_count() or 1))
+# CPU seconds and bytes of memory available to each sandboxed interpreter
+REGRADE_TIME_LIMIT = int(os.environ.get("REGRADE_TIME_LIMIT", 10))
+REGRADE_MEMORY_LIMIT = int(os.environ.get("REGRADE_MEMORY_LIMIT", 512 * 1024 * 1024))
+# Processes and threads that all sandboxed interpreters may run together
+REGRADE_PROCESS_LIMIT = int(os.environ.get("REGRADE_PROCESS_LIMIT", 256))
+# Unprivileged user that runs graded solutions, which should be a dedicated user
+# without access to the project files, see attempts/sandbox.py
+REGRADE_SANDBOX_USER = os.environ.get("REGRADE_SANDBOX_USER", "nobody")
+# Characters of each feedback message of an attempt that are stored
+FEEDBACK_MESSAGE_LIMIT = int(os.environ.get("FEEDBACK_MESSAGE_LIMIT", 10000))
+# Characters of JSON above which feedback of an attempt is stored compressed
+FEEDBACK_COMPRESSION_THRESHOLD = int(
+    os.environ.get("FEEDBACK_COMPRESSION_THRESHOLD", 2000)
+)
+# Tokens cached in the memory of each process and the seconds they are kept
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TIMEOUT = int(os.environ.get("TOKEN_CACHE_TIMEOUT", 300))
 STATIC_URL = "/static/"
@@ -18,3 +18,5 @@ DATABASES = {
 }
 
 STATIC_ROOT = "/var/static/"
+EXPORT_ROOT = "/var/exports/"
+ATTEMPT_ARCHIVE_ROOT = "/var/archive/"
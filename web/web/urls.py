@@ -65,6 +65,7 @@ urlpatterns = [
     path("api/", include(router.urls)),
     path("problems/", include("problems.urls")),
     path("statistics/", include("tomo_statistics.urls")),
+    path("exports/", include("exports.urls")),
 ]
 
 urlpatterns += courses.urls.urlpatterns